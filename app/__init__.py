@@ -24,6 +24,25 @@ def create_app(config_name=None):
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
 
+    from .impressao import spooler_impressao
+    spooler_impressao.configurar(app.config)
+
+    from .fila import contador_intercalamento
+    contador_intercalamento.configurar(app.config)
+
+    from .tts import cache_audio, biblioteca_fragmentos, cliente_tts, pregeracao_tts
+    cache_audio.configurar(app.config)
+    biblioteca_fragmentos.configurar(app.config)
+    cliente_tts.configurar(app.config)
+    pregeracao_tts.configurar(app.config)
+
+    from .relatorios import fila_relatorios, processos_relatorio
+    fila_relatorios.configurar(app.config)
+    processos_relatorio.configurar(app.config)
+
+    from .arquivo import arquivo_senhas
+    arquivo_senhas.configurar(app.config)
+
     # ✅ Mova os imports para cá (depois da criação do app)
     from .routes import bp as main_blueprint
     from .tts_routes import bp_tts
@@ -31,6 +50,22 @@ def create_app(config_name=None):
     app.register_blueprint(main_blueprint)
     app.register_blueprint(bp_tts)
 
+    # Cria tabelas/colunas novas em bancos já existentes
+    from .migracoes import aplicar_migracoes
+    with app.app_context():
+        try:
+            aplicar_migracoes()
+        except Exception as e:
+            print(f"Erro ao aplicar migrações: {e}")
+
+        # Buffers das últimas chamadas prontos antes do primeiro display
+        from .cache import ultimas_chamadas, chamadas_por_fila
+        try:
+            ultimas_chamadas.carregar()
+            chamadas_por_fila.carregar()
+        except Exception as e:
+            print(f"Erro ao carregar últimas chamadas: {e}")
+
     @app.errorhandler(403)
     def proibido(e):
         return render_template("403.html"), 403
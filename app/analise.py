@@ -0,0 +1,280 @@
+"""
+Análise vetorizada dos tempos de espera (NumPy)
+
+As senhas viram colunas NumPy (gerado_em, espera, tipo, primeira vez, quem
+chamou e guichê) e os indicadores são calculados sobre os arrays inteiros:
+
+- percentis p50/p90/p99 e média da espera (0 < espera <= 120 min, como em
+  estatistica_diaria: acima disso são dados de teste);
+- mapa de calor das emissões por dia da semana x hora do dia (Manaus);
+- produção por guichê: chamadas, horas com chamadas, chamadas por hora e
+  mediana da espera.
+
+Usada pelo dashboard (/relatorios) e pelos relatórios personalizados.
+
+Os dias já encerrados (UTC) ficam em memória, lidos uma vez por dia; em cada
+análise só as senhas de hoje vêm do banco (tabela senha e arquivo). Como os
+caches de cache.py, vale para o processo atual: a chamada de uma senha de dia
+anterior invalida a parte em memória (registrar_chamada / invalidar); mover
+senhas para o arquivo não muda o resultado.
+"""
+import threading
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import String, case, func, select, type_coerce
+from . import db
+from .models import Senha, SenhaArquivo
+
+TZ_MANAUS = ZoneInfo('America/Manaus')
+
+PERCENTIS = (50, 90, 99)
+ESPERA_MAXIMA_S = 120 * 60
+DIAS_SEMANA = ('Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom')
+TAMANHO_LOTE = 50000
+
+TABELAS = (Senha.__table__, SenhaArquivo.__table__)       # ver arquivo.py
+
+
+def consulta_colunas(tabela, desde: datetime = None, ate: datetime = None):
+    """SELECT das colunas de ColunasEspera em `tabela`, com desde <= gerado_em < ate
+
+    As datas são lidas como vieram do driver (type_coerce para String): no
+    SQLite chegam como texto, sem a conversão do SQLAlchemy linha a linha, e
+    em outros bancos como datetime; nos dois casos o NumPy converte o lote.
+    Pelo mesmo motivo os booleanos vêm como 0/1 (CASE) e não como Boolean.
+    """
+    c = tabela.c
+    consulta = select(
+        type_coerce(c.gerado_em, String),
+        case((c.chamado == True, type_coerce(c.chamado_em, String))),  # noqa: E712
+        case((c.tipo_paciente == 'preferencial', 1), else_=0),
+        case((c.primeira_vez == True, 1), else_=0),  # noqa: E712
+        func.coalesce(c.chamado_por, 0),
+        func.coalesce(c.guiche, ''),
+    ).where(c.gerado_em != None)  # noqa: E711
+    if desde is not None:
+        consulta = consulta.where(c.gerado_em >= desde)
+    if ate is not None:
+        consulta = consulta.where(c.gerado_em < ate)
+    return consulta
+
+
+class ColunasEspera:
+    """Senhas como arrays NumPy, uma posição por senha
+
+    gerado_em: datetime64[s] (UTC); espera: segundos (NaN se não chamada);
+    usuario: id de quem chamou (0 = ninguém); guiche: índice em `guiches`
+    (-1 = sem guichê).
+    """
+
+    __slots__ = ('gerado_em', 'espera', 'preferencial', 'primeira_vez', 'usuario', 'guiche', 'guiches')
+
+    def __init__(self, gerado_em, espera, preferencial, primeira_vez, usuario, guiche, guiches):
+        self.gerado_em = gerado_em
+        self.espera = espera
+        self.preferencial = preferencial
+        self.primeira_vez = primeira_vez
+        self.usuario = usuario
+        self.guiche = guiche
+        self.guiches = guiches
+
+    @classmethod
+    def vazia(cls) -> 'ColunasEspera':
+        return cls(np.empty(0, 'datetime64[s]'), np.empty(0), np.empty(0, bool), np.empty(0, bool),
+                   np.empty(0, np.int32), np.empty(0, np.int32), [])
+
+    @classmethod
+    def ler(cls, desde: datetime = None, ate: datetime = None) -> 'ColunasEspera':
+        """Senhas com desde <= gerado_em < ate (senha + senha_arquivo), lidas em lotes (yield_per)
+
+        Cada lote de tuplas vira arrays de uma vez (consulta_colunas), sem
+        objetos do ORM nem conversão de datas linha a linha.
+        """
+        partes, indices = [], {}
+        for tabela in TABELAS:
+            resultado = db.session.execute(consulta_colunas(tabela, desde, ate),
+                                           execution_options={'yield_per': TAMANHO_LOTE})
+            for lote in resultado.partitions():
+                # tuple(): o NumPy percorre Row pelo protocolo de sequência, bem mais lento
+                gerado, chamado_em, preferencial, primeira_vez, usuario, guiche = np.array(
+                    [tuple(linha) for linha in lote], dtype=object).T
+                gerado = gerado.astype('datetime64[us]')
+                # Espera arredondada ao segundo, como em EstatisticaService
+                chamado_em = np.where(chamado_em == None, 'NaT', chamado_em).astype('datetime64[us]')  # noqa: E711
+                espera = np.round((chamado_em - gerado) / np.timedelta64(1, 's'))
+                # Guichês do lote -> códigos comuns a todos os lotes ('' = sem guichê)
+                nomes, inverso = np.unique(guiche.astype(str), return_inverse=True)
+                codigos = np.array([indices.setdefault(str(nome), len(indices)) if nome else -1 for nome in nomes],
+                                   dtype=np.int32)
+                partes.append(cls(gerado.astype('datetime64[s]'), espera, preferencial.astype(bool),
+                                  primeira_vez.astype(bool), usuario.astype(np.int32), codigos[inverso], []))
+        if not partes:
+            return cls.vazia()
+        return cls._concatenar(partes, [parte.guiche for parte in partes], list(indices))
+
+    @classmethod
+    def juntar(cls, *partes: 'ColunasEspera') -> 'ColunasEspera':
+        """Concatena as partes; os códigos de guichê são refeitos com base na primeira"""
+        indices = {nome: i for i, nome in enumerate(partes[0].guiches)}
+        codigos = []
+        for parte in partes:
+            mapa = np.array([indices.setdefault(nome, len(indices)) for nome in parte.guiches] + [-1],
+                            dtype=np.int32)
+            codigos.append(mapa[parte.guiche])      # -1 aponta para o último item (-1)
+        return cls._concatenar(partes, codigos, list(indices))
+
+    @classmethod
+    def _concatenar(cls, partes: list, codigos: list, guiches: list) -> 'ColunasEspera':
+        return cls(*(np.concatenate([getattr(parte, campo) for parte in partes])
+                     for campo in ('gerado_em', 'espera', 'preferencial', 'primeira_vez', 'usuario')),
+                   np.concatenate(codigos), guiches)
+
+    def __len__(self) -> int:
+        return len(self.gerado_em)
+
+    def filtrar(self, mascara) -> 'ColunasEspera':
+        return ColunasEspera(self.gerado_em[mascara], self.espera[mascara], self.preferencial[mascara],
+                             self.primeira_vez[mascara], self.usuario[mascara], self.guiche[mascara],
+                             self.guiches)
+
+
+class AnaliseEspera:
+    """Indicadores de espera calculados sobre as ColunasEspera do período"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fechados = None       # ColunasEspera das senhas anteriores a _corte
+        self._corte = None          # início (UTC) do dia em que os dias fechados foram lidos
+
+    # ------------------------------------------------------------------
+    # Dados
+    # ------------------------------------------------------------------
+    def colunas(self) -> ColunasEspera:
+        """Todas as senhas: dias fechados (memória) + hoje (banco). Requer app context."""
+        corte = datetime.combine(datetime.utcnow().date(), time.min)
+        with self._lock:
+            if self._fechados is None or self._corte != corte:
+                self._fechados = ColunasEspera.ler(ate=corte)
+                self._corte = corte
+            fechados = self._fechados
+        return ColunasEspera.juntar(fechados, ColunasEspera.ler(desde=corte))
+
+    def registrar_chamada(self, senha: Senha) -> None:
+        """Chamada gravada: se a senha é de um dia fechado, a memória fica desatualizada"""
+        if self._corte is not None and senha.gerado_em is not None and senha.gerado_em < self._corte:
+            self.invalidar()
+
+    def invalidar(self) -> None:
+        """Relê os dias fechados na próxima análise (ex.: após limpar o banco)"""
+        with self._lock:
+            self._fechados = None
+
+    # ------------------------------------------------------------------
+    # Análise
+    # ------------------------------------------------------------------
+    def analisar(self, parametros=None, dias: int = None) -> dict:
+        """Indicadores das senhas filtradas
+
+        parametros: filtros do formulário de relatório personalizado;
+        dias: últimos N dias inteiros (UTC), como no dashboard.
+        """
+        colunas = self.colunas()
+        return self.calcular(colunas.filtrar(self.mascara(colunas, parametros or {}, dias)))
+
+    @staticmethod
+    def mascara(colunas: ColunasEspera, parametros, dias: int = None):
+        """Mesmos filtros de relatorios.filtros_relatorio, aplicados aos arrays"""
+        mascara = np.ones(len(colunas), dtype=bool)
+        if dias:
+            inicio = np.datetime64(datetime.utcnow().date() - timedelta(days=dias - 1))
+            mascara &= colunas.gerado_em >= inicio
+        if parametros.get('data_inicio'):
+            mascara &= colunas.gerado_em >= np.datetime64(parametros['data_inicio'])
+        if parametros.get('data_fim'):
+            mascara &= colunas.gerado_em <= np.datetime64(parametros['data_fim']) + np.timedelta64(1, 'D')
+        if parametros.get('tipo_paciente'):
+            mascara &= colunas.preferencial == (parametros['tipo_paciente'] == 'preferencial')
+        if parametros.get('primeira_vez'):
+            mascara &= colunas.primeira_vez == (parametros['primeira_vez'] == 'true')
+        if parametros.get('usuario_id'):
+            mascara &= colunas.usuario == int(parametros['usuario_id'])
+        if parametros.get('chamadas_apenas') == 'on':
+            mascara &= ~np.isnan(colunas.espera)
+        return mascara
+
+    @staticmethod
+    def calcular(colunas: ColunasEspera) -> dict:
+        """Percentis, mapa de calor e produção por guichê (só tipos nativos: vai para templates e pickle)"""
+        espera = colunas.espera
+        chamadas = ~np.isnan(espera)
+        validas = chamadas & (espera > 0) & (espera <= ESPERA_MAXIMA_S)
+        minutos = espera[validas] / 60
+
+        percentis = None
+        tempo_medio = None
+        if minutos.size:
+            percentis = {f'p{p}': round(float(v), 1) for p, v in zip(PERCENTIS, np.percentile(minutos, PERCENTIS))}
+            tempo_medio = round(float(minutos.mean()), 1)
+
+        # Mapa de calor: horas locais desde 1970 (uma quinta-feira; 0 = segunda)
+        deslocamento = int(datetime.now(TZ_MANAUS).utcoffset().total_seconds() // 3600)
+        horas = colunas.gerado_em.astype('datetime64[h]').astype(np.int64) + deslocamento
+        mapa = np.bincount((horas // 24 + 3) % 7 * 24 + horas % 24, minlength=7 * 24).reshape(7, 24)
+        pico = None
+        if len(colunas):
+            dia, hora = divmod(int(mapa.argmax()), 24)
+            pico = {'dia': DIAS_SEMANA[dia], 'hora': hora, 'senhas': int(mapa[dia, hora])}
+
+        return {
+            'total_senhas': len(colunas),
+            'senhas_chamadas': int(chamadas.sum()),
+            'esperas_validas': int(minutos.size),
+            'percentis': percentis,
+            'tempo_medio': tempo_medio,
+            'mapa_calor': mapa.tolist(),
+            'pico': pico,
+            'guiches': AnaliseEspera._por_guiche(colunas, chamadas, validas),
+        }
+
+    @staticmethod
+    def _por_guiche(colunas: ColunasEspera, chamadas, validas) -> list:
+        com_guiche = chamadas & (colunas.guiche >= 0)
+        if not com_guiche.any():
+            return []
+        guiche = colunas.guiche[com_guiche].astype(np.int64)
+        quantidade = len(colunas.guiches)
+        total = np.bincount(guiche, minlength=quantidade)
+
+        # Horas distintas em que cada guichê chamou (chamado_em = gerado_em + espera)
+        chamado_em = colunas.gerado_em[com_guiche].astype(np.int64) + colunas.espera[com_guiche].astype(np.int64)
+        hora_chamada = chamado_em // 3600
+        pares = np.unique(guiche << 32 | (hora_chamada - hora_chamada.min()))
+        horas_ativas = np.bincount(pares >> 32, minlength=quantidade)
+
+        # Mediana da espera válida por guichê: ordena por guichê e divide nos blocos
+        guiche_validas = colunas.guiche[validas & com_guiche]
+        ordem = np.argsort(guiche_validas, kind='stable')
+        guiche_validas = guiche_validas[ordem]
+        espera_validas = colunas.espera[validas & com_guiche][ordem] / 60
+        inicios = np.flatnonzero(np.r_[True, np.diff(guiche_validas) != 0]) if guiche_validas.size else []
+        medianas = {int(guiche_validas[i]): float(np.median(bloco))
+                    for i, bloco in zip(inicios, np.split(espera_validas, inicios[1:]))}
+
+        resultado = []
+        for codigo in np.flatnonzero(total):
+            resultado.append({
+                'guiche': colunas.guiches[codigo],
+                'chamadas': int(total[codigo]),
+                'horas_ativas': int(horas_ativas[codigo]),
+                'por_hora': round(float(total[codigo] / horas_ativas[codigo]), 1),
+                'espera_mediana': round(medianas[codigo], 1) if codigo in medianas else None,
+            })
+        resultado.sort(key=lambda g: (not g['guiche'].isdigit(), int(g['guiche']) if g['guiche'].isdigit()
+                                      else 0, g['guiche']))
+        return resultado
+
+
+# Instância global usada pelas rotas e pelos relatórios
+analise_espera = AnaliseEspera()
@@ -0,0 +1,128 @@
+"""
+Arquivo das senhas de dias encerrados (tabela senha_arquivo)
+
+A tabela senha fica só com as senhas do dia (horário de Manaus): fila ao
+vivo, displays e painéis consultam uma tabela pequena, e o histórico não se
+perde. As senhas de dias anteriores vão para senha_arquivo com o mesmo id, em
+lotes de ARQUIVO_LOTE (INSERT ... SELECT + DELETE, um commit por lote, para
+não segurar o banco enquanto os guichês chamam senhas).
+
+Quando: na primeira emissão de cada dia, em segundo plano
+(ARQUIVO_AUTOMATICO), no botão "Arquivar Dados Antigos" dos relatórios e
+pelo script arquivar_senhas.py da raiz.
+
+Os relatórios leem as duas tabelas: linhas_relatorio continua no arquivo
+quando o período alcança dias arquivados (as senhas arquivadas são sempre
+mais antigas que as da tabela senha), estatísticas e totais usam
+todas_as_senhas() (UNION ALL).
+"""
+import threading
+from datetime import datetime, time, timezone
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import func, insert, select, union_all
+
+from . import db
+from .fila import motor_fila
+from .models import Senha, SenhaArquivo
+
+TZ_MANAUS = ZoneInfo('America/Manaus')
+
+# Mesma ordem nas duas tabelas (INSERT ... SELECT e UNION ALL)
+COLUNAS = [coluna.name for coluna in Senha.__table__.columns]
+
+
+def inicio_do_dia(agora: datetime = None) -> datetime:
+    """Meia-noite de hoje em Manaus, em UTC sem fuso (como gerado_em)"""
+    hoje = (agora or datetime.now(TZ_MANAUS)).astimezone(TZ_MANAUS).date()
+    return datetime.combine(hoje, time.min, TZ_MANAUS).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def todas_as_senhas():
+    """senha + senha_arquivo como uma subconsulta com as colunas de senha"""
+    return union_all(
+        select(*(Senha.__table__.c[coluna] for coluna in COLUNAS)),
+        select(*(SenhaArquivo.__table__.c[coluna] for coluna in COLUNAS)),
+    ).subquery('todas_senhas')
+
+
+def alcanca_arquivo(desde: datetime = None) -> bool:
+    """Um período a partir de `desde` (None = desde sempre) inclui senhas arquivadas?"""
+    mais_recente = db.session.query(func.max(SenhaArquivo.gerado_em)).scalar()
+    return mais_recente is not None and (desde is None or desde <= mais_recente)
+
+
+class ArquivoSenhas:
+    """Move as senhas de dias encerrados da tabela senha para senha_arquivo"""
+
+    def __init__(self):
+        self.lote = 5000
+        self.automatico = True
+        self._lock = threading.Lock()
+        self._dia_agendado = None
+
+    def configurar(self, config: dict) -> None:
+        """Aplica parâmetros do app.config (chamado em create_app)"""
+        self.lote = config.get('ARQUIVO_LOTE', self.lote)
+        self.automatico = config.get('ARQUIVO_AUTOMATICO', self.automatico)
+
+    def arquivar(self, ate: datetime = None) -> int:
+        """Move as senhas geradas antes de `ate` (padrão: início do dia); retorna quantas
+
+        Faz commit a cada lote. A senha de maior id nunca sai da tabela: sem
+        AUTOINCREMENT o SQLite numeraria as próximas a partir de 1, repetindo
+        ids do arquivo. Requer app context.
+        """
+        ate = ate or inicio_do_dia()
+        senha = Senha.__table__
+        total = 0
+        with self._lock:
+            maior_id = db.session.query(func.max(Senha.id)).scalar()
+            while maior_id is not None:
+                ids = (select(senha.c.id)
+                       .where(senha.c.gerado_em < ate, senha.c.id < maior_id)
+                       .order_by(senha.c.id)
+                       .limit(self.lote)
+                       .subquery())
+                ultimo = db.session.execute(select(func.max(ids.c.id))).scalar()
+                if ultimo is None:
+                    break
+                lote = (senha.c.gerado_em < ate, senha.c.id <= ultimo)
+                aguardando = db.session.execute(
+                    select(senha.c.id).where(*lote, senha.c.chamado == False)
+                ).scalars().all()
+                db.session.execute(insert(SenhaArquivo.__table__).from_select(
+                    COLUNAS, select(*(senha.c[coluna] for coluna in COLUNAS)).where(*lote)))
+                total += db.session.execute(senha.delete().where(*lote)).rowcount
+                db.session.commit()
+                # Senhas de dias anteriores que ninguém chamou saem da fila ao vivo
+                for senha_id in aguardando:
+                    motor_fila.descartar(senha_id)
+        if total:
+            print(f"📦 {total} senhas anteriores a {ate:%d/%m/%Y %H:%M} (UTC) movidas para o arquivo")
+        return total
+
+    def agendar(self) -> None:
+        """Uma vez por dia (primeira emissão), arquiva os dias anteriores em segundo plano"""
+        hoje = datetime.now(TZ_MANAUS).date()
+        if not self.automatico or self._dia_agendado == hoje:
+            return
+        self._dia_agendado = hoje
+        app = current_app._get_current_object()
+        threading.Thread(target=self._arquivar_em_segundo_plano, args=(app,),
+                         name='arquivo-senhas', daemon=True).start()
+
+    def _arquivar_em_segundo_plano(self, app) -> None:
+        with app.app_context():
+            try:
+                self.arquivar()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro ao arquivar senhas: {e}")
+            finally:
+                db.session.remove()
+
+
+# Instância global usada pelas rotas
+arquivo_senhas = ArquivoSenhas()
@@ -0,0 +1,400 @@
+"""
+Caches em memória do processo
+
+UltimasChamadas mantém as 15 últimas senhas chamadas já serializadas em JSON,
+de modo que /fila_json e /ultima_chamada (consultados várias vezes por segundo
+por cada display) não precisem tocar no SQLite.
+
+ConfigCache guarda uma cópia imutável de ConfiguracaoSistema, recarregada
+quando as rotas de configuração salvam alterações; FilasCache faz o mesmo com
+as filas de atendimento.
+
+ChamadasPorFila mantém um UltimasChamadas por fila para os displays que
+exibem apenas uma fila (/fila_json?fila=<id>).
+
+GuichesAtivos lembra quais guichês chamaram senhas recentemente em cada fila
+(usado na pré-geração dos áudios de anúncio).
+
+Observação: os caches são por processo; o servidor roda como processo único
+com threads (ver run.py), e todas as chamadas passam pelas rotas que os atualizam.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+
+from . import db
+from .models import Senha, ConfiguracaoSistema, Fila, FILA_PADRAO
+
+TZ_BRASIL = ZoneInfo('America/Manaus')
+TZ_UTC = ZoneInfo('UTC')
+
+LIMITE_CHAMADAS = 15
+
+ULTIMA_VAZIA = {'senha': '', 'guiche': '...', 'chamado_em': None, 'id': None, 'fila_id': None}
+
+
+class VersaoFila:
+    """Contador monotônico de alterações da fila (emissões, chamadas, limpezas)
+
+    Usado para gerar ETags: o token de boot evita colisão de versões entre
+    reinícios do servidor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valor = 0
+        self.token = f"{os.getpid():x}{int(time.time()):x}"
+
+    @property
+    def atual(self) -> int:
+        return self._valor
+
+    def incrementar(self) -> int:
+        with self._lock:
+            self._valor += 1
+            return self._valor
+
+    def etag(self, valor: int = None) -> str:
+        return f"{self.token}-{self._valor if valor is None else valor}"
+
+
+def _formatar_brasil(utc_dt):
+    """Converte datetime UTC (naive) para string no horário de Manaus"""
+    if utc_dt is None:
+        return None
+    if utc_dt.tzinfo is None:
+        utc_dt = utc_dt.replace(tzinfo=TZ_UTC)
+    return utc_dt.astimezone(TZ_BRASIL).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def senha_completa(senha: Senha) -> str:
+    """Se número for 0 (chamada personalizada), mostra só a sigla"""
+    return senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
+
+
+def dados_chamada(senha: Senha) -> dict:
+    """Dados de uma chamada no formato de /ultima_chamada e do stream de eventos"""
+    return {
+        'senha': senha_completa(senha),
+        'guiche': senha.guiche or '...',
+        'chamado_em': _formatar_brasil(senha.chamado_em),
+        'id': senha.id,
+        'fila_id': senha.fila_id or FILA_PADRAO
+    }
+
+
+def _serializar(dados) -> bytes:
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class UltimasChamadas:
+    """Ring buffer thread-safe com as últimas senhas chamadas (ordem: id desc)"""
+
+    def __init__(self, limite: int = LIMITE_CHAMADAS, fila_id: int = None):
+        self.limite = limite
+        self.fila_id = fila_id  # None = todas as filas
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        self._carregado = False
+        self._itens = {}        # id -> (item serializável, gerado_em, chamado_em)
+        self._fila_bytes = b''
+        self._ultima_bytes = _serializar(ULTIMA_VAZIA)
+        self._ultima = dict(ULTIMA_VAZIA)
+        self.versao = 0         # valor de versao_fila na última alteração
+
+    # ------------------------------------------------------------------
+    # Carga inicial
+    # ------------------------------------------------------------------
+    def carregar(self) -> None:
+        """(Re)carrega o buffer a partir do banco. Requer app context."""
+        consulta = Senha.query.filter_by(chamado=True)
+        if self.fila_id is not None:
+            # Índice (fila_id, chamado, id): não lê senhas das outras filas
+            consulta = consulta.filter_by(fila_id=self.fila_id)
+        senhas = (consulta
+                  .order_by(Senha.id.desc())
+                  .limit(self.limite)
+                  .all())
+        ultima = (consulta
+                  .order_by(Senha.chamado_em.desc())
+                  .first())
+
+        with self._lock:
+            self._itens = {s.id: self._item(s) for s in senhas}
+            self._ultima = dados_chamada(ultima) if ultima else dict(ULTIMA_VAZIA)
+            self._publicar()
+            self._carregado = True
+
+    def _garantir_carregado(self) -> None:
+        if self._carregado:
+            return
+        with self._lock_carga:
+            if not self._carregado:
+                self.carregar()
+
+    # ------------------------------------------------------------------
+    # Atualização (chamada pelas rotas após o commit)
+    # ------------------------------------------------------------------
+    def registrar(self, senha: Senha) -> None:
+        """Registra uma chamada/rechamada recém-gravada no banco"""
+        self._garantir_carregado()
+        item = self._item(senha)
+        ultima = dados_chamada(senha)
+
+        with self._lock:
+            self._itens[senha.id] = item
+            if len(self._itens) > self.limite:
+                # Mantém apenas as `limite` maiores ids, como a query original
+                for id_antigo in sorted(self._itens)[:len(self._itens) - self.limite]:
+                    del self._itens[id_antigo]
+            self._ultima = ultima
+            self._publicar()
+
+    # ------------------------------------------------------------------
+    # Leitura (sem lock: apenas troca de referência)
+    # ------------------------------------------------------------------
+    def fila_json(self) -> bytes:
+        """Corpo pronto da resposta de /fila_json"""
+        self._garantir_carregado()
+        return self._fila_bytes
+
+    def ultima_json(self) -> bytes:
+        """Corpo pronto da resposta de /ultima_chamada"""
+        self._garantir_carregado()
+        return self._ultima_bytes
+
+    def ultima(self) -> dict:
+        self._garantir_carregado()
+        return self._ultima
+
+    def senhas(self) -> list:
+        """Itens atuais do buffer (mais recente primeiro)"""
+        self._garantir_carregado()
+        itens = self._itens
+        return [itens[i][0] for i in sorted(itens, reverse=True)]
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _item(senha: Senha):
+        item = {
+            'id': senha.id,
+            'sigla': senha.sigla,
+            'numero': senha.numero,
+            'chamado': senha.chamado,
+            'chamado_em': _formatar_brasil(senha.chamado_em),
+            'senha_completa': senha_completa(senha),
+            'guiche': senha.guiche or ''
+        }
+        return item, senha.gerado_em, senha.chamado_em
+
+    def _publicar(self) -> None:
+        """Gera os bytes servidos pelos endpoints (chamar com o lock adquirido)"""
+        ordenados = [self._itens[i] for i in sorted(self._itens, reverse=True)]
+        versao = max((chamado_em or gerado_em for _, gerado_em, chamado_em in ordenados
+                      if (chamado_em or gerado_em)), default=datetime.utcnow()).isoformat()
+        self._fila_bytes = _serializar({'versao': versao, 'senhas': [item for item, _, _ in ordenados]})
+        self._ultima_bytes = _serializar(self._ultima)
+        self.versao = versao_fila.incrementar()
+
+    @property
+    def etag(self) -> str:
+        """ETag compartilhada por /fila_json e /ultima_chamada"""
+        self._garantir_carregado()
+        return versao_fila.etag(self.versao)
+
+
+class ChamadasPorFila:
+    """Um UltimasChamadas por fila, criado no primeiro acesso ao feed da fila"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    def obter(self, fila_id: int):
+        """Buffer da fila; None se a fila não existe (o id vem de /fila_json, sem login)"""
+        buffer = self._buffers.get(fila_id)
+        if buffer is None:
+            if fila_id not in filas_cache.todas():
+                return None
+            with self._lock:
+                buffer = self._buffers.setdefault(fila_id, UltimasChamadas(fila_id=fila_id))
+        return buffer
+
+    def registrar(self, senha: Senha) -> None:
+        # Buffers ainda não criados carregam do banco no primeiro acesso
+        buffer = self._buffers.get(senha.fila_id or FILA_PADRAO)
+        if buffer is not None:
+            buffer.registrar(senha)
+
+    def carregar(self) -> None:
+        """Cria e (re)carrega o buffer de cada fila cadastrada. Requer app context."""
+        for fila_id in list(filas_cache.todas()):
+            self.obter(fila_id).carregar()
+
+
+class GuichesAtivos:
+    """Última chamada de cada guichê, por fila"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carregado = False
+        self._ultimas = {}      # (fila_id, guiche) -> chamado_em (UTC)
+        self.janela = timedelta(hours=12)   # histórico lido do banco na carga
+
+    def carregar(self) -> None:
+        """Guichês que chamaram nas últimas horas. Requer app context."""
+        linhas = (db.session.query(Senha.fila_id, Senha.guiche, db.func.max(Senha.chamado_em))
+                  .filter(Senha.chamado == True, Senha.guiche.isnot(None),
+                          Senha.chamado_em >= datetime.utcnow() - self.janela)
+                  .group_by(Senha.fila_id, Senha.guiche)
+                  .all())
+        with self._lock:
+            self._ultimas = {(fila_id or FILA_PADRAO, guiche): chamado_em
+                             for fila_id, guiche, chamado_em in linhas if guiche}
+            self._carregado = True
+
+    def _garantir_carregado(self) -> None:
+        if not self._carregado:
+            self.carregar()
+
+    def registrar(self, senha: Senha) -> None:
+        if not senha.guiche or not senha.chamado_em:
+            return
+        self._garantir_carregado()
+        with self._lock:
+            self._ultimas[(senha.fila_id or FILA_PADRAO, senha.guiche)] = senha.chamado_em
+
+    def ativos(self, fila_id: int, limite: int, minutos: int = 60) -> list:
+        """Guichês que chamaram nos últimos `minutos`: primeiro os da fila, mais recentes antes"""
+        self._garantir_carregado()
+        desde = datetime.utcnow() - timedelta(minutes=minutos)
+        with self._lock:
+            recentes = [(fila == fila_id, chamado_em, guiche)
+                        for (fila, guiche), chamado_em in self._ultimas.items() if chamado_em >= desde]
+        guiches = []
+        for _, _, guiche in sorted(recentes, reverse=True):
+            if guiche not in guiches:
+                guiches.append(guiche)
+                if len(guiches) == limite:
+                    break
+        return guiches
+
+
+# Cópia somente-leitura de uma linha de ConfiguracaoSistema (mesmos atributos)
+ConfiguracaoSnapshot = namedtuple(
+    'ConfiguracaoSnapshot', [c.key for c in ConfiguracaoSistema.__table__.columns]
+)
+
+
+class ConfigCache:
+    """Cache da configuração do sistema, invalidado ao salvar
+
+    A leitura normal não consulta o banco. A cada CONFIG_CACHE_REVALIDAR
+    segundos é feita uma consulta mínima da coluna `geracao`, para que
+    processos diferentes percebam alterações salvas por outro processo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._carregado = False
+        self._verificado_em = 0.0
+        self.geracao = 0
+
+    def obter(self):
+        """Retorna o snapshot atual (ou None se não houver configuração)"""
+        agora = time.monotonic()
+        intervalo = current_app.config.get('CONFIG_CACHE_REVALIDAR', 5)
+        if self._carregado and agora - self._verificado_em < intervalo:
+            return self._snapshot
+
+        with self._lock:
+            if not self._carregado:
+                self._carregar()
+            elif agora - self._verificado_em >= intervalo:
+                geracao_banco = db.session.query(ConfiguracaoSistema.geracao).limit(1).scalar()
+                if (geracao_banco or 0) != self.geracao:
+                    self._carregar()
+            self._verificado_em = agora
+        return self._snapshot
+
+    def invalidar(self) -> None:
+        """Chamar após o commit das rotas que alteram a configuração"""
+        with self._lock:
+            self._carregado = False
+
+    def _carregar(self) -> None:
+        config = ConfiguracaoSistema.query.first()
+        if config:
+            self._snapshot = ConfiguracaoSnapshot(
+                **{campo: getattr(config, campo) for campo in ConfiguracaoSnapshot._fields}
+            )
+            self.geracao = config.geracao or 0
+        else:
+            self._snapshot = None
+            self.geracao = 0
+        self._carregado = True
+
+
+FilaSnapshot = namedtuple('FilaSnapshot', [c.key for c in Fila.__table__.columns])
+
+
+class FilasCache:
+    """Filas de atendimento em memória (cópias imutáveis, por id)
+
+    Recarregado quando a geração da configuração muda: as rotas que alteram
+    filas chamam marcar_config_alterada, como as de configuração.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filas = None
+        self._geracao = None
+
+    def todas(self) -> dict:
+        """{id: FilaSnapshot} de todas as filas, ordenadas por id"""
+        config_cache.obter()  # revalida a geração periodicamente
+        if self._filas is None or self._geracao != config_cache.geracao:
+            with self._lock:
+                if self._filas is None or self._geracao != config_cache.geracao:
+                    self._carregar()
+        return self._filas
+
+    def ativas(self) -> list:
+        return [fila for fila in self.todas().values() if fila.ativa]
+
+    def obter(self, fila_id: int):
+        return self.todas().get(fila_id)
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._filas = None
+
+    def _carregar(self) -> None:
+        self._geracao = config_cache.geracao
+        self._filas = {
+            fila.id: FilaSnapshot(**{campo: getattr(fila, campo) for campo in FilaSnapshot._fields})
+            for fila in Fila.query.order_by(Fila.id).all()
+        }
+
+
+def marcar_config_alterada(config: ConfiguracaoSistema) -> None:
+    """Incrementa a geração da linha (antes do commit) para invalidar outros processos"""
+    config.geracao = (config.geracao or 0) + 1
+
+
+# Instâncias globais usadas pelas rotas
+versao_fila = VersaoFila()
+ultimas_chamadas = UltimasChamadas()
+chamadas_por_fila = ChamadasPorFila()
+config_cache = ConfigCache()
+filas_cache = FilasCache()
+guiches_ativos = GuichesAtivos()
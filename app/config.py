@@ -13,6 +13,9 @@ class Config:
     # Configurações de sessão
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     SESSION_TIMEOUT = timedelta(hours=8)
+    # O cookie só é reenviado quando a sessão muda (ultimo_uso é renovado a
+    # cada minuto em controlar_sessao_por_inatividade), e não a cada requisição
+    SESSION_REFRESH_EACH_REQUEST = False
     
     # Configurações de impressora
     IMPRESSORAS = {
@@ -27,6 +30,26 @@ class Config:
             'timeout': 5
         }
     }
+
+    # Spooler de impressão (um worker por impressora)
+    IMPRESSAO_FILA_MAX = 50       # trabalhos pendentes por impressora
+    IMPRESSAO_TENTATIVAS = 3      # tentativas antes de marcar como falha
+    IMPRESSAO_TIMEOUT = 5         # segundos por tentativa
+    IMPRESSAO_VERIFICACAO = 30    # segundos ociosa até verificar a impressora (DLE EOT)
+
+    # Onde fica o contador do intercalamento (normais desde a última preferencial):
+    # 'memoria' ou 'banco' (tabela estado_fila, sobrevive a reinícios). O sistema
+    # roda em um único processo (run.py); 'banco' não habilita vários workers
+    FILA_CONTADOR_BACKEND = os.environ.get('FILA_CONTADOR_BACKEND', 'memoria')
+
+    # Layout do ticket (compilado uma vez; ver TemplateTicket em impressao.py)
+    TICKET_LAYOUT = {
+        'instituicao': 'IAAM',
+        'subtitulo': 'Sistema de Senhas',
+        'mensagem': ['Fique atento ao painel', 'de chamadas', '', 'Obrigado pela preferencia!'],
+        'qrcode': '',             # ex.: 'https://exemplo.com/pesquisa?senha={senha}'
+        'codigo_barras': False,
+    }
     
     # Configurações TTS (chave só via ambiente — nunca commitar segredos)
     TTS_AZURE_KEY = os.environ.get('TTS_AZURE_KEY', '').strip()
@@ -37,7 +60,40 @@ class Config:
         'TTS_AZURE_COGNITIVE_BASE', 'https://brazilsouth.api.cognitive.microsoft.com/'
     )
     TTS_DEFAULT_VOICE = "pt-BR-FranciscaNeural"
-    TTS_TIMEOUT = 10
+    TTS_TIMEOUT = 10                # leitura (s); conexão em TTS_TIMEOUT_CONEXAO
+    TTS_TIMEOUT_CONEXAO = 3.05
+    # Cliente do Azure: sínteses simultâneas e disjuntor
+    TTS_MAX_CONCORRENCIA = 4
+    TTS_ESPERA_VAGA = 2             # segundos esperando vaga antes de recusar
+    TTS_CIRCUITO_FALHAS = 3         # falhas seguidas que abrem o disjuntor
+    TTS_CIRCUITO_ABERTO_S = 30      # tempo recusando antes de testar de novo
+    # Cache em disco dos áudios gerados (LRU limitado por tamanho)
+    TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache_tts'
+    )
+    TTS_CACHE_MAX_MB = 100
+    # Fragmentos de anúncio ("Senha", letras, dígitos, guichês) montados sem rede:
+    # 'preferir' (sempre), 'contingencia' (só com o Azure fora) ou 'desligado'
+    TTS_FRAGMENTOS_MODO = os.environ.get('TTS_FRAGMENTOS_MODO', 'preferir')
+    TTS_FRAGMENTOS_GUICHES = 20
+    # Pré-geração do anúncio na emissão, para os guichês que chamaram nos últimos minutos
+    TTS_PREGERACAO = os.environ.get('TTS_PREGERACAO', '1') != '0'
+    TTS_PREGERACAO_GUICHES = 8      # máximo de guichês (sínteses) por senha emitida
+    TTS_PREGERACAO_JANELA_MIN = 60
+    TTS_PREGERACAO_FILA_MAX = 200
+
+    # Relatórios personalizados gerados em segundo plano (ver relatorios.py)
+    RELATORIOS_DIR = os.environ.get('RELATORIOS_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'relatorios_gerados'
+    )
+    RELATORIOS_WORKERS = 2        # relatórios gerados ao mesmo tempo
+    RELATORIOS_FILA_MAX = 20      # pedidos aguardando um worker
+    RELATORIOS_HISTORICO = 50     # trabalhos (e arquivos) mantidos para download/reuso
+    RELATORIOS_PROCESSOS = 2      # processos que renderizam PDF e Excel do pacote em paralelo
+
+    # Arquivo das senhas de dias encerrados (ver arquivo.py)
+    ARQUIVO_AUTOMATICO = True     # arquiva na primeira emissão de cada dia
+    ARQUIVO_LOTE = 5000           # senhas movidas por transação
     
     # Configurações de prioridade padrão
     PRIORIDADE_PADRAO = 'intercalamento'
@@ -79,6 +135,8 @@ class Config:
     # Configurações de cache
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
+    # Intervalo (s) para o cache de ConfiguracaoSistema conferir a geração no banco
+    CONFIG_CACHE_REVALIDAR = 5
     
     # Configurações de logging
     LOG_LEVEL = 'INFO'
@@ -0,0 +1,88 @@
+"""
+Canal de eventos (Server-Sent Events) para os displays
+
+Cada display conectado em /eventos_chamadas recebe uma fila própria; as rotas
+de chamada publicam um evento "chamada" logo após o commit, evitando que as
+TVs precisem consultar o banco dezenas de vezes por segundo.
+
+Observação: o canal é em memória, portanto vale para o processo atual
+(o servidor roda como processo único com threads, ver run.py).
+"""
+import json
+import queue
+import threading
+
+
+class CanalEventos:
+    """Distribui eventos para todos os assinantes conectados"""
+
+    def __init__(self, tamanho_fila: int = 50):
+        self._assinantes = {}   # fila de mensagens -> fila de atendimento (None = todas)
+        self._lock = threading.Lock()
+        self.tamanho_fila = tamanho_fila
+
+    def assinar(self, fila_id: int = None) -> queue.Queue:
+        """Registra um novo assinante e retorna sua fila de mensagens
+
+        Com `fila_id`, recebe apenas os eventos daquela fila de atendimento.
+        """
+        fila = queue.Queue(maxsize=self.tamanho_fila)
+        with self._lock:
+            self._assinantes[fila] = fila_id
+        return fila
+
+    def cancelar(self, fila: queue.Queue) -> None:
+        """Remove o assinante (conexão encerrada)"""
+        with self._lock:
+            self._assinantes.pop(fila, None)
+
+    @property
+    def total_assinantes(self) -> int:
+        return len(self._assinantes)
+
+    def publicar(self, evento: str, dados: dict) -> None:
+        """Envia o evento para todos os assinantes sem bloquear a requisição"""
+        mensagem = formatar_sse(evento, dados)
+        fila_evento = dados.get('fila_id')
+        with self._lock:
+            assinantes = [fila for fila, fila_id in self._assinantes.items()
+                          if fila_id is None or fila_id == fila_evento]
+
+        for fila in assinantes:
+            try:
+                fila.put_nowait(mensagem)
+            except queue.Full:
+                # Display travado/lento: descarta o acumulado e encerra o stream,
+                # o cliente reconecta e volta a sincronizar pelo polling
+                self.cancelar(fila)
+                with fila.mutex:
+                    fila.queue.clear()
+                fila.put_nowait(None)
+
+    def transmitir(self, fila: queue.Queue, intervalo_heartbeat: float = 15.0):
+        """Gerador usado pela resposta text/event-stream"""
+        # Sugere ao navegador reconectar em 2s caso a conexão caia
+        yield "retry: 2000\n\n"
+        try:
+            while True:
+                try:
+                    mensagem = fila.get(timeout=intervalo_heartbeat)
+                except queue.Empty:
+                    # Comentário SSE mantém a conexão viva através de proxies/WiFi
+                    yield ": heartbeat\n\n"
+                    continue
+                if mensagem is None:
+                    return
+                yield mensagem
+        finally:
+            self.cancelar(fila)
+
+
+def formatar_sse(evento: str, dados: dict) -> str:
+    """Formata uma mensagem no protocolo Server-Sent Events"""
+    payload = json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+    return f"event: {evento}\ndata: {payload}\n\n"
+
+
+# Instância global usada pelas rotas
+canal_chamadas = CanalEventos()
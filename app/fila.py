@@ -0,0 +1,265 @@
+"""
+Motor da fila de espera em memória
+
+Mantém as senhas aguardando de cada fila de atendimento em duas deques
+(normal e preferencial) ordenadas por id, com início e tamanho em O(1), além
+do horário da última chamada preferencial da fila. O PrioridadeService decide a próxima senha a partir daqui, sem
+consultar o banco; só a senha escolhida é carregada e atualizada.
+
+A sincronização é feita pelas rotas após o commit (emissão e chamadas) e a
+carga inicial vem do banco no primeiro uso. Remoções são preguiçosas: a senha
+sai do índice `_aguardando` e a deque descarta o id quando ele chega ao início.
+
+Observação: assim como os caches de cache.py, vale para o processo atual.
+
+ContadorIntercalamento guarda quantas normais foram chamadas desde a última
+preferencial, compartilhado por todos os guichês (antes ficava na sessão de
+cada atendente). Em memória por padrão, ou na tabela estado_fila para
+sobreviver a reinícios (FILA_CONTADOR_BACKEND = 'banco'). O sistema roda em um
+único processo (run.py): o backend 'banco' não torna possível usar vários
+workers, pois a fila em memória, a última preferencial e os caches continuam
+sendo do processo.
+"""
+import bisect
+import threading
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+
+from . import db
+from .models import Senha, EstadoFila, FILA_PADRAO
+
+TIPOS = ('normal', 'preferencial')
+
+
+class _EsperaFila:
+    """Estado de uma fila de atendimento: uma deque por tipo de paciente"""
+
+    __slots__ = ('filas', 'tamanhos', 'ultima_preferencial_em')
+
+    def __init__(self):
+        self.filas = {tipo: deque() for tipo in TIPOS}
+        self.tamanhos = dict.fromkeys(TIPOS, 0)
+        self.ultima_preferencial_em = None      # chamado_em (UTC) da última preferencial
+
+
+class MotorFila:
+    """Senhas aguardando, por fila de atendimento e tipo de paciente"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        self._carregado = False
+        self._esperas = {}                      # fila_id -> _EsperaFila
+        self._aguardando = {}                   # id -> (fila_id, tipo)
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+    def carregar(self) -> None:
+        """(Re)constrói as filas a partir do banco. Requer app context."""
+        aguardando = (db.session.query(Senha.id, Senha.fila_id, Senha.tipo_paciente)
+                      .filter(Senha.chamado == False)
+                      .order_by(Senha.id)
+                      .all())
+        ultimas_pref = (db.session.query(Senha.fila_id, db.func.max(Senha.chamado_em))
+                        .filter(Senha.chamado == True, Senha.tipo_paciente == 'preferencial')
+                        .group_by(Senha.fila_id)
+                        .all())
+
+        esperas = {}
+        indice = {}
+        for senha_id, fila_id, tipo in aguardando:
+            fila_id, tipo = fila_id or FILA_PADRAO, self._tipo(tipo)
+            espera = esperas.get(fila_id) or esperas.setdefault(fila_id, _EsperaFila())
+            espera.filas[tipo].append(senha_id)
+            espera.tamanhos[tipo] += 1
+            indice[senha_id] = (fila_id, tipo)
+        for fila_id, chamado_em in ultimas_pref:
+            espera = esperas.setdefault(fila_id or FILA_PADRAO, _EsperaFila())
+            if espera.ultima_preferencial_em is None or chamado_em > espera.ultima_preferencial_em:
+                espera.ultima_preferencial_em = chamado_em
+
+        with self._lock:
+            self._esperas = esperas
+            self._aguardando = indice
+            self._carregado = True
+
+    def _garantir_carregado(self) -> None:
+        if self._carregado:
+            return
+        with self._lock_carga:
+            if not self._carregado:
+                self.carregar()
+
+    def _espera(self, fila_id: int) -> _EsperaFila:
+        """Estado da fila, criado se ainda não existir (chamar com o lock)"""
+        espera = self._esperas.get(fila_id)
+        if espera is None:
+            espera = self._esperas[fila_id] = _EsperaFila()
+        return espera
+
+    # ------------------------------------------------------------------
+    # Sincronização (chamada pelas rotas após o commit)
+    # ------------------------------------------------------------------
+    def adicionar(self, senha: Senha) -> None:
+        """Senha recém-emitida entra no fim da fila do seu tipo"""
+        self._garantir_carregado()
+        if senha.chamado:
+            return
+        fila_id, tipo = senha.fila_id or FILA_PADRAO, self._tipo(senha.tipo_paciente)
+        with self._lock:
+            if senha.id in self._aguardando:
+                return
+            espera = self._espera(fila_id)
+            fila = espera.filas[tipo]
+            if fila and fila[-1] > senha.id:
+                # Commits concorrentes podem chegar fora de ordem
+                bisect.insort(fila, senha.id)
+            else:
+                fila.append(senha.id)
+            self._aguardando[senha.id] = (fila_id, tipo)
+            espera.tamanhos[tipo] += 1
+
+    def registrar_chamada(self, senha: Senha) -> None:
+        """Chamada, rechamada ou chamada específica gravada no banco"""
+        self._garantir_carregado()
+        with self._lock:
+            self._remover(senha.id)
+            if senha.tipo_paciente == 'preferencial' and senha.chamado_em:
+                espera = self._espera(senha.fila_id or FILA_PADRAO)
+                if espera.ultima_preferencial_em is None or senha.chamado_em > espera.ultima_preferencial_em:
+                    espera.ultima_preferencial_em = senha.chamado_em
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def primeiro(self, tipo: str, fila_id: int = FILA_PADRAO) -> Optional[int]:
+        """Id da senha mais antiga aguardando do tipo na fila (ou None)"""
+        self._garantir_carregado()
+        with self._lock:
+            espera = self._esperas.get(fila_id)
+            if espera is None:
+                return None
+            fila = espera.filas[tipo]
+            while fila and fila[0] not in self._aguardando:
+                fila.popleft()
+            return fila[0] if fila else None
+
+    def mais_antiga(self, fila_id: int = FILA_PADRAO) -> Optional[int]:
+        """Id da senha aguardando há mais tempo na fila, de qualquer tipo"""
+        ids = [i for i in (self.primeiro(tipo, fila_id) for tipo in TIPOS) if i is not None]
+        return min(ids) if ids else None
+
+    def tamanho(self, tipo: str, fila_id: int = FILA_PADRAO) -> int:
+        self._garantir_carregado()
+        espera = self._esperas.get(fila_id)
+        return espera.tamanhos[tipo] if espera else 0
+
+    def ultima_preferencial_em(self, fila_id: int = FILA_PADRAO):
+        """chamado_em (UTC) da última preferencial chamada na fila"""
+        self._garantir_carregado()
+        espera = self._esperas.get(fila_id)
+        return espera.ultima_preferencial_em if espera else None
+
+    # ------------------------------------------------------------------
+    # Reserva (chamada concorrente entre guichês)
+    # ------------------------------------------------------------------
+    def reservar(self, senha_id: int) -> bool:
+        """Retira a senha da fila antes do UPDATE; False se outro guichê já a reservou"""
+        with self._lock:
+            return self._remover(senha_id)
+
+    def devolver(self, senha: Senha) -> None:
+        """Desfaz a reserva quando a gravação da chamada falhou"""
+        fila_id, tipo = senha.fila_id or FILA_PADRAO, self._tipo(senha.tipo_paciente)
+        with self._lock:
+            if senha.id in self._aguardando:
+                return
+            espera = self._espera(fila_id)
+            fila = espera.filas[tipo]
+            posicao = bisect.bisect_left(fila, senha.id)
+            if posicao == len(fila) or fila[posicao] != senha.id:
+                fila.insert(posicao, senha.id)
+            self._aguardando[senha.id] = (fila_id, tipo)
+            espera.tamanhos[tipo] += 1
+
+    def descartar(self, senha_id: int) -> None:
+        """Remove da fila uma senha que não está mais aguardando no banco"""
+        self.reservar(senha_id)
+
+    def _remover(self, senha_id: int) -> bool:
+        """Remoção preguiçosa (chamar com o lock): sai do índice, a deque limpa depois"""
+        chave = self._aguardando.pop(senha_id, None)
+        if chave is None:
+            return False
+        fila_id, tipo = chave
+        self._esperas[fila_id].tamanhos[tipo] -= 1
+        return True
+
+    @staticmethod
+    def _tipo(tipo_paciente: str) -> str:
+        return 'preferencial' if tipo_paciente == 'preferencial' else 'normal'
+
+
+class ContadorIntercalamento:
+    """Normais chamadas desde a última preferencial, por fila, comum a todos os guichês
+
+    A decisão usa o valor lido e a gravação é um compare-and-set (trocar):
+    grava o novo valor só se o contador ainda for o lido, num único UPDATE
+    condicional no banco ou sob o lock em memória. Se outro guichê avançou o
+    contador entretanto, o chamador decide de novo com o valor atual.
+    """
+
+    CHAVE = 'contador_normais'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valores = {}                      # fila_id -> valor
+        self.backend = 'memoria'
+
+    def configurar(self, config) -> None:
+        self.backend = config.get('FILA_CONTADOR_BACKEND', 'memoria')
+
+    def valor(self, fila_id: int = FILA_PADRAO) -> int:
+        """Valor atual (em memória: leitura sem lock)"""
+        if self.backend == 'banco':
+            return (db.session.query(EstadoFila.valor)
+                    .filter(EstadoFila.chave == self._chave(fila_id))
+                    .scalar()) or 0
+        return self._valores.get(fila_id, 0)
+
+    def trocar(self, fila_id: int, esperado: int, novo: int) -> bool:
+        """Grava `novo` só se o contador ainda valer `esperado` (com commit); True se gravou"""
+        if self.backend == 'banco':
+            tabela = EstadoFila.__table__
+            if esperado == 0:
+                # Sem linha o valor é 0: cria a linha ou atualiza se ainda for 0
+                stmt = insert(tabela).values(chave=self._chave(fila_id), valor=novo)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[tabela.c.chave],
+                    set_={'valor': novo},
+                    where=tabela.c.valor == esperado
+                )
+            else:
+                stmt = (update(tabela)
+                        .where(tabela.c.chave == self._chave(fila_id), tabela.c.valor == esperado)
+                        .values(valor=novo))
+            gravou = db.session.execute(stmt).rowcount > 0
+            db.session.commit()
+            return gravou
+        with self._lock:
+            if self._valores.get(fila_id, 0) != esperado:
+                return False
+            self._valores[fila_id] = novo
+            return True
+
+    def _chave(self, fila_id: int) -> str:
+        return f"{self.CHAVE}:{fila_id}"
+
+
+# Instâncias globais usadas pelas rotas e pelo PrioridadeService
+motor_fila = MotorFila()
+contador_intercalamento = ContadorIntercalamento()
@@ -0,0 +1,629 @@
+"""
+Spooler de impressão das senhas
+
+Cada impressora configurada (principal/secundaria) tem uma thread própria e
+uma fila limitada de trabalhos. A emissão da senha apenas enfileira os bytes
+ESC/POS e retorna; a thread envia para a impressora com novas tentativas em
+caso de falha. O quiosque acompanha o trabalho por /api/impressao/<id>.
+
+Cada worker mantém uma conexão TCP persistente com a sua impressora
+(ConexaoImpressora), verificada por keepalive e pela consulta de status
+ESC/POS (DLE EOT) quando fica ociosa.
+
+Os bytes do ticket vêm de um TemplateTicket: cabeçalho e rodapé são montados
+uma vez por layout e a cada impressão só os campos variáveis são inseridos.
+"""
+import itertools
+import queue
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+TZ_MANAUS = ZoneInfo('America/Manaus')
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+# Layout padrão do ticket (pode ser sobrescrito por TICKET_LAYOUT no config.py)
+LAYOUT_PADRAO = {
+    'instituicao': 'IAAM',
+    'subtitulo': 'Sistema de Senhas',
+    'mensagem': ['Fique atento ao painel', 'de chamadas', '', 'Obrigado pela preferencia!'],
+    'qrcode': '',               # texto/URL do QR Code; aceita {senha}
+    'codigo_barras': False,     # imprime a senha em CODE128
+}
+
+
+class TemplateTicket:
+    """Ticket ESC/POS pré-compilado
+
+    Os blocos fixos ficam em `_partes` como bytes; os campos variáveis são
+    marcados pelo nome e preenchidos em renderizar() com um único join.
+    """
+
+    CAMPOS = ('tipo', 'senha', 'data_hora', 'codigo_barras', 'qrcode')
+
+    def __init__(self, layout: dict = None):
+        self.layout = dict(LAYOUT_PADRAO, **(layout or {}))
+        self._partes = self._compilar()
+
+    def renderizar(self, senha_completa: str, tipo_paciente: str, agora: datetime = None) -> bytes:
+        """Gera os bytes do ticket para uma senha
+
+        O tipo vem de Senha.tipo_paciente: a sigla impressa pode ter o prefixo
+        da fila na frente (ex.: LPP0012), então não serve para deduzi-lo.
+        """
+        agora = agora or datetime.now(TZ_MANAUS)
+        tipo = 'PREFERENCIAL' if tipo_paciente == 'preferencial' else 'NORMAL'
+        valores = {
+            'tipo': f"Tipo: {tipo}\n".encode('utf-8'),
+            'senha': f" {senha_completa} \n".encode('utf-8'),
+            'data_hora': agora.strftime('%d/%m/%Y - %H:%M:%S\n').encode('utf-8'),
+        }
+        if 'codigo_barras' in self._campos:
+            valores['codigo_barras'] = self._codigo_barras(senha_completa)
+        if 'qrcode' in self._campos:
+            valores['qrcode'] = self._qrcode(self.layout['qrcode'].format(senha=senha_completa))
+
+        return b''.join(valores[p] if isinstance(p, str) else p for p in self._partes)
+
+    # ------------------------------------------------------------------
+    # Compilação
+    # ------------------------------------------------------------------
+    def _compilar(self) -> list:
+        partes = []
+        atual = bytearray()
+
+        def campo(nome):
+            partes.append(bytes(atual))
+            partes.append(nome)
+            atual.clear()
+
+        layout = self.layout
+
+        # Inicializar impressora
+        atual += ESC + b'@' + b'\n'
+
+        # Cabeçalho - Nome da instituição
+        atual += ESC + b'a' + b'\x01'  # Centralizar
+        atual += ESC + b'!' + b'\x10'  # Fonte grande
+        atual += b"================================\n"
+        atual += ESC + b'!' + b'\x20'  # Fonte dupla altura
+        atual += f"{layout['instituicao']}\n".encode('utf-8')
+        atual += ESC + b'!' + b'\x00'  # Fonte normal
+        atual += f"{layout['subtitulo']}\n".encode('utf-8')
+        atual += b"================================\n"
+        atual += b'\n'
+
+        # Tipo de atendimento
+        atual += ESC + b'!' + b'\x10'  # Fonte média
+        campo('tipo')
+        atual += ESC + b'!' + b'\x00'  # Fonte normal
+        atual += b'\n'
+
+        # Número da senha - DESTAQUE
+        atual += b"--------------------------------\n"
+        atual += ESC + b'!' + b'\x38'  # Dupla altura e largura
+        atual += b"  SENHA  \n"
+        atual += b'\n'
+        campo('senha')
+        atual += b'\n'
+        atual += ESC + b'!' + b'\x00'  # Fonte normal
+        atual += b"--------------------------------\n"
+        if layout['codigo_barras']:
+            campo('codigo_barras')
+        atual += b'\n\n'
+
+        # Data e hora
+        atual += ESC + b'!' + b'\x00'  # Fonte normal
+        campo('data_hora')
+        atual += b'\n\n'
+
+        # Instruções
+        atual += b"--------------------------------\n"
+        atual += ESC + b'!' + b'\x10'  # Fonte média
+        atual += b"   AGUARDE SER CHAMADO   \n"
+        atual += ESC + b'!' + b'\x00'  # Fonte normal
+        atual += b"--------------------------------\n"
+        atual += b'\n'
+        for linha in layout['mensagem']:
+            atual += f"{linha}\n".encode('utf-8')
+
+        if layout['qrcode']:
+            if '{senha}' in layout['qrcode']:
+                campo('qrcode')
+            else:
+                atual += self._qrcode(layout['qrcode'])
+        atual += b'\n\n\n\n\n\n'
+
+        # Cortar papel
+        atual += GS + b'V' + b'\x00'
+
+        partes.append(bytes(atual))
+        self._campos = {p for p in partes if isinstance(p, str)}
+        # Descarta blocos vazios (campos consecutivos)
+        return [p for p in partes if p != b'']
+
+    @staticmethod
+    def _codigo_barras(texto: str) -> bytes:
+        dados = b'{B' + texto.encode('ascii', 'replace')
+        return (b'\n'
+                + GS + b'h' + b'\x50'          # altura
+                + GS + b'H' + b'\x02'          # texto abaixo do código
+                + GS + b'k' + b'\x49' + bytes([len(dados)]) + dados)
+
+    @staticmethod
+    def _qrcode(texto: str) -> bytes:
+        dados = texto.encode('utf-8')
+        tamanho = len(dados) + 3
+        pL, pH = tamanho % 256, tamanho // 256
+        return (b'\n'
+                + GS + b'(k' + b'\x04\x00' + b'1A2\x00'        # modelo 2
+                + GS + b'(k' + b'\x03\x00' + b'1C\x06'         # tamanho do módulo
+                + GS + b'(k' + b'\x03\x00' + b'1E1'             # correção de erro M
+                + GS + b'(k' + bytes([pL, pH]) + b'1P0' + dados  # armazena os dados
+                + GS + b'(k' + b'\x03\x00' + b'1Q0'             # imprime
+                + b'\n')
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def obter_template(layout: dict = None) -> TemplateTicket:
+    """Template compilado para o layout (compila apenas na primeira vez)"""
+    chave = repr(sorted((layout or {}).items()))
+    template = _templates.get(chave)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(chave)
+            if template is None:
+                template = _templates[chave] = TemplateTicket(layout)
+    return template
+
+
+class TrabalhoImpressao:
+    """Um ticket a ser enviado para uma impressora"""
+
+    PENDENTE = 'pendente'
+    IMPRIMINDO = 'imprimindo'
+    IMPRESSO = 'impresso'
+    FALHOU = 'falhou'
+
+    def __init__(self, id: int, impressora: str, destino: tuple, dados: bytes, descricao: str = ''):
+        self.id = id
+        self.impressora = impressora
+        self.destino = destino          # (ip, porta)
+        self.dados = dados
+        self.descricao = descricao
+        self.status = self.PENDENTE
+        self.tentativas = 0
+        self.erro = None
+        self.criado_em = datetime.utcnow()
+        self.concluido_em = None
+        self.prazo = None               # segundos até um status final no pior caso (ver enviar)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'impressora': self.impressora,
+            'descricao': self.descricao,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'erro': self.erro,
+            'criado_em': self.criado_em.isoformat(),
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+            'prazo': self.prazo,
+        }
+
+
+def enviar_para_impressora(destino: tuple, dados: bytes, timeout: float = 5) -> None:
+    """Envia os bytes por TCP (porta RAW 9100); lança exceção em caso de falha"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(destino)
+        sock.sendall(dados)
+    finally:
+        sock.close()
+
+
+# DLE EOT n: status em tempo real (1 = impressora, 4 = sensor de papel)
+CONSULTA_STATUS = b'\x10\x04\x01' + b'\x10\x04\x04'
+STATUS_OFFLINE = 0x08           # bit 3 da resposta de DLE EOT 1
+STATUS_SEM_PAPEL = 0x60         # bits 5-6 da resposta de DLE EOT 4
+
+
+class ConexaoImpressora:
+    """Conexão persistente com uma impressora, usada apenas pelo seu worker"""
+
+    # Respostas vazias seguidas ao DLE EOT, em conexões recém-abertas, para
+    # concluir que a impressora não informa status
+    SEM_STATUS_MAX = 3
+
+    def __init__(self, nome: str, timeout: float = 5, ocioso_max: float = 15):
+        self.nome = nome
+        self.timeout = timeout
+        self.ocioso_max = ocioso_max    # acima disso, confirma a conexão antes de enviar
+        self.destino = None
+        self._sock = None
+        self._ultimo_uso = 0.0
+        self.suporta_status = None      # None = ainda não sabemos
+        self._sem_status = 0            # respostas vazias seguidas em conexões novas
+
+        # Saúde exibida no painel de administração
+        self.online = None
+        self.sem_papel = None
+        self.rtt_ms = None
+        self.rtt_medio_ms = None
+        self.impressos = 0
+        self.falhas = 0
+        self.falhas_consecutivas = 0
+        self.reconexoes = 0
+        self.ultimo_erro = None
+        self.ultima_verificacao = None
+
+    @property
+    def conectada(self) -> bool:
+        return self._sock is not None
+
+    # ------------------------------------------------------------------
+    # Envio
+    # ------------------------------------------------------------------
+    def enviar(self, destino: tuple, dados: bytes) -> None:
+        """Envia os dados reutilizando a conexão; lança exceção em caso de falha"""
+        if destino != self.destino:
+            self.fechar()
+            self.destino = destino
+
+        if self._sock is not None and self._fechada_pelo_par():
+            self.fechar()
+
+        reutilizada = self._sock is not None
+        if reutilizada and time.monotonic() - self._ultimo_uso > self.ocioso_max:
+            # Conexão ociosa pode estar "meio aberta" (impressora reiniciou)
+            reutilizada = self.verificar()
+
+        try:
+            if self._sock is None:
+                self._conectar()
+            self._sock.sendall(dados)
+        except OSError as e:
+            self.fechar()
+            if not reutilizada:
+                self._registrar_falha(e)
+                raise
+            # Conexão antiga caiu: reconecta uma vez e reenvia
+            try:
+                self._conectar()
+                self._sock.sendall(dados)
+            except OSError as e2:
+                self.fechar()
+                self._registrar_falha(e2)
+                raise
+
+        self._ultimo_uso = time.monotonic()
+        self.impressos += 1
+        self.falhas_consecutivas = 0
+        self.online = True
+
+    # ------------------------------------------------------------------
+    # Verificação de saúde
+    # ------------------------------------------------------------------
+    def verificar(self) -> bool:
+        """Confirma a conexão com DLE EOT (conectando se preciso). Retorna True se ok
+
+        Silêncio numa conexão antiga pode ser conexão meio aberta: só conta
+        como "não suporta status" em conexões recém-abertas, depois de
+        SEM_STATUS_MAX vezes seguidas (e volta a ser testado a cada reconexão).
+        """
+        if self.destino is None:
+            return False
+        self.ultima_verificacao = datetime.utcnow()
+        try:
+            nova = self._sock is None
+            if nova:
+                self._conectar()
+            if self.suporta_status is False:
+                # Impressora não responde DLE EOT: confia no keepalive do TCP
+                return True
+
+            inicio = time.monotonic()
+            self._sock.sendall(CONSULTA_STATUS)
+            resposta = self._ler(2, timeout=min(self.timeout, 2))
+            if len(resposta) < 2:
+                if not resposta and self.suporta_status is None:
+                    if not nova:
+                        # Ambíguo numa conexão antiga: repete numa conexão nova
+                        self.fechar()
+                        return self.verificar()
+                    self._sem_status += 1
+                    if self._sem_status >= self.SEM_STATUS_MAX:
+                        self.suporta_status = False
+                    return True
+                raise ConnectionError('Sem resposta ao status (DLE EOT)')
+
+            self.suporta_status = True
+            self._sem_status = 0
+            self._registrar_rtt((time.monotonic() - inicio) * 1000)
+            self.online = not (resposta[0] & STATUS_OFFLINE)
+            self.sem_papel = bool(resposta[1] & STATUS_SEM_PAPEL)
+            self._ultimo_uso = time.monotonic()
+            self.falhas_consecutivas = 0
+            return True
+        except OSError as e:
+            self.fechar()
+            self._registrar_falha(e)
+            return False
+
+    def fechar(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def saude(self) -> dict:
+        return {
+            'impressora': self.nome,
+            'destino': f'{self.destino[0]}:{self.destino[1]}' if self.destino else None,
+            'conectada': self.conectada,
+            'online': self.online,
+            'sem_papel': self.sem_papel,
+            'suporta_status': self.suporta_status,
+            'rtt_ms': self.rtt_ms,
+            'rtt_medio_ms': self.rtt_medio_ms,
+            'impressos': self.impressos,
+            'falhas': self.falhas,
+            'falhas_consecutivas': self.falhas_consecutivas,
+            'reconexoes': self.reconexoes,
+            'ultimo_erro': self.ultimo_erro,
+            'ultima_verificacao': self.ultima_verificacao.isoformat() if self.ultima_verificacao else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+    def _conectar(self) -> None:
+        inicio = time.monotonic()
+        sock = socket.create_connection(self.destino, timeout=self.timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Detecta conexões mortas em ~1 min (opções disponíveis no Linux/Windows recentes)
+        for opcao, valor in (('TCP_KEEPIDLE', 30), ('TCP_KEEPINTVL', 10), ('TCP_KEEPCNT', 3)):
+            if hasattr(socket, opcao):
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opcao), valor)
+                except OSError:
+                    pass
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._ultimo_uso = time.monotonic()
+        self.reconexoes += 1
+        if self.suporta_status is False:
+            # Testa de novo na conexão nova; _sem_status já no limite confirma com uma resposta vazia
+            self.suporta_status = None
+        self._registrar_rtt((time.monotonic() - inicio) * 1000)
+
+    def _fechada_pelo_par(self) -> bool:
+        """Detecta FIN/RST já recebidos (impressora reiniciada ou fechou a conexão)"""
+        try:
+            legivel, _, _ = select.select([self._sock], [], [], 0)
+            if not legivel:
+                return False
+            # Descarta bytes de status não solicitados; vazio = conexão encerrada
+            return self._sock.recv(256) == b''
+        except OSError:
+            return True
+
+    def _ler(self, tamanho: int, timeout: float) -> bytes:
+        self._sock.settimeout(timeout)
+        dados = b''
+        try:
+            while len(dados) < tamanho:
+                parte = self._sock.recv(tamanho - len(dados))
+                if not parte:
+                    raise ConnectionError('Conexão encerrada pela impressora')
+                dados += parte
+        except socket.timeout:
+            pass
+        finally:
+            self._sock.settimeout(self.timeout)
+        return dados
+
+    def _registrar_rtt(self, rtt_ms: float) -> None:
+        self.rtt_ms = round(rtt_ms, 1)
+        if self.rtt_medio_ms is None:
+            self.rtt_medio_ms = self.rtt_ms
+        else:
+            self.rtt_medio_ms = round(self.rtt_medio_ms * 0.8 + rtt_ms * 0.2, 1)
+
+    def _registrar_falha(self, erro: Exception) -> None:
+        self.falhas += 1
+        self.falhas_consecutivas += 1
+        self.ultimo_erro = str(erro)
+        self.online = False
+
+
+class SpoolerImpressao:
+    """Filas de impressão com um worker por impressora"""
+
+    def __init__(self, tamanho_fila: int = 50, tentativas: int = 3,
+                 intervalo_retentativa: float = 1.0, timeout: float = 5,
+                 intervalo_verificacao: float = 30, historico: int = 500):
+        self.tamanho_fila = tamanho_fila
+        self.tentativas = tentativas
+        self.intervalo_retentativa = intervalo_retentativa
+        self.timeout = timeout
+        self.intervalo_verificacao = intervalo_verificacao
+        self.historico = historico
+
+        self._lock = threading.Lock()
+        self._filas = {}                    # impressora -> queue.Queue
+        self._workers = {}                  # impressora -> Thread
+        self._conexoes = {}                 # impressora -> ConexaoImpressora
+        self._trabalhos = OrderedDict()     # id -> TrabalhoImpressao
+        self._ids = itertools.count(1)
+
+    def configurar(self, config: dict) -> None:
+        """Aplica parâmetros do app.config (chamado em create_app)"""
+        self.tamanho_fila = config.get('IMPRESSAO_FILA_MAX', self.tamanho_fila)
+        self.tentativas = config.get('IMPRESSAO_TENTATIVAS', self.tentativas)
+        self.timeout = config.get('IMPRESSAO_TIMEOUT', self.timeout)
+        self.intervalo_verificacao = config.get('IMPRESSAO_VERIFICACAO', self.intervalo_verificacao)
+
+    def tempo_maximo(self, na_frente: int = 0) -> float:
+        """Segundos até um trabalho chegar a um status final no pior caso
+
+        Cada tentativa pode levar a verificação da conexão ociosa (DLE EOT, até
+        2s) e duas conexões/envios no timeout (a reutilizada cai e reconecta);
+        entre as tentativas há as esperas crescentes. Os `na_frente` trabalhos
+        já na fila da impressora podem custar o mesmo cada um.
+        """
+        esperas = sum(self.intervalo_retentativa * 2 ** i for i in range(self.tentativas - 1))
+        por_trabalho = self.tentativas * (2 * self.timeout + 2) + esperas
+        return por_trabalho * (na_frente + 1)
+
+    # ------------------------------------------------------------------
+    # API usada pelas rotas
+    # ------------------------------------------------------------------
+    def disponivel(self, impressora: str) -> bool:
+        """Indica se a fila da impressora ainda aceita trabalhos"""
+        fila = self._filas.get(impressora)
+        return fila is None or not fila.full()
+
+    def enviar(self, impressora: str, destino: tuple, dados: bytes, descricao: str = '') -> TrabalhoImpressao:
+        """Enfileira um trabalho e retorna imediatamente
+
+        Se a fila estiver cheia o trabalho já volta com status 'falhou'.
+        """
+        fila = self._fila(impressora)
+        trabalho = TrabalhoImpressao(next(self._ids), impressora, destino, dados, descricao)
+        trabalho.prazo = self.tempo_maximo(fila.qsize())
+        with self._lock:
+            self._trabalhos[trabalho.id] = trabalho
+            while len(self._trabalhos) > self.historico:
+                self._trabalhos.popitem(last=False)
+
+        try:
+            fila.put_nowait(trabalho)
+        except queue.Full:
+            self._concluir(trabalho, TrabalhoImpressao.FALHOU, 'Fila de impressão cheia')
+        return trabalho
+
+    def status(self, trabalho_id: int):
+        trabalho = self._trabalhos.get(trabalho_id)
+        return trabalho.to_dict() if trabalho else None
+
+    def pendentes(self, impressora: str) -> int:
+        fila = self._filas.get(impressora)
+        return fila.qsize() if fila else 0
+
+    def definir_destinos(self, destinos: dict) -> None:
+        """Informa os endereços configurados e inicia os workers (verificação de saúde)
+
+        destinos: {'principal': (ip, porta), 'secundaria': (ip, porta)}
+        """
+        for impressora, destino in destinos.items():
+            self._fila(impressora)
+            conexao = self._conexoes[impressora]
+            if conexao.destino is None:
+                conexao.destino = destino
+            elif conexao.destino != destino:
+                # Alteração de IP/porta: o próprio worker troca a conexão
+                try:
+                    self._filas[impressora].put_nowait(_MudancaDestino(destino))
+                except queue.Full:
+                    pass  # o próximo trabalho já leva o destino novo
+
+    def saude(self) -> list:
+        """Saúde de cada impressora para o painel de administração"""
+        resultado = []
+        for impressora, conexao in list(self._conexoes.items()):
+            dados = conexao.saude()
+            dados['pendentes'] = self.pendentes(impressora)
+            resultado.append(dados)
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    def _fila(self, impressora: str) -> queue.Queue:
+        fila = self._filas.get(impressora)
+        if fila is not None:
+            return fila
+        with self._lock:
+            if impressora not in self._filas:
+                self._conexoes[impressora] = ConexaoImpressora(impressora, timeout=self.timeout)
+                self._filas[impressora] = queue.Queue(maxsize=self.tamanho_fila)
+                worker = threading.Thread(
+                    target=self._executar, args=(impressora,),
+                    name=f'spooler-{impressora}', daemon=True
+                )
+                self._workers[impressora] = worker
+                worker.start()
+            return self._filas[impressora]
+
+    def _executar(self, impressora: str) -> None:
+        fila = self._filas[impressora]
+        conexao = self._conexoes[impressora]
+        while True:
+            try:
+                trabalho = fila.get(timeout=self.intervalo_verificacao)
+            except queue.Empty:
+                # Ociosa: verifica a impressora para expor falhas antes do próximo ticket
+                conexao.verificar()
+                continue
+            try:
+                if isinstance(trabalho, _MudancaDestino):
+                    conexao.fechar()
+                    conexao.destino = trabalho.destino
+                else:
+                    self._imprimir(trabalho)
+            except Exception as e:  # nunca deixar o worker morrer
+                print(f'Erro inesperado no spooler ({impressora}): {e}')
+            finally:
+                fila.task_done()
+
+    def _imprimir(self, trabalho: TrabalhoImpressao) -> None:
+        trabalho.status = TrabalhoImpressao.IMPRIMINDO
+        while True:
+            trabalho.tentativas += 1
+            try:
+                self._transmitir(trabalho)
+                self._concluir(trabalho, TrabalhoImpressao.IMPRESSO)
+                return
+            except Exception as e:
+                trabalho.erro = str(e)
+                print(f'Erro ao imprimir {trabalho.descricao} '
+                      f'(tentativa {trabalho.tentativas}/{self.tentativas}): {e}')
+                if trabalho.tentativas >= self.tentativas:
+                    self._concluir(trabalho, TrabalhoImpressao.FALHOU, str(e))
+                    return
+                # Espera crescente entre tentativas (1s, 2s, 4s...)
+                time.sleep(self.intervalo_retentativa * 2 ** (trabalho.tentativas - 1))
+
+    def _transmitir(self, trabalho: TrabalhoImpressao) -> None:
+        self._conexoes[trabalho.impressora].enviar(trabalho.destino, trabalho.dados)
+
+    @staticmethod
+    def _concluir(trabalho: TrabalhoImpressao, status: str, erro: str = None) -> None:
+        trabalho.status = status
+        trabalho.erro = erro
+        trabalho.concluido_em = datetime.utcnow()
+        trabalho.dados = b''  # libera memória; o trabalho fica apenas no histórico
+
+
+class _MudancaDestino:
+    """Mensagem interna: o IP/porta da impressora mudou"""
+
+    def __init__(self, destino: tuple):
+        self.destino = destino
+
+
+# Instância global usada pelas rotas
+spooler_impressao = SpoolerImpressao()
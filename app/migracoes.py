@@ -0,0 +1,58 @@
+"""
+Migrações automáticas do banco de dados
+
+Executadas na inicialização do app: criam as tabelas que ainda não existem e
+adicionam colunas novas em bancos antigos (mesma ideia dos scripts migrar_*.py
+da raiz, mas sem exigir execução manual).
+"""
+from sqlalchemy import inspect, text
+
+from . import db
+from .models import FILA_PADRAO
+
+# (tabela, coluna, definição SQL) - apenas acrescentar ao final
+COLUNAS = [
+    ('configuracao_sistema', 'geracao', 'INTEGER NOT NULL DEFAULT 0'),
+    ('senha', 'fila_id', 'INTEGER REFERENCES fila(id)'),
+]
+
+# (nome, tabela, colunas) - índices de tabelas que já existiam
+INDICES = [
+    ('idx_fila_chamado_id', 'senha', 'fila_id, chamado, id'),
+]
+
+# Índices que deixaram de ser usados
+INDICES_REMOVIDOS = ['idx_resumo_relatorio']
+
+
+def aplicar_migracoes():
+    """Cria tabelas, colunas e índices que faltam e a fila padrão. Requer app context."""
+    tabelas_existentes = set(inspect(db.engine).get_table_names())
+    db.create_all()
+
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for tabela, coluna, definicao in COLUNAS:
+            colunas = {c['name'] for c in inspector.get_columns(tabela)}
+            if coluna not in colunas:
+                conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}"))
+                print(f"Migração: coluna {tabela}.{coluna} adicionada")
+
+        for nome, tabela, colunas in INDICES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({colunas})"))
+        for nome in INDICES_REMOVIDOS:
+            conn.execute(text(f"DROP INDEX IF EXISTS {nome}"))
+
+        # Fila padrão: recebe as senhas emitidas antes das filas existirem
+        if conn.execute(text("SELECT 1 FROM fila WHERE id = :id"), {'id': FILA_PADRAO}).first() is None:
+            conn.execute(text("INSERT INTO fila (id, nome, prefixo, ativa) VALUES (:id, 'Atendimento', '', 1)"),
+                         {'id': FILA_PADRAO})
+            print("Migração: fila padrão criada")
+        conn.execute(text("UPDATE senha SET fila_id = :id WHERE fila_id IS NULL"), {'id': FILA_PADRAO})
+
+    # Estatísticas diárias: tabela nova em banco com histórico é preenchida uma vez
+    if 'estatistica_diaria' not in tabelas_existentes and 'senha' in tabelas_existentes:
+        from .services import EstatisticaService
+        linhas = EstatisticaService(db.session).recalcular()
+        db.session.commit()
+        print(f"Migração: estatísticas diárias calculadas ({linhas} linhas)")
@@ -26,6 +26,24 @@ class Usuario(UserMixin, db.Model):
 def load_user(user_id):
     return Usuario.query.get(int(user_id))
 
+# Fila de atendimento (serviço: laboratório, triagem, faturamento...)
+FILA_PADRAO = 1  # criada pelas migrações; senhas antigas pertencem a ela
+
+class Fila(db.Model):
+    __tablename__ = 'fila'
+
+    id        = db.Column(db.Integer, primary_key=True)
+    nome      = db.Column(db.String(50), nullable=False)
+    prefixo   = db.Column(db.String(2), nullable=False, default='')  # prefixo das siglas (NP -> LNP)
+    ativa     = db.Column(db.Boolean, nullable=False, default=True)
+
+    # Prioridade própria da fila (None = usa a configuração do sistema)
+    tipo_prioridade      = db.Column(db.String(20))
+    intercalamento_valor = db.Column(db.Integer)
+    peso_normal          = db.Column(db.Integer)
+    peso_preferencial    = db.Column(db.Integer)
+    tolerancia_minutos   = db.Column(db.Integer)
+
 # Modelo de senha para a fila
 class Senha(db.Model):
     __tablename__ = 'senha'
@@ -40,6 +58,7 @@ class Senha(db.Model):
     chamado_por    = db.Column(db.Integer, db.ForeignKey('usuario.id'))
     chamado_em     = db.Column(db.DateTime, index=True)  # Índice para ordenação por chamada
     guiche         = db.Column(db.String(10))  # novo campo para armazenar o guichê
+    fila_id        = db.Column(db.Integer, db.ForeignKey('fila.id'), default=FILA_PADRAO)
 
     usuario_chamador = db.relationship('Usuario', foreign_keys=[chamado_por])
     
@@ -47,8 +66,67 @@ class Senha(db.Model):
     __table_args__ = (
         db.Index('idx_chamado_chamado_em', 'chamado', 'chamado_em'),
         db.Index('idx_tipo_chamado', 'tipo_paciente', 'chamado'),
+        db.Index('idx_fila_chamado_id', 'fila_id', 'chamado', 'id'),
     )
 
+# Senhas de dias encerrados (ver app/arquivo.py): mesmas colunas de senha, com o
+# id original; fora da fila ao vivo, lidas só pelos relatórios e estatísticas
+class SenhaArquivo(db.Model):
+    __tablename__ = 'senha_arquivo'
+
+    id             = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    numero         = db.Column(db.Integer, nullable=False)
+    sigla          = db.Column(db.String(5), nullable=False)
+    tipo_paciente  = db.Column(db.String(20), nullable=False)
+    primeira_vez   = db.Column(db.Boolean, nullable=False)
+    gerado_em      = db.Column(db.DateTime, index=True)
+    chamado        = db.Column(db.Boolean, default=False)
+    chamado_por    = db.Column(db.Integer, db.ForeignKey('usuario.id'))
+    chamado_em     = db.Column(db.DateTime)
+    guiche         = db.Column(db.String(10))
+    fila_id        = db.Column(db.Integer, db.ForeignKey('fila.id'), default=FILA_PADRAO)
+
+# Numeração diária das senhas (um contador por dia e sigla)
+class SequenciaSenha(db.Model):
+    __tablename__ = 'sequencia_senha'
+
+    data          = db.Column(db.Date, primary_key=True)       # dia no horário de Manaus
+    sigla         = db.Column(db.String(5), primary_key=True)
+    ultimo_numero = db.Column(db.Integer, nullable=False, default=0)
+
+# Estatísticas diárias consolidadas (atualizadas na emissão e na chamada)
+# Emissões ficam na linha sem usuário/guichê (0, ''); chamadas e tempos de
+# espera na linha de quem chamou. O dia é o de gerado_em, como nos relatórios.
+class EstatisticaDiaria(db.Model):
+    __tablename__ = 'estatistica_diaria'
+
+    data            = db.Column(db.Date, primary_key=True)
+    tipo_paciente   = db.Column(db.String(20), primary_key=True)
+    primeira_vez    = db.Column(db.Boolean, primary_key=True)
+    usuario_id      = db.Column(db.Integer, primary_key=True, default=0)
+    guiche          = db.Column(db.String(10), primary_key=True, default='')
+    emitidas        = db.Column(db.Integer, nullable=False, default=0)
+    chamadas        = db.Column(db.Integer, nullable=False, default=0)
+    # Esperas válidas (0 < espera <= 120 min), em segundos
+    espera_qtd      = db.Column(db.Integer, nullable=False, default=0)
+    espera_soma     = db.Column(db.Integer, nullable=False, default=0)
+    espera_min      = db.Column(db.Integer)
+    espera_max      = db.Column(db.Integer)
+    # Histograma de todas as esperas (minutos)
+    faixa_ate_5     = db.Column(db.Integer, nullable=False, default=0)
+    faixa_ate_15    = db.Column(db.Integer, nullable=False, default=0)
+    faixa_ate_30    = db.Column(db.Integer, nullable=False, default=0)
+    faixa_ate_60    = db.Column(db.Integer, nullable=False, default=0)
+    faixa_ate_120   = db.Column(db.Integer, nullable=False, default=0)
+    faixa_acima_120 = db.Column(db.Integer, nullable=False, default=0)
+
+# Estado compartilhado da fila (ex.: contador do intercalamento), por chave
+class EstadoFila(db.Model):
+    __tablename__ = 'estado_fila'
+
+    chave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
 # Modelo de vídeo na playlist
 class VideoPlaylist(db.Model):
     id          = db.Column(db.Integer, primary_key=True)
@@ -104,4 +182,8 @@ class ConfiguracaoSistema(db.Model):
     # Som de chamada do display
     som_chamada = db.Column(db.String(30), default='sino_suave')
 
+    # Incrementado a cada gravação; permite que o cache de configuração de
+    # outros processos detecte que está desatualizado
+    geracao = db.Column(db.Integer, default=0, nullable=False)
+
 
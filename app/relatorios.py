@@ -0,0 +1,1023 @@
+"""
+Geração dos relatórios personalizados (/gerar_relatorio)
+
+As senhas do relatório são lidas em lotes (yield_per) como tuplas simples,
+já com o nome de quem chamou (outer join em usuario), sem montar objetos do
+ORM nem uma lista com todas as linhas. O Excel é escrito com o openpyxl em
+modo write_only direto para um arquivo temporário e enviado em blocos, de
+modo que a memória usada não depende do tamanho do período exportado.
+
+As senhas de dias encerrados ficam em senha_arquivo (ver arquivo.py); as
+consultas daqui leem as duas tabelas.
+
+O resumo estatístico vem da tabela estatistica_diaria (RelatorioService);
+percentis de espera, mapa de calor e produção por guichê, de analise_espera.
+
+Relatórios grandes são gerados em segundo plano pela FilaRelatorios: o
+pedido recebe um id, um dos workers grava o arquivo em RELATORIOS_DIR e a
+página acompanha o progresso até o download. Pedidos do mesmo usuário com os
+mesmos filtros reaproveitam o arquivo enquanto as senhas do intervalo não mudarem.
+
+No formato "pacote" (fechamento do mês) a consulta roda uma vez só e o PDF e
+o Excel são renderizados em paralelo por processos separados, num ZIP.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .analise import analise_espera, DIAS_SEMANA
+from .arquivo import alcanca_arquivo, todas_as_senhas
+from .models import Senha, SenhaArquivo, Usuario
+from .services import RelatorioService
+
+TAMANHO_LOTE = 2000
+TAMANHO_BLOCO = 64 * 1024
+LINHAS_POR_TABELA = 100         # linhas por tabela de detalhes no PDF
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Esperas acima disso aparecem como "Inválido" (dados de teste)
+ESPERA_MAXIMA_MINUTOS = 120
+
+
+def filtros_relatorio(parametros, senhas=Senha) -> list:
+    """Critérios SQL dos filtros do formulário de relatório personalizado
+
+    `senhas`: Senha, SenhaArquivo ou as colunas de todas_as_senhas().
+    """
+    filtros = []
+    if parametros.get('data_inicio'):
+        filtros.append(senhas.gerado_em >= datetime.strptime(parametros['data_inicio'], '%Y-%m-%d'))
+    if parametros.get('data_fim'):
+        filtros.append(senhas.gerado_em <= datetime.strptime(parametros['data_fim'], '%Y-%m-%d') + timedelta(days=1))
+    if parametros.get('tipo_paciente'):
+        filtros.append(senhas.tipo_paciente == parametros['tipo_paciente'])
+    if parametros.get('primeira_vez'):
+        filtros.append(senhas.primeira_vez == (parametros['primeira_vez'] == 'true'))
+    if parametros.get('usuario_id'):
+        filtros.append(senhas.chamado_por == parametros['usuario_id'])
+    if parametros.get('chamadas_apenas') == 'on':
+        filtros.append(senhas.chamado == True)
+    return filtros
+
+
+def linhas_relatorio(parametros, lote: int = TAMANHO_LOTE):
+    """Senhas filtradas (mais recentes primeiro) como tuplas, lidas em lotes
+
+    Cada linha: (sigla, numero, tipo_paciente, primeira_vez, gerado_em,
+    chamado, chamado_em, guiche, nome de quem chamou ou None). Só as colunas
+    usadas são lidas, com o nome do usuário no mesmo SELECT (sem carregar
+    usuario_chamador por senha) e sem passar pelo identity map da sessão.
+
+    Depois da tabela senha vêm as arquivadas, se o período alcança o arquivo:
+    todas são mais antigas, então a ordem se mantém sem ordenar a união.
+    """
+    tabelas = [Senha]
+    if alcanca_arquivo(datetime.strptime(parametros['data_inicio'], '%Y-%m-%d')
+                       if parametros.get('data_inicio') else None):
+        tabelas.append(SenhaArquivo)
+    return chain.from_iterable(db.session.execute(_consulta_linhas(tabela, parametros, lote)) for tabela in tabelas)
+
+
+def _consulta_linhas(senhas, parametros, lote: int):
+    return (select(senhas.sigla, senhas.numero, senhas.tipo_paciente, senhas.primeira_vez,
+                   senhas.gerado_em, senhas.chamado, senhas.chamado_em, senhas.guiche, Usuario.nome)
+            .outerjoin(Usuario, Usuario.id == senhas.chamado_por)
+            .where(*filtros_relatorio(parametros, senhas))
+            .order_by(senhas.gerado_em.desc())
+            .execution_options(yield_per=lote))
+
+
+def descrever_filtros(parametros, nome_usuario: str = None) -> list:
+    """Filtros aplicados, em texto, para o cabeçalho dos relatórios
+
+    `nome_usuario`: nome de quem chamou já lido nas linhas do relatório; o
+    usuário só é consultado quando o filtro não trouxe nenhuma senha.
+    """
+    filtros_aplicados = []
+    if parametros.get('data_inicio'):
+        filtros_aplicados.append(f"De {parametros['data_inicio']}")
+    if parametros.get('data_fim'):
+        filtros_aplicados.append(f"Até {parametros['data_fim']}")
+    if parametros.get('tipo_paciente'):
+        tipo = 'Preferencial' if parametros['tipo_paciente'] == 'preferencial' else 'Normal'
+        filtros_aplicados.append(f"Tipo: {tipo}")
+    if parametros.get('primeira_vez'):
+        vez = 'Primeira vez' if parametros['primeira_vez'] == 'true' else 'Recorrentes'
+        filtros_aplicados.append(f"Categoria: {vez}")
+    if parametros.get('usuario_id'):
+        if nome_usuario is None:
+            nome_usuario = (db.session.query(Usuario.nome)
+                            .filter(Usuario.id == int(parametros['usuario_id']))
+                            .scalar())
+        if nome_usuario:
+            filtros_aplicados.append(f"Usuário: {nome_usuario}")
+    if parametros.get('chamadas_apenas') == 'on':
+        filtros_aplicados.append("Apenas senhas chamadas")
+    return filtros_aplicados
+
+
+def tempo_espera_minutos(chamado, gerado_em, chamado_em):
+    """Minutos de espera; None se não chamada, -1 se fora do intervalo válido"""
+    if not (chamado and chamado_em and gerado_em):
+        return None
+    minutos = int((chamado_em - gerado_em).total_seconds() / 60)
+    return minutos if 0 <= minutos <= ESPERA_MAXIMA_MINUTOS else -1
+
+
+def resumo_relatorio(parametros) -> dict:
+    """Resumo consolidado (RelatorioService) + indicadores de espera (`analise`, ver analise.py)"""
+    resumo = RelatorioService(db.session).resumo(parametros)
+    resumo['analise'] = analise_espera.analisar(parametros)
+    return resumo
+
+
+def _percentual(parte, total) -> str:
+    return f"{parte / total * 100:.1f}%" if total > 0 else '0%'
+
+
+# ----------------------------------------------------------------------
+# PDF
+# ----------------------------------------------------------------------
+def escrever_pdf(parametros, destino, gerado_por: str, progresso=None,
+                 linhas=None, resumo: dict = None, filtros_aplicados: list = None) -> int:
+    """Grava o relatório em PDF em `destino` (caminho ou arquivo); retorna o nº de senhas
+
+    `progresso(linhas)` é chamado a cada lote de senhas processadas. `linhas`,
+    `resumo` e `filtros_aplicados`, quando informados, substituem as consultas
+    ao banco (renderização fora do app, ver escrever_pacote).
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib import colors
+
+    # Linhas da tabela de detalhes, montadas antes do documento (total e nome do usuário)
+    data = [['Nº', 'TIPO', '1ª VEZ', 'GERADO EM', 'CHAMADO', 'CHAMADO POR', 'GUICHÊ', 'TEMPO ESPERA']]
+    nome_usuario = None
+    for sigla, numero, tipo, primeira_vez_senha, gerado_em, chamado, chamado_em, guiche, chamado_por \
+            in (linhas if linhas is not None else linhas_relatorio(parametros)):
+        nome_usuario = nome_usuario or chamado_por
+        chamado_por = chamado_por or 'Não chamado'
+        minutos = tempo_espera_minutos(chamado, gerado_em, chamado_em)
+        data.append([
+            f"{sigla}{numero:03d}",
+            'Pref' if tipo == 'preferencial' else 'Norm',
+            'Sim' if primeira_vez_senha else 'Não',
+            gerado_em.strftime('%d/%m %H:%M'),
+            'Sim' if chamado else 'Não',
+            chamado_por[:15] + '...' if len(chamado_por) > 15 else chamado_por,
+            guiche or '-',
+            '-' if minutos is None else ('Inválido' if minutos < 0 else f"{minutos}min")
+        ])
+        if progresso and (len(data) - 1) % TAMANHO_LOTE == 0:
+            progresso(len(data) - 1)
+    total = len(data) - 1
+
+    doc = SimpleDocTemplate(destino, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
+    elements = []
+
+    # Estilos
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1,  # Centralizado
+        fontName='Helvetica-Bold'
+    )
+
+    subtitle_style = ParagraphStyle(
+        'Subtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=20,
+        alignment=1,
+        fontName='Helvetica-Bold'
+    )
+
+    section_style = ParagraphStyle(
+        'Section',
+        parent=styles['Heading3'],
+        fontSize=12,
+        spaceAfter=15,
+        fontName='Helvetica-Bold'
+    )
+
+    # ============================================================================
+    # CABEÇALHO DO RELATÓRIO
+    # ============================================================================
+    elements.append(Paragraph("SISTEMA DE SENHAS - IAAM", title_style))
+    elements.append(Paragraph("RELATÓRIO PERSONALIZADO", subtitle_style))
+    elements.append(Spacer(1, 20))
+
+    # ============================================================================
+    # INFORMAÇÕES DO RELATÓRIO
+    # ============================================================================
+    elements.append(Paragraph("INFORMAÇÕES DO RELATÓRIO", section_style))
+
+    info_data = [
+        ['Gerado em:', datetime.now().strftime('%d/%m/%Y às %H:%M:%S')],
+        ['Gerado por:', gerado_por],
+        ['Total de registros:', str(total)],
+    ]
+
+    if filtros_aplicados is None:
+        filtros_aplicados = descrever_filtros(parametros, nome_usuario)
+
+    if filtros_aplicados:
+        info_data.append(['Filtros aplicados:', ', '.join(filtros_aplicados)])
+
+    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+    info_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    elements.append(info_table)
+    elements.append(Spacer(1, 30))
+
+    # ============================================================================
+    # RESUMO ESTATÍSTICO
+    # ============================================================================
+    if total:
+        elements.append(Paragraph("RESUMO ESTATÍSTICO", section_style))
+
+        # Estatísticas consolidadas do período (estatistica_diaria)
+        resumo = resumo or resumo_relatorio(parametros)
+        total_senhas = resumo['total_senhas']
+        senhas_normais = resumo['normais']
+        senhas_preferenciais = resumo['preferenciais']
+        primeira_vez = resumo['primeira_vez']
+        recorrentes = resumo['recorrentes']
+        senhas_chamadas = resumo['senhas_chamadas']
+        senhas_aguardando = resumo['senhas_aguardando']
+
+        # Estatísticas por tipo
+        stats_data = [
+            ['CATEGORIA', 'QUANTIDADE', 'PERCENTUAL'],
+            ['Total de Senhas', str(total_senhas), '100%'],
+            ['Senhas Normais', str(senhas_normais), f"{senhas_normais/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
+            ['Senhas Preferenciais', str(senhas_preferenciais), f"{senhas_preferenciais/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
+            ['Primeira Vez', str(primeira_vez), f"{primeira_vez/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
+            ['Recorrentes', str(recorrentes), f"{recorrentes/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
+            ['Chamadas', str(senhas_chamadas), f"{senhas_chamadas/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
+            ['Aguardando', str(senhas_aguardando), f"{senhas_aguardando/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
+        ]
+
+        stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch])
+        stats_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+        ]))
+        elements.append(stats_table)
+        elements.append(Spacer(1, 30))
+
+        # ============================================================================
+        # CHAMADAS POR USUÁRIO
+        # ============================================================================
+        elements.append(Paragraph("CHAMADAS POR USUÁRIO", section_style))
+
+        # Chamadas por usuário (já em ordem decrescente)
+        chamadas_por_usuario = [(u.nome, u.total_chamadas) for u in resumo['chamadas_por_usuario']]
+
+        if chamadas_por_usuario:
+            user_data = [['USUÁRIO', 'TOTAL DE CHAMADAS', 'PERCENTUAL']]
+            for usuario, chamadas in chamadas_por_usuario:
+                percentual = f"{chamadas/senhas_chamadas*100:.1f}%" if senhas_chamadas > 0 else '0%'
+                user_data.append([usuario, str(chamadas), percentual])
+
+            user_table = Table(user_data, colWidths=[3*inch, 1.5*inch, 1.5*inch])
+            user_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 11),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 10),
+                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+            ]))
+            elements.append(user_table)
+        else:
+            elements.append(Paragraph("Nenhuma chamada registrada no período.", styles['Normal']))
+
+        elements.append(Spacer(1, 30))
+
+        # ============================================================================
+        # ANÁLISE DE ESPERA
+        # ============================================================================
+        elements.append(Paragraph("ANÁLISE DE ESPERA", section_style))
+        analise = resumo['analise']
+
+        if analise['percentis']:
+            espera_data = [
+                ['INDICADOR', 'MINUTOS'],
+                ['Tempo Médio', f"{analise['tempo_medio']}"],
+                ['Mediana (p50)', f"{analise['percentis']['p50']}"],
+                ['90% atendidos em até (p90)', f"{analise['percentis']['p90']}"],
+                ['99% atendidos em até (p99)', f"{analise['percentis']['p99']}"],
+            ]
+            espera_table = Table(espera_data, colWidths=[3*inch, 1.5*inch])
+            espera_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 11),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 10),
+                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+            ]))
+            elements.append(espera_table)
+            elements.append(Paragraph(
+                f"{analise['esperas_validas']} esperas válidas (até {ESPERA_MAXIMA_MINUTOS} minutos).",
+                styles['Normal']))
+        else:
+            elements.append(Paragraph("Nenhuma espera válida no período.", styles['Normal']))
+        elements.append(Spacer(1, 20))
+
+        if analise['guiches']:
+            guiche_data = [['GUICHÊ', 'CHAMADAS', 'HORAS ATIVAS', 'POR HORA', 'ESPERA MEDIANA']]
+            for guiche in analise['guiches']:
+                mediana = guiche['espera_mediana']
+                guiche_data.append([guiche['guiche'], str(guiche['chamadas']), str(guiche['horas_ativas']),
+                                    str(guiche['por_hora']), '-' if mediana is None else f"{mediana} min"])
+            guiche_table = Table(guiche_data, colWidths=[1*inch, 1.1*inch, 1.2*inch, 1*inch, 1.4*inch])
+            guiche_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ]))
+            elements.append(guiche_table)
+            elements.append(Spacer(1, 20))
+
+        # Mapa de calor: senhas emitidas por dia da semana x hora (Manaus)
+        mapa = analise['mapa_calor']
+        maximo = max(max(linha) for linha in mapa) or 1
+        mapa_data = [[''] + [str(hora) for hora in range(24)]]
+        mapa_data += [[dia] + [str(valor) if valor else '' for valor in linha]
+                      for dia, linha in zip(DIAS_SEMANA, mapa)]
+        mapa_estilo = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
+            ('BACKGROUND', (0, 1), (0, -1), colors.darkgrey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('TEXTCOLOR', (0, 1), (0, -1), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTSIZE', (0, 0), (-1, -1), 5),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ]
+        for dia, linha in enumerate(mapa, start=1):
+            for hora, valor in enumerate(linha, start=1):
+                if valor:
+                    intensidade = 1 - 0.7 * valor / maximo
+                    mapa_estilo.append(('BACKGROUND', (hora, dia), (hora, dia),
+                                        colors.Color(intensidade, intensidade, 1)))
+        mapa_table = Table(mapa_data, colWidths=[0.35*inch] + [0.24*inch] * 24)
+        mapa_table.setStyle(TableStyle(mapa_estilo))
+        elements.append(Paragraph("Senhas emitidas por dia da semana e hora", styles['Normal']))
+        elements.append(mapa_table)
+        if analise['pico']:
+            pico = analise['pico']
+            elements.append(Paragraph(
+                f"Pico de emissão: {pico['dia']} às {pico['hora']}h ({pico['senhas']} senhas).", styles['Normal']))
+        elements.append(Spacer(1, 30))
+
+        # ============================================================================
+        # DADOS DETALHADOS DAS SENHAS
+        # ============================================================================
+        elements.append(Paragraph("DADOS DETALHADOS DAS SENHAS", section_style))
+
+        # Tabela em blocos de LINHAS_POR_TABELA: o reportlab quebra cada bloco entre
+        # páginas muito mais rápido que uma tabela única com todas as senhas
+        larguras = [0.7*inch, 0.6*inch, 0.5*inch, 1*inch, 0.6*inch, 1.5*inch, 0.6*inch, 0.8*inch]
+        for inicio in range(0, len(data), LINHAS_POR_TABELA):
+            table = Table(data[inicio:inicio + LINHAS_POR_TABELA], colWidths=larguras)
+            # Mantém a alternância de cores da tabela inteira (a linha 0 de data é o cabeçalho)
+            cores = [colors.beige, colors.white] if inicio % 2 else [colors.white, colors.beige]
+            if inicio == 0:
+                estilo = [
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 9),
+                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                    ('FONTSIZE', (0, 1), (-1, -1), 8),
+                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.beige, colors.white]),
+                ]
+            else:
+                estilo = [
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                    ('FONTSIZE', (0, 0), (-1, -1), 8),
+                    ('ROWBACKGROUNDS', (0, 0), (-1, -1), cores),
+                ]
+            table.setStyle(TableStyle(estilo))
+            elements.append(table)
+    else:
+        elements.append(Paragraph("Nenhum registro encontrado com os filtros aplicados.", styles['Normal']))
+
+    # ============================================================================
+    # RODAPÉ
+    # ============================================================================
+    elements.append(Spacer(1, 30))
+    elements.append(Paragraph(f"Relatório gerado automaticamente pelo Sistema de Senhas IAAM em {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}",
+                             ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=1)))
+
+    # Gerar PDF
+    doc.build(elements)
+    return total
+
+
+# ----------------------------------------------------------------------
+# Excel
+# ----------------------------------------------------------------------
+def escrever_xlsx(parametros, destino, gerado_por: str, progresso=None,
+                  linhas=None, resumo: dict = None, filtros_aplicados: list = None) -> int:
+    """Grava o relatório em Excel em `destino` (caminho ou arquivo); retorna o nº de senhas
+
+    `progresso(linhas)` é chamado a cada lote de senhas gravadas. Os demais
+    parâmetros opcionais funcionam como em escrever_pdf.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    livro = Workbook(write_only=True)
+    negrito = Font(bold=True)
+
+    def aba(nome, cabecalho):
+        planilha = livro.create_sheet(nome)
+        celulas = []
+        for titulo in cabecalho:
+            celula = WriteOnlyCell(planilha, value=titulo)
+            celula.font = negrito
+            celulas.append(celula)
+        planilha.append(celulas)
+        return planilha
+
+    # ABA 1: DADOS DETALHADOS (em lotes, direto para o arquivo temporário do openpyxl)
+    detalhes = aba('Dados Detalhados', ['Número', 'Tipo', 'Primeira Vez', 'Gerado em', 'Chamado',
+                                        'Chamado em', 'Chamado por', 'Guichê', 'Tempo de Espera'])
+    total = 0
+    nome_usuario = None
+    for sigla, numero, tipo, primeira_vez, gerado_em, chamado, chamado_em, guiche, chamado_por \
+            in (linhas if linhas is not None else linhas_relatorio(parametros)):
+        nome_usuario = nome_usuario or chamado_por
+        minutos = tempo_espera_minutos(chamado, gerado_em, chamado_em)
+        detalhes.append([
+            f"{sigla}{numero:03d}",
+            'Preferencial' if tipo == 'preferencial' else 'Normal',
+            'Sim' if primeira_vez else 'Não',
+            gerado_em.strftime('%d/%m/%Y %H:%M'),
+            'Sim' if chamado else 'Não',
+            chamado_em.strftime('%d/%m/%Y %H:%M') if chamado_em else 'Não chamado',
+            chamado_por or 'Não chamado',
+            guiche or '-',
+            '-' if minutos is None else ('Inválido' if minutos < 0 else f"{minutos} minutos"),
+        ])
+        total += 1
+        if progresso and total % TAMANHO_LOTE == 0:
+            progresso(total)
+
+    # ABA 2: INFORMAÇÕES DO RELATÓRIO
+    if filtros_aplicados is None:
+        filtros_aplicados = descrever_filtros(parametros, nome_usuario)
+    informacoes = aba('Informações', ['Informação', 'Valor'])
+    informacoes.append(['Relatório gerado em', datetime.now().strftime('%d/%m/%Y às %H:%M:%S')])
+    informacoes.append(['Gerado por', gerado_por])
+    informacoes.append(['Total de registros', total])
+    informacoes.append(['Filtros aplicados', ', '.join(filtros_aplicados) if filtros_aplicados
+                        else 'Nenhum filtro aplicado'])
+
+    if total:
+        resumo = resumo or resumo_relatorio(parametros)
+        total_senhas = resumo['total_senhas']
+
+        # ABA 3: RESUMO ESTATÍSTICO
+        estatisticas = aba('Resumo Estatístico', ['Categoria', 'Quantidade', 'Percentual'])
+        estatisticas.append(['Total de Senhas', total_senhas, '100%'])
+        for titulo, chave in (('Senhas Normais', 'normais'), ('Senhas Preferenciais', 'preferenciais'),
+                              ('Primeira Vez', 'primeira_vez'), ('Recorrentes', 'recorrentes'),
+                              ('Chamadas', 'senhas_chamadas'), ('Aguardando', 'senhas_aguardando')):
+            estatisticas.append([titulo, resumo[chave], _percentual(resumo[chave], total_senhas)])
+
+        # ABA 4: CHAMADAS POR USUÁRIO
+        if resumo['chamadas_por_usuario']:
+            usuarios = aba('Chamadas por Usuário', ['Usuário', 'Total de Chamadas', 'Percentual'])
+            for usuario in resumo['chamadas_por_usuario']:
+                usuarios.append([usuario.nome, usuario.total_chamadas,
+                                 _percentual(usuario.total_chamadas, resumo['senhas_chamadas'])])
+
+        # ABA 5: ANÁLISE TEMPORAL
+        if resumo['por_data']:
+            temporal = aba('Análise Temporal', ['Data', 'Total de Senhas'])
+            for data, quantidade in resumo['por_data']:
+                temporal.append([data.strftime('%d/%m/%Y'), quantidade])
+
+        # ABA 6: ANÁLISE DE ESPERA (percentis, guichês e mapa de calor)
+        analise = resumo['analise']
+        espera = aba('Análise de Espera', ['Indicador', 'Valor'])
+        if analise['percentis']:
+            espera.append(['Tempo médio (min)', analise['tempo_medio']])
+            for chave, titulo in (('p50', 'Mediana - p50 (min)'), ('p90', 'p90 (min)'), ('p99', 'p99 (min)')):
+                espera.append([titulo, analise['percentis'][chave]])
+        espera.append(['Esperas válidas', analise['esperas_validas']])
+        if analise['pico']:
+            pico = analise['pico']
+            espera.append(['Pico de emissão', f"{pico['dia']} às {pico['hora']}h ({pico['senhas']} senhas)"])
+        if analise['guiches']:
+            espera.append([])
+            espera.append(['Guichê', 'Chamadas', 'Horas com Chamadas', 'Chamadas por Hora', 'Espera Mediana (min)'])
+            for guiche in analise['guiches']:
+                espera.append([guiche['guiche'], guiche['chamadas'], guiche['horas_ativas'], guiche['por_hora'],
+                               guiche['espera_mediana']])
+        espera.append([])
+        espera.append(['Senhas por dia/hora'] + list(range(24)))
+        for dia, linha in zip(DIAS_SEMANA, analise['mapa_calor']):
+            espera.append([dia] + linha)
+
+    livro.save(destino)
+    return total
+
+
+def gerar_temporario(parametros, gerado_por: str, formato: str = 'excel') -> str:
+    """Relatório num arquivo temporário (quem chama remove); retorna o caminho"""
+    escrever, extensao, _ = FORMATOS[formato]
+    descritor, caminho = tempfile.mkstemp(prefix='relatorio_', suffix=f'.{extensao}')
+    os.close(descritor)
+    try:
+        escrever(parametros, caminho, gerado_por)
+    except Exception:
+        os.remove(caminho)
+        raise
+    return caminho
+
+
+def ler_em_blocos(caminho: str, remover: bool = True):
+    """Gerador com o conteúdo do arquivo em blocos (para Response em streaming)"""
+    try:
+        with open(caminho, 'rb') as arquivo:
+            while True:
+                bloco = arquivo.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                yield bloco
+    finally:
+        if remover:
+            os.remove(caminho)
+
+
+# ----------------------------------------------------------------------
+# Pacote (PDF + Excel em processos paralelos)
+# ----------------------------------------------------------------------
+class ColunasRelatorio:
+    """Senhas do relatório em colunas compactas, lidas do banco uma única vez
+
+    Números e datas ficam em arrays (datas em microssegundos desde 1970,
+    NULO quando vazias) e os textos repetidos (sigla, tipo, guichê, usuário)
+    viram códigos de um dicionário de valores. Assim o conjunto é barato de
+    copiar para os processos de renderização. Iterar devolve as mesmas
+    tuplas de linhas_relatorio.
+    """
+
+    TEXTOS = ('sigla', 'tipo_paciente', 'guiche', 'chamado_por')
+    NULO = -2 ** 63
+    EPOCA = datetime(1970, 1, 1)
+
+    def __init__(self):
+        self.numero = array('q')
+        self.primeira_vez = array('b')
+        self.chamado = array('b')
+        self.gerado_em = array('q')
+        self.chamado_em = array('q')
+        self.codigos = {coluna: array('I') for coluna in self.TEXTOS}
+        self.valores = {coluna: [] for coluna in self.TEXTOS}
+        self._indices = {coluna: {} for coluna in self.TEXTOS}
+
+    @classmethod
+    def ler(cls, parametros, progresso=None) -> 'ColunasRelatorio':
+        colunas = cls()
+        for sigla, numero, tipo, primeira_vez, gerado_em, chamado, chamado_em, guiche, chamado_por \
+                in linhas_relatorio(parametros):
+            colunas.numero.append(numero)
+            colunas.primeira_vez.append(bool(primeira_vez))
+            colunas.chamado.append(bool(chamado))
+            colunas.gerado_em.append(colunas._microssegundos(gerado_em))
+            colunas.chamado_em.append(colunas._microssegundos(chamado_em))
+            for coluna, valor in zip(cls.TEXTOS, (sigla, tipo, guiche, chamado_por)):
+                colunas._codificar(coluna, valor)
+            if progresso and len(colunas) % TAMANHO_LOTE == 0:
+                progresso(len(colunas))
+        return colunas
+
+    def __len__(self) -> int:
+        return len(self.numero)
+
+    def __iter__(self):
+        sigla, tipo, guiche, chamado_por = (
+            [self.valores[coluna][codigo] for codigo in self.codigos[coluna]] for coluna in self.TEXTOS
+        )
+        for i in range(len(self)):
+            yield (sigla[i], self.numero[i], tipo[i], bool(self.primeira_vez[i]),
+                   self._data(self.gerado_em[i]), bool(self.chamado[i]), self._data(self.chamado_em[i]),
+                   guiche[i], chamado_por[i])
+
+    def primeiro_usuario(self):
+        """Nome de quem chamou na primeira senha chamada (rótulo do filtro por usuário)"""
+        return next((nome for nome in self.valores['chamado_por'] if nome), None)
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado['_indices']          # só serve para montar as colunas
+        return estado
+
+    def _codificar(self, coluna: str, valor) -> None:
+        indices = self._indices[coluna]
+        codigo = indices.get(valor)
+        if codigo is None:
+            codigo = indices[valor] = len(self.valores[coluna])
+            self.valores[coluna].append(valor)
+        self.codigos[coluna].append(codigo)
+
+    def _microssegundos(self, valor) -> int:
+        if valor is None:
+            return self.NULO
+        diferenca = valor - self.EPOCA
+        return (diferenca.days * 86400 + diferenca.seconds) * 1000000 + diferenca.microseconds
+
+    def _data(self, valor: int):
+        return None if valor == self.NULO else self.EPOCA + timedelta(microseconds=valor)
+
+
+def _renderizar_em_processo(formato: str, destino: str, parametros: dict, gerado_por: str,
+                            colunas: ColunasRelatorio, resumo: dict, filtros_aplicados: list) -> int:
+    """Executada nos processos do ProcessosRelatorio: só renderiza, sem acessar o banco"""
+    escrever = FORMATOS[formato][0]
+    return escrever(parametros, destino, gerado_por, linhas=colunas,
+                    resumo=resumo, filtros_aplicados=filtros_aplicados)
+
+
+class ProcessosRelatorio:
+    """Processos que renderizam PDF e Excel em paralelo, fora do GIL do servidor
+
+    O pool é criado no primeiro uso (spawn: os processos não herdam conexões
+    nem threads do servidor) e recriado se algum processo morrer.
+
+    Com spawn cada processo reimporta o módulo principal (run.py) antes de
+    importar este: o script de entrada não pode criar o app no nível do módulo,
+    só sob `if __name__ == "__main__"` (ver main() em run.py). Os processos
+    não chamam create_app; só importam app.relatorios para renderizar.
+    """
+
+    def __init__(self, processos: int = 2):
+        self.processos = processos
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def configurar(self, config: dict) -> None:
+        """Aplica parâmetros do app.config (chamado em create_app)"""
+        self.processos = config.get('RELATORIOS_PROCESSOS', self.processos)
+
+    def renderizar(self, tarefas: list) -> list:
+        """Executa _renderizar_em_processo para cada tupla de argumentos; aguarda todas"""
+        executor = self._obter()
+        try:
+            futuros = [executor.submit(_renderizar_em_processo, *argumentos) for argumentos in tarefas]
+            return [futuro.result() for futuro in futuros]
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    def _obter(self) -> ProcessPoolExecutor:
+        if self._executor is not None:
+            return self._executor
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+
+def escrever_pacote(parametros, destino, gerado_por: str, progresso=None) -> int:
+    """Grava em `destino` um ZIP com o relatório em PDF e em Excel; retorna o nº de senhas
+
+    As senhas são lidas uma vez (ColunasRelatorio), o resumo e os filtros são
+    calculados aqui e os dois arquivos são renderizados ao mesmo tempo pelos
+    processos_relatorio.
+    """
+    parametros = normalizar_parametros(parametros)
+    colunas = ColunasRelatorio.ler(parametros, progresso)
+    filtros_aplicados = descrever_filtros(parametros, colunas.primeiro_usuario())
+    resumo = resumo_relatorio(parametros) if len(colunas) else None
+
+    with tempfile.TemporaryDirectory(prefix='relatorio_pacote_') as pasta:
+        arquivos = {formato: os.path.join(pasta, f'relatorio_senhas.{FORMATOS[formato][1]}')
+                    for formato in ('pdf', 'excel')}
+        processos_relatorio.renderizar([
+            (formato, caminho, parametros, gerado_por, colunas, resumo, filtros_aplicados)
+            for formato, caminho in arquivos.items()
+        ])
+        with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+            for caminho in arquivos.values():
+                pacote.write(caminho, os.path.basename(caminho))
+    return len(colunas)
+
+
+# ----------------------------------------------------------------------
+# Geração em segundo plano
+# ----------------------------------------------------------------------
+CAMPOS_FILTRO = ('data_inicio', 'data_fim', 'tipo_paciente', 'primeira_vez', 'usuario_id', 'chamadas_apenas')
+
+# formato -> (função que grava, extensão, mimetype)
+FORMATOS = {
+    'pdf': (escrever_pdf, 'pdf', 'application/pdf'),
+    'excel': (escrever_xlsx, 'xlsx', MIMETYPE_XLSX),
+    'pacote': (escrever_pacote, 'zip', 'application/zip'),
+}
+
+
+def normalizar_parametros(parametros) -> dict:
+    """Só os filtros preenchidos (a mesma combinação gera sempre a mesma chave)"""
+    return {campo: parametros[campo] for campo in CAMPOS_FILTRO if parametros.get(campo)}
+
+
+def assinatura_dados(parametros) -> tuple:
+    """(total, maior id, última chamada) das senhas filtradas
+
+    Muda quando senhas entram, são chamadas ou saem do intervalo; enquanto
+    for a mesma, um relatório já gerado com esses filtros continua válido.
+    Conta também as arquivadas, então arquivar não invalida relatórios.
+    """
+    senhas = todas_as_senhas().c
+    return tuple(db.session.query(db.func.count(senhas.id), db.func.max(senhas.id), db.func.max(senhas.chamado_em))
+                 .filter(*filtros_relatorio(parametros, senhas))
+                 .one())
+
+
+class TrabalhoRelatorio:
+    """Um relatório (PDF ou Excel) gerado em disco por um worker"""
+
+    PENDENTE = 'pendente'
+    GERANDO = 'gerando'
+    CONCLUIDO = 'concluido'
+    FALHOU = 'falhou'
+
+    def __init__(self, formato: str, parametros: dict, chave: str, assinatura: tuple, gerado_por: str, app):
+        self.id = uuid.uuid4().hex
+        self.formato = formato
+        self.parametros = parametros
+        self.chave = chave
+        self.assinatura = assinatura
+        self.total = assinatura[0]
+        self.gerado_por = gerado_por
+        self.app = app
+        self.status = self.PENDENTE
+        self.linhas = 0
+        self.caminho = None
+        self.nome_arquivo = None
+        self.erro = None
+        self.criado_em = datetime.utcnow()
+        self.concluido_em = None
+
+    @property
+    def mimetype(self) -> str:
+        return FORMATOS[self.formato][2]
+
+    def progresso(self) -> int:
+        """Percentual: até 90% lendo as senhas, o restante montando o arquivo"""
+        if self.status == self.CONCLUIDO:
+            return 100
+        if not self.total:
+            return 0
+        return min(90, int(self.linhas * 90 / self.total))
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'formato': self.formato,
+            'status': self.status,
+            'progresso': self.progresso(),
+            'linhas': self.linhas,
+            'total': self.total,
+            'erro': self.erro,
+            'criado_em': self.criado_em.isoformat(),
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+        }
+
+
+class FilaRelatorios:
+    """Workers que geram os relatórios em disco, reaproveitando os já gerados
+
+    Um pedido igual (formato + filtros + quem pediu, que sai no "Gerado por"
+    do arquivo) a um relatório pendente, em geração ou concluído com a mesma
+    assinatura_dados recebe o mesmo trabalho. Os arquivos
+    ficam no diretório até saírem do histórico.
+    """
+
+    def __init__(self, workers: int = 2, tamanho_fila: int = 20, historico: int = 50, diretorio: str = None):
+        self.workers = workers
+        self.tamanho_fila = tamanho_fila
+        self.historico = historico
+        self.diretorio = diretorio or os.path.join(tempfile.gettempdir(), 'relatorios_senhas')
+
+        self._lock = threading.Lock()
+        self._fila = None
+        self._threads = []
+        self._trabalhos = OrderedDict()     # id -> TrabalhoRelatorio
+        self._por_chave = {}                # chave (formato + filtros + gerado_por) -> TrabalhoRelatorio
+
+    def configurar(self, config: dict) -> None:
+        """Aplica parâmetros do app.config (chamado em create_app)"""
+        self.workers = config.get('RELATORIOS_WORKERS', self.workers)
+        self.tamanho_fila = config.get('RELATORIOS_FILA_MAX', self.tamanho_fila)
+        self.historico = config.get('RELATORIOS_HISTORICO', self.historico)
+        self.diretorio = config.get('RELATORIOS_DIR') or self.diretorio
+
+    # ------------------------------------------------------------------
+    # API usada pelas rotas
+    # ------------------------------------------------------------------
+    def enviar(self, formato: str, parametros, gerado_por: str) -> TrabalhoRelatorio:
+        """Agenda o relatório e retorna imediatamente (requer app context)
+
+        Se a fila estiver cheia o trabalho já volta com status 'falhou'.
+        """
+        formato = formato if formato in FORMATOS else 'excel'
+        parametros = normalizar_parametros(parametros)
+        chave = json.dumps([formato, parametros, gerado_por], sort_keys=True)
+        assinatura = assinatura_dados(parametros)
+        fila = self._iniciar()
+
+        with self._lock:
+            existente = self._por_chave.get(chave)
+            if existente is not None and existente.assinatura == assinatura and self._aproveitavel(existente):
+                return existente
+            trabalho = TrabalhoRelatorio(formato, parametros, chave, assinatura, gerado_por,
+                                         current_app._get_current_object())
+            self._trabalhos[trabalho.id] = trabalho
+            self._por_chave[chave] = trabalho
+            self._podar()
+
+        try:
+            fila.put_nowait(trabalho)
+        except queue.Full:
+            self._concluir(trabalho, TrabalhoRelatorio.FALHOU, 'Fila de relatórios cheia')
+        return trabalho
+
+    def obter(self, trabalho_id: str):
+        return self._trabalhos.get(trabalho_id)
+
+    def pendentes(self) -> int:
+        return self._fila.qsize() if self._fila else 0
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    def _iniciar(self) -> queue.Queue:
+        if self._fila is not None:
+            return self._fila
+        with self._lock:
+            if self._fila is None:
+                os.makedirs(self.diretorio, exist_ok=True)
+                self._limpar_diretorio()
+                fila = queue.Queue(maxsize=self.tamanho_fila)
+                for i in range(self.workers):
+                    worker = threading.Thread(
+                        target=self._executar, args=(fila,),
+                        name=f'relatorios-{i + 1}', daemon=True
+                    )
+                    self._threads.append(worker)
+                    worker.start()
+                self._fila = fila
+            return self._fila
+
+    def _executar(self, fila: queue.Queue) -> None:
+        while True:
+            trabalho = fila.get()
+            try:
+                self._gerar(trabalho)
+            except Exception as e:  # nunca deixar o worker morrer
+                print(f'Erro inesperado na fila de relatórios: {e}')
+            finally:
+                fila.task_done()
+
+    def _gerar(self, trabalho: TrabalhoRelatorio) -> None:
+        escrever, extensao, _ = FORMATOS[trabalho.formato]
+        caminho = os.path.join(self.diretorio, f'{trabalho.id}.{extensao}')
+        parcial = os.path.join(self.diretorio, f'{trabalho.id}.parcial.{extensao}')
+
+        def progresso(linhas):
+            trabalho.linhas = linhas
+
+        trabalho.status = TrabalhoRelatorio.GERANDO
+        inicio = time.perf_counter()
+        with trabalho.app.app_context():
+            try:
+                trabalho.linhas = escrever(trabalho.parametros, parcial, trabalho.gerado_por, progresso)
+                os.replace(parcial, caminho)
+                trabalho.caminho = caminho
+                trabalho.nome_arquivo = f'relatorio_senhas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extensao}'
+                self._concluir(trabalho, TrabalhoRelatorio.CONCLUIDO)
+                print(f"📄 Relatório {trabalho.formato} gerado: {trabalho.linhas} senhas "
+                      f"em {time.perf_counter() - inicio:.1f}s")
+            except Exception as e:
+                self._remover_arquivo(parcial)
+                self._concluir(trabalho, TrabalhoRelatorio.FALHOU, str(e))
+                print(f"Erro ao gerar relatório {trabalho.formato}: {e}")
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _concluir(trabalho: TrabalhoRelatorio, status: str, erro: str = None) -> None:
+        trabalho.status = status
+        trabalho.erro = erro
+        trabalho.concluido_em = datetime.utcnow()
+
+    # ------------------------------------------------------------------
+    # Histórico e arquivos
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _aproveitavel(trabalho: TrabalhoRelatorio) -> bool:
+        if trabalho.status in (TrabalhoRelatorio.PENDENTE, TrabalhoRelatorio.GERANDO):
+            return True
+        return trabalho.status == TrabalhoRelatorio.CONCLUIDO and os.path.exists(trabalho.caminho)
+
+    def _podar(self) -> None:
+        """Descarta os trabalhos terminados mais antigos além do histórico (chamar com o lock)"""
+        excedente = len(self._trabalhos) - self.historico
+        for trabalho in list(self._trabalhos.values()):
+            if excedente <= 0:
+                break
+            if trabalho.status in (TrabalhoRelatorio.PENDENTE, TrabalhoRelatorio.GERANDO):
+                continue
+            del self._trabalhos[trabalho.id]
+            if self._por_chave.get(trabalho.chave) is trabalho:
+                del self._por_chave[trabalho.chave]
+            self._remover_arquivo(trabalho.caminho)
+            excedente -= 1
+
+    def _limpar_diretorio(self) -> None:
+        """Remove relatórios de execuções anteriores (não estão no histórico)"""
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(tuple(f'.{extensao}' for _, extensao, _ in FORMATOS.values())):
+                self._remover_arquivo(os.path.join(self.diretorio, nome))
+
+    @staticmethod
+    def _remover_arquivo(caminho: str) -> None:
+        if caminho:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+# Instâncias globais usadas pelas rotas
+fila_relatorios = FilaRelatorios()
+processos_relatorio = ProcessosRelatorio()
@@ -1,22 +1,31 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, session, current_app
+from flask import (Blueprint, render_template, redirect, url_for, request, flash, jsonify, session, current_app,
+                   Response, abort)
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 from werkzeug.utils import secure_filename
 
-from .models import Usuario, Senha, ConfiguracaoSistema
+from .models import Usuario, Senha, ConfiguracaoSistema, Fila, FILA_PADRAO
 from . import db
 from .auth_utils import role_required
-from .services import PrioridadeService, ImpressoraService, TTSService
+from .services import (PrioridadeService, ImpressoraService, SequenciaService, EstatisticaService,
+                       RelatorioService, TTSService)
+from .eventos import canal_chamadas
+from .impressao import spooler_impressao
+from .fila import motor_fila
+from .analise import analise_espera, DIAS_SEMANA
+from .arquivo import arquivo_senhas
+from .tts import biblioteca_fragmentos, cliente_tts, pregeracao_tts, mensagem_anuncio, TTSIndisponivel
+from .cache import (ultimas_chamadas, chamadas_por_fila, versao_fila, config_cache, filas_cache,
+                    guiches_ativos, marcar_config_alterada, dados_chamada, senha_completa)
 
-import requests
 from flask import send_file
 from io import BytesIO
 
 
 bp = Blueprint("main", __name__)
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from flask import g
 from zoneinfo import ZoneInfo
 
@@ -34,6 +43,71 @@ def utc_to_brasil(utc_dt):
     # Converter para horário local
     return utc_dt.astimezone(TZ_BRASIL)
 
+def _resposta_condicional(etag, gerar_resposta):
+    """Responde 304 se o cliente já possui a versão `etag`; senão gera a resposta"""
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = gerar_resposta()
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+def _registrar_emissao(senha):
+    """Deve ser chamada após o commit de uma nova senha"""
+    motor_fila.adicionar(senha)
+    versao_fila.incrementar()
+    _pregerar_anuncios(senha)
+    arquivo_senhas.agendar()
+
+def _pregerar_anuncios(senha):
+    """Agenda o áudio do anúncio da senha para os guichês ativos (só o guichê é desconhecido)"""
+    if not pregeracao_tts.ativa:
+        return
+    guiches = guiches_ativos.ativos(senha.fila_id or FILA_PADRAO, pregeracao_tts.max_guiches,
+                                    pregeracao_tts.janela_minutos)
+    config = config_cache.obter()
+    if not guiches or not config:
+        return
+    servico = TTSService(config)
+    texto_senha = senha_completa(senha)
+    pregeracao_tts.agendar([mensagem_anuncio(texto_senha, guiche) for guiche in guiches],
+                           servico.voz(), servico.obter_audio)
+
+def _registrar_chamada(senha):
+    """Deve ser chamada após o commit de qualquer chamada (normal, rechamada, específica ou personalizada)"""
+    motor_fila.registrar_chamada(senha)
+    guiches_ativos.registrar(senha)
+    ultimas_chamadas.registrar(senha)
+    chamadas_por_fila.registrar(senha)
+    analise_espera.registrar_chamada(senha)
+    canal_chamadas.publicar('chamada', dados_chamada(senha))
+
+def _fila_emissao():
+    """Fila da senha a emitir (?fila=<id>, padrão: fila principal); None se inválida"""
+    fila = filas_cache.obter(request.args.get('fila', FILA_PADRAO, type=int))
+    return fila if fila and fila.ativa else None
+
+def _chamadas_da_fila():
+    """Buffer de últimas chamadas do display: de uma fila (?fila=<id>) ou de todas; 404 se a fila não existe"""
+    fila_id = request.args.get('fila', type=int)
+    if not fila_id:
+        return ultimas_chamadas
+    chamadas = chamadas_por_fila.obter(fila_id)
+    if chamadas is None:
+        abort(404)
+    return chamadas
+
+def _filas_do_guiche(filas_informadas=None):
+    """Filas atendidas pelo guichê: as informadas (guardadas na sessão) ou todas as ativas"""
+    if filas_informadas is not None:
+        ids = [int(i) for i in filas_informadas if str(i).strip().isdigit()]
+        if session.get('filas') != ids:
+            session['filas'] = ids
+    ids = session.get('filas')
+    ativas = filas_cache.ativas()
+    return [fila for fila in ativas if fila.id in ids] if ids else ativas
+
 @bp.before_request
 def controlar_sessao_por_inatividade():
     # Log apenas para rotas importantes, não para APIs e polling
@@ -65,8 +139,10 @@ def controlar_sessao_por_inatividade():
         'main.login',
         'main.fila_json',
         'main.ultima_chamada',
+        'main.eventos_chamadas',
         'main.painel_fila_json',
         'main.api_retira_senha',
+        'main.api_status_impressao',
         'main.api_falar',
         'main.api_tts',
         'main.api_painel_action',
@@ -78,11 +154,14 @@ def controlar_sessao_por_inatividade():
         return
 
     if current_user.is_authenticated:
-        session.permanent = True
+        # Atribuir marca a sessão como alterada (cookie reenviado): só quando muda
+        if not session.permanent:
+            session.permanent = True
         # ⏳ duração total da sessão - configurado no app principal
 
         agora = datetime.utcnow()
         ultimo_uso = session.get('ultimo_uso')
+        delta = None
 
         if ultimo_uso:
             try:
@@ -93,11 +172,12 @@ def controlar_sessao_por_inatividade():
                     flash("Sessão encerrada por inatividade.", "warning")
                     return redirect(url_for('main.login'))
             except ValueError:
-                session['ultimo_uso'] = agora.isoformat()
-        else:
-            session['ultimo_uso'] = agora.isoformat()
+                delta = None
 
-        session['ultimo_uso'] = agora.isoformat()
+        # Renovar no máximo uma vez por minuto, para não reescrever o cookie
+        # de sessão a cada chamada de senha
+        if delta is None or delta >= timedelta(minutes=1):
+            session['ultimo_uso'] = agora.isoformat()
 
 
 
@@ -122,63 +202,68 @@ def login():
             session.pop('guiche', None)
             return redirect(url_for('main.painel'))
         flash('Login ou senha inválidos', 'error')
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     return render_template('login.html', config=config)
 
 @bp.route('/retira')
 def retira_senha():
-    config = ConfiguracaoSistema.query.first()
-    return render_template('gerar_senha.html', config=config, exibir_menu=False)
-
-
-import socket
+    config = config_cache.obter()
+    # O quiosque acompanha a impressão até o spooler esgotar as tentativas
+    return render_template('gerar_senha.html', config=config, exibir_menu=False,
+                           tempo_impressao=spooler_impressao.tempo_maximo())
 
 
 @bp.route('/api/retirar')
 def api_retira_senha():
-    from sqlalchemy.exc import SQLAlchemyError
-
     tipo_paciente = request.args.get('tipo', 'normal')
-    sigla = 'NP' if tipo_paciente == 'normal' else 'PP'
+    fila = _fila_emissao()
+    if not fila:
+        return jsonify({'erro': 'Fila de atendimento inválida'}), 400
+    sigla = fila.prefixo + ('NP' if tipo_paciente == 'normal' else 'PP')
     primeira_vez = False
 
+    config = config_cache.obter()
+    impressora = ImpressoraService(config)
+    if not impressora.impressora_disponivel('secundaria'):
+        return jsonify({'erro': 'Impressora ocupada. Tente novamente em instantes.'}), 503
+
     try:
-        # Gerar número da senha
-        ultima = Senha.query.order_by(Senha.id.desc()).first()
-        numero = (ultima.numero + 1) if ultima else 1
+        # Gerar número da senha (sequência diária por sigla)
+        numero = SequenciaService(db.session).proximo_numero(sigla)
         senha_completa = f"{sigla}{str(numero).zfill(4)}"
 
-        # Criar senha no banco (sem commit ainda)
         nova = Senha(
             numero=numero, 
             sigla=sigla, 
             tipo_paciente=tipo_paciente, 
-            primeira_vez=primeira_vez
+            primeira_vez=primeira_vez,
+            fila_id=fila.id
         )
         db.session.add(nova)
-        db.session.flush()
-
-        # Imprimir usando serviço
-        config = ConfiguracaoSistema.query.first()
-        impressora = ImpressoraService(config)
-        if not impressora.imprimir_senha(senha_completa, 'secundaria'):
-            raise Exception("Falha na impressão")
-
-        db.session.commit()  # só grava no banco após sucesso na impressão
-
-        return jsonify({'numero': numero, 'sigla': sigla, 'primeira_vez': primeira_vez})
-
+        EstatisticaService(db.session).registrar_emissao(nova)
+        db.session.commit()
+        _registrar_emissao(nova)
     except Exception as e:
         db.session.rollback()
-        print('Erro ao imprimir ou salvar:', e)
-        return jsonify({'erro': 'Erro ao imprimir. Senha não foi salva.'}), 500
+        print('Erro ao salvar senha:', e)
+        return jsonify({'erro': 'Erro ao gerar senha. Senha não foi salva.'}), 500
+
+    # Impressão em segundo plano; o quiosque acompanha por /api/impressao/<id>
+    trabalho = impressora.agendar_impressao(senha_completa, tipo_paciente, 'secundaria')
+
+    return jsonify({
+        'numero': numero,
+        'sigla': sigla,
+        'primeira_vez': primeira_vez,
+        'trabalho_id': trabalho.id,
+        'impressao': trabalho.status
+    })
 
 
 
 @bp.route('/api/gerar_senha')
 def gerar_senha_triada():
-    from datetime import datetime, time
-    from sqlalchemy.exc import SQLAlchemyError
+    from datetime import datetime
 
     tipo = request.args.get('tipo')
     primeira = request.args.get('primeira') == 'true'
@@ -194,71 +279,84 @@ def gerar_senha_triada():
     else:
         return jsonify({'erro': 'Parâmetros inválidos'}), 400
 
+    fila = _fila_emissao()
+    if not fila:
+        return jsonify({'erro': 'Fila de atendimento inválida'}), 400
+    sigla = fila.prefixo + sigla
+
+    config = config_cache.obter()
+    impressora = ImpressoraService(config)
+    if not impressora.impressora_disponivel('principal'):
+        return jsonify({'erro': 'Impressora ocupada. Tente novamente em instantes.'}), 503
+
     try:
-        # Gerar número da senha
+        # Gerar número da senha (sequência diária por sigla)
         agora = datetime.now()
-        inicio_dia = datetime.combine(agora.date(), time.min)
-        count = Senha.query.filter(Senha.gerado_em >= inicio_dia).count()
-        numero = count + 1
+        numero = SequenciaService(db.session).proximo_numero(sigla)
         senha_completa = f"{sigla}{str(numero).zfill(4)}"
 
-        # Imprimir usando serviço
-        config = ConfiguracaoSistema.query.first()
-        impressora = ImpressoraService(config)
-        if not impressora.imprimir_senha(senha_completa, 'principal'):
-            raise Exception("Falha na impressão")
-
-        # Só salva se imprimir com sucesso
         nova = Senha(
             sigla=sigla,
             numero=numero,
             chamado=False,
             gerado_em=agora,
             tipo_paciente=tipo,
-            primeira_vez=primeira
+            primeira_vez=primeira,
+            fila_id=fila.id
         )
         db.session.add(nova)
+        EstatisticaService(db.session).registrar_emissao(nova)
         db.session.commit()
-
-        return jsonify({
-            'sigla': sigla,
-            'numero': numero,
-            'completo': senha_completa
-        })
-
+        _registrar_emissao(nova)
     except Exception as e:
         db.session.rollback()
-        print('Erro ao imprimir ou salvar:', e)
-        return jsonify({'erro': 'Erro ao imprimir. Senha não foi salva.'}), 500
+        print('Erro ao salvar senha:', e)
+        return jsonify({'erro': 'Erro ao gerar senha. Senha não foi salva.'}), 500
+
+    # Impressão em segundo plano; o quiosque acompanha por /api/impressao/<id>
+    trabalho = impressora.agendar_impressao(senha_completa, tipo, 'principal')
+
+    return jsonify({
+        'sigla': sigla,
+        'numero': numero,
+        'completo': senha_completa,
+        'trabalho_id': trabalho.id,
+        'impressao': trabalho.status
+    })
+
+@bp.route('/api/impressoras/status')
+@login_required
+@role_required('admin')
+def api_status_impressoras():
+    """Saúde das impressoras (conexão, RTT, falhas, papel) para o painel de administração"""
+    impressora = ImpressoraService(config_cache.obter())
+    spooler_impressao.definir_destinos(impressora.destinos())
+    return jsonify(spooler_impressao.saude())
+
+@bp.route('/api/impressao/<int:trabalho_id>')
+def api_status_impressao(trabalho_id):
+    """Status de um trabalho do spooler (pendente, imprimindo, impresso, falhou)"""
+    status = spooler_impressao.status(trabalho_id)
+    if not status:
+        return jsonify({'erro': 'Trabalho não encontrado'}), 404
+    return jsonify(status)
 
 @bp.route('/display')
 def display():
-    senhas = Senha.query.filter_by(chamado=True).order_by(Senha.id.desc()).limit(15).all()
-    config = ConfiguracaoSistema.query.first()
-    return render_template('display.html', senhas=senhas, config=config, exibir_menu=False)
+    # ?fila=<id>: display de uma única fila de atendimento
+    fila = request.args.get('fila', type=int)
+    senhas = _chamadas_da_fila().senhas()
+    config = config_cache.obter()
+    return render_template('display.html', senhas=senhas, config=config, fila=fila, exibir_menu=False)
 
 @bp.route('/fila_json')
 def fila_json():
-    senhas = Senha.query.filter_by(chamado=True).order_by(Senha.id.desc()).limit(15).all()
-    dados = []
-    for s in senhas:
-        chamado_em_brasil = None
-        if s.chamado_em:
-            dt_brasil = utc_to_brasil(s.chamado_em)
-            chamado_em_brasil = dt_brasil.strftime('%Y-%m-%dT%H:%M:%S')
-        
-        dados.append({
-            'id': s.id,
-            'sigla': s.sigla,
-            'numero': s.numero,
-            'chamado': s.chamado,
-            'chamado_em': chamado_em_brasil,
-            'senha_completa': s.sigla if s.numero == 0 else f"{s.sigla}{str(s.numero).zfill(4)}",
-            'guiche': s.guiche or ''
-        })
-
-    versao = max([s.chamado_em or s.gerado_em for s in senhas], default=datetime.utcnow()).isoformat()
-    return jsonify({'versao': versao, 'senhas': dados})
+    # Servido direto do buffer em memória (já serializado), sem consulta ao banco
+    chamadas = _chamadas_da_fila()
+    return _resposta_condicional(
+        chamadas.etag,
+        lambda: Response(chamadas.fila_json(), mimetype='application/json')
+    )
 
 
 # ---------- Rotas protegidas ----------
@@ -290,7 +388,7 @@ def painel():
         Senha.id.asc()
     ).limit(15).all()
 
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
 
     return render_template(
         'painel.html',
@@ -310,32 +408,28 @@ def painel():
 @login_required
 @role_required('admin', 'usuario')
 def chamar_senha():
-    from datetime import datetime
-
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     guiche = request.args.get("guiche") or session.get("guiche") or ""
-    session['guiche'] = guiche
+    if session.get('guiche') != guiche:
+        session['guiche'] = guiche
 
     if not guiche:
         flash("Informe o número do guichê antes de realizar chamadas.")
         return redirect(url_for('main.painel'))
 
-    # Usar serviço de prioridade
-    prioridade_service = PrioridadeService(db.session, config)
-    contador_normais = session.get('contador_normais', 0)
-    
-    senha, novo_contador = prioridade_service.selecionar_proxima_senha(contador_normais)
+    # Usar serviço de prioridade (por fila atendida pelo guichê)
+    import time
+    commit_start = time.time()
+    # Seleção + UPDATE condicional: dois guichês nunca recebem a mesma senha
+    filas = request.args.get('filas')
+    senha = PrioridadeService.chamar_proxima_das_filas(
+        db.session, config, _filas_do_guiche(filas.split(',') if filas is not None else None),
+        current_user.id, guiche
+    )
     
     if senha:
-        import time
-        commit_start = time.time()
-        
-        senha.chamado = True
-        senha.chamado_por = current_user.id
-        chamado_em_now = datetime.utcnow()
-        senha.chamado_em = chamado_em_now
-        senha.guiche = guiche
-        db.session.commit()
+        _registrar_chamada(senha)
+        chamado_em_now = senha.chamado_em
         
         commit_duration = (time.time() - commit_start) * 1000  # ms
         senha_completa = senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
@@ -343,9 +437,6 @@ def chamar_senha():
         if commit_duration > 50:
             print(f"[PERF] chamar_senha commit demorou {commit_duration:.2f}ms - Senha: {senha_completa}")
         
-        # Atualizar contador na sessão
-        session['contador_normais'] = novo_contador
-        
         # Formatar mensagem de voz
         tts_service = TTSService(config)
         senha_completa = f"{senha.sigla}{str(senha.numero).zfill(4)}"
@@ -365,7 +456,7 @@ def chamar_senha():
 @role_required('admin')
 def listar_usuarios():
     usuarios = Usuario.query.order_by(Usuario.id).all()
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     return render_template('usuarios.html', usuarios=usuarios, config=config)
 
 @bp.route('/usuarios/<int:id>/editar', methods=['GET', 'POST'])
@@ -387,7 +478,7 @@ def editar_usuario(id):
         flash('Usuário atualizado com sucesso.', 'success')
         return redirect(url_for('main.listar_usuarios'))
 
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     return render_template('editar_usuario.html', usuario=usuario, config=config)
 
 @bp.route('/cadastro', methods=['GET', 'POST'])
@@ -415,7 +506,7 @@ def cadastro():
         flash('Usuário cadastrado com sucesso!', 'success')
         return redirect(url_for('main.painel'))
 
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     return render_template('cadastro.html', config=config)
 
 @bp.route('/edtelas')
@@ -424,7 +515,7 @@ def cadastro():
 def edtelas():
     # Log simples, sem emojis, para compatibilidade com console do Windows
     print("Rota /edtelas carregada")
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     return render_template('EdTelas.html', config=config)
 
 @bp.route('/salvar_config', methods=['POST'])
@@ -435,6 +526,7 @@ def salvar_config():
     if not config:
         config = ConfiguracaoSistema()
         db.session.add(config)
+    voz_anterior = config.voz_azure
 
     if 'reset_cores' in request.form:
         config.cor_fundo = "#000000"
@@ -575,7 +667,13 @@ def salvar_config():
                 traceback.print_exc()
 
     try:
+        marcar_config_alterada(config)
         db.session.commit()
+        config_cache.invalidar()
+        spooler_impressao.definir_destinos(ImpressoraService(config).destinos())
+        if config.voz_azure and config.voz_azure != voz_anterior and biblioteca_fragmentos.modo != 'desligado':
+            # Nova voz: gera os fragmentos de anúncio antes da primeira chamada
+            biblioteca_fragmentos.preaquecer_em_segundo_plano(config.voz_azure, TTSService(config).gerar_audio)
         flash("Configurações salvas com sucesso!", "success")
     except Exception as e:
         db.session.rollback()
@@ -588,32 +686,21 @@ def salvar_config():
 
 @bp.route('/ultima_chamada')
 def ultima_chamada():
-    import time
-    query_start = time.time()
-    
-    # Query otimizada: apenas campos necessários, ordenação por índice primário quando possível
-    senha = Senha.query.filter_by(chamado=True).order_by(Senha.chamado_em.desc()).first()
-    
-    query_duration = (time.time() - query_start) * 1000  # ms
-    
-    if senha:
-        senha_completa = senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
-        chamado_em_brasil = None
-        if senha.chamado_em:
-            # Converter UTC para horário do Brasil
-            dt_brasil = utc_to_brasil(senha.chamado_em)
-            chamado_em_brasil = dt_brasil.strftime('%Y-%m-%dT%H:%M:%S')
-        result = {
-            'senha': senha_completa,
-            'guiche': senha.guiche or '...',
-            'chamado_em': chamado_em_brasil,
-            'id': senha.id
-        }
-        # Log apenas se demorar muito (reduzir spam de logs)
-        if query_duration > 100:
-            print(f"[PERF] ultima_chamada query demorou {query_duration:.2f}ms")
-        return jsonify(result)
-    return jsonify({'senha': '', 'guiche': '...', 'chamado_em': None, 'id': None})
+    # Servido direto do buffer em memória, atualizado a cada chamada
+    chamadas = _chamadas_da_fila()
+    return _resposta_condicional(
+        chamadas.etag,
+        lambda: Response(chamadas.ultima_json(), mimetype='application/json')
+    )
+
+@bp.route('/eventos_chamadas')
+def eventos_chamadas():
+    """Stream SSE: envia um evento 'chamada' a cada senha chamada/rechamada"""
+    fila = canal_chamadas.assinar(request.args.get('fila', type=int))
+    resposta = Response(canal_chamadas.transmitir(fila), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # Evita buffering em proxy reverso
+    return resposta
 
 # Rota /tts_audio movida para tts_routes.py
 
@@ -646,11 +733,15 @@ def api_falar():
     </speak>
     """
 
-    response = requests.post(tts_url, headers=headers, data=ssml.encode('utf-8'))
-    if response.status_code != 200:
+    try:
+        audio = cliente_tts.sintetizar(tts_url, headers, ssml.encode('utf-8'))
+    except TTSIndisponivel as e:
+        return jsonify({'erro': str(e)}), 503
+    except Exception as e:
+        print(f"Erro TTS: {e}")
         return jsonify({'erro': 'Erro ao gerar áudio'}), 500
 
-    return send_file(BytesIO(response.content), mimetype='audio/mpeg')
+    return send_file(BytesIO(audio), mimetype='audio/mpeg')
 
 @bp.route('/api/tts', methods=['POST'])
 def api_tts():
@@ -661,7 +752,7 @@ def api_tts():
         return jsonify({'erro': 'Texto não fornecido'}), 400
 
     try:
-        config = ConfiguracaoSistema.query.first()
+        config = config_cache.obter()
         if not config:
             return jsonify({'erro': 'Configuração não encontrada'}), 500
 
@@ -680,7 +771,7 @@ def teste_tts():
 @login_required
 @role_required('admin')
 def prioridade_senhas():
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     return render_template('PriSenhas.html', config=config)
 
 @bp.route('/salvar_prioridade', methods=['POST'])
@@ -706,43 +797,112 @@ def salvar_prioridade():
     elif tipo == 'alternancia':
         config.tolerancia_minutos = int(request.form.get('tolerancia_minutos', 5))
 
+    marcar_config_alterada(config)
     db.session.commit()
+    config_cache.invalidar()
     flash("Configuração de prioridade salva com sucesso!")
     return redirect(url_for('main.prioridade_senhas'))
 
 
+@bp.route('/api/filas')
+@login_required
+def api_filas():
+    """Filas de atendimento (para o painel escolher quais o guichê atende)"""
+    return jsonify([fila._asdict() for fila in filas_cache.todas().values()])
+
+@bp.route('/api/filas', methods=['POST'])
+@login_required
+@role_required('admin')
+def salvar_fila():
+    """Cria (sem id) ou altera uma fila de atendimento"""
+    data = request.get_json(force=True)
+    fila = Fila.query.get(data['id']) if data.get('id') else Fila()
+    if fila is None:
+        return jsonify({'erro': 'Fila não encontrada'}), 404
+
+    nome = (data.get('nome') if 'nome' in data else fila.nome) or ''
+    prefixo = (data.get('prefixo') if 'prefixo' in data else fila.prefixo) or ''
+    prefixo = prefixo.strip().upper()
+    if not nome.strip():
+        return jsonify({'erro': 'Informe o nome da fila'}), 400
+    if len(prefixo) > 2 or not (prefixo.isalpha() or prefixo == ''):
+        return jsonify({'erro': 'Prefixo deve ter até 2 letras'}), 400
+    if Fila.query.filter(Fila.prefixo == prefixo, Fila.id != (fila.id or 0)).first():
+        return jsonify({'erro': 'Prefixo já usado por outra fila'}), 400
+
+    fila.nome = nome.strip()
+    fila.prefixo = prefixo
+    if 'ativa' in data:
+        fila.ativa = bool(data['ativa'])
+    if 'tipo_prioridade' in data:
+        if data['tipo_prioridade'] not in (None, 'intercalamento', 'peso', 'alternancia'):
+            return jsonify({'erro': 'Tipo de prioridade inválido'}), 400
+        fila.tipo_prioridade = data['tipo_prioridade']
+    for campo in ('intercalamento_valor', 'peso_normal', 'peso_preferencial', 'tolerancia_minutos'):
+        if campo in data:
+            valor = data[campo]
+            if valor in (None, ''):
+                valor = None        # usa o valor do sistema
+            elif str(valor).strip().isdigit():
+                valor = int(valor)
+            else:
+                return jsonify({'erro': f'Valor inválido para {campo}: informe um número inteiro'}), 400
+            setattr(fila, campo, valor)
+
+    if fila.id is None:
+        db.session.add(fila)
+    # Filas ficam em cache junto com a configuração: a nova geração recarrega ambos
+    config = ConfiguracaoSistema.query.first()
+    if config:
+        marcar_config_alterada(config)
+    db.session.commit()
+    config_cache.invalidar()
+    filas_cache.invalidar()
+    return jsonify({'success': True, 'id': fila.id})
+
+
 @bp.route('/painel_fila_json')
 @login_required
 @role_required('admin', 'usuario')
 def painel_fila_json():
-    senhas = (
-        Senha.query
-        .order_by(
-            Senha.chamado.asc(),
-            Senha.chamado_em.desc().nullslast(),
-            Senha.id.asc()
+    fila_id = request.args.get('fila', type=int)
+
+    def gerar():
+        consulta = Senha.query
+        if fila_id:
+            # Índice (fila_id, chamado, id): não lê senhas das outras filas
+            consulta = consulta.filter(Senha.fila_id == fila_id)
+        senhas = (
+            consulta
+            .order_by(
+                Senha.chamado.asc(),
+                Senha.chamado_em.desc().nullslast(),
+                Senha.id.asc()
+            )
+            .limit(15)
+            .all()
         )
-        .limit(15)
-        .all()
-    )
-    dados = []
-    for s in senhas:
-        chamado_em_brasil = None
-        if s.chamado_em:
-            # Converter UTC para horário do Brasil
-            dt_brasil = utc_to_brasil(s.chamado_em)
-            chamado_em_brasil = dt_brasil.strftime('%Y-%m-%dT%H:%M:%S')
+        dados = []
+        for s in senhas:
+            chamado_em_brasil = None
+            if s.chamado_em:
+                # Converter UTC para horário do Brasil
+                dt_brasil = utc_to_brasil(s.chamado_em)
+                chamado_em_brasil = dt_brasil.strftime('%Y-%m-%dT%H:%M:%S')
         
-        dados.append({
-            'id': s.id,
-            # se número for 0 (chamada personalizada), mostra só a sigla
-            'senha_completa': s.sigla if s.numero == 0 else f"{s.sigla}{str(s.numero).zfill(4)}",
-            'chamado': s.chamado,
-            'chamado_por': s.chamado_por,
-            'chamado_em': chamado_em_brasil,
-            'numero': s.numero,
-        })
-    return jsonify(dados)
+            dados.append({
+                'id': s.id,
+                # se número for 0 (chamada personalizada), mostra só a sigla
+                'senha_completa': s.sigla if s.numero == 0 else f"{s.sigla}{str(s.numero).zfill(4)}",
+                'chamado': s.chamado,
+                'chamado_por': s.chamado_por,
+                'chamado_em': chamado_em_brasil,
+                'numero': s.numero,
+            })
+        return jsonify(dados)
+
+    # Sem alterações na fila desde a última consulta do cliente: 304 sem tocar no banco
+    return _resposta_condicional(versao_fila.etag(), gerar)
 
 
 @bp.route('/api/painel_action', methods=['POST'])
@@ -757,9 +917,10 @@ def painel_action():
 
     if not guiche:
         return jsonify({'success': False, 'error': 'Guichê não informado.'}), 400
-    session['guiche'] = guiche
+    if session.get('guiche') != guiche:
+        session['guiche'] = guiche
 
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     tts_service = TTSService(config)
 
     if acao == 'personalizada':
@@ -778,31 +939,30 @@ def painel_action():
             primeira_vez=False
         )
         db.session.add(nova)
+        estatisticas = EstatisticaService(db.session)
+        estatisticas.registrar_emissao(nova)
+        estatisticas.registrar_chamada(nova, nova.chamado_por, guiche, nova.chamado_em)
         db.session.commit()
+        _registrar_chamada(nova)
         
         mensagem_voz = tts_service.formatar_mensagem_voz(texto, guiche)
         session['mensagem_voz'] = mensagem_voz
         return jsonify({'success': True, 'message': f"📣 Chamada personalizada: {texto}"})
 
     elif acao == 'proxima':
-        # Usar serviço de prioridade
-        prioridade_service = PrioridadeService(db.session, config)
-        contador_normais = session.get('contador_normais', 0)
-        
-        senha, novo_contador = prioridade_service.selecionar_proxima_senha(contador_normais)
+        # Usar serviço de prioridade (por fila atendida pelo guichê)
+        import time
+        commit_start = time.time()
+        # Seleção + UPDATE condicional: dois guichês nunca recebem a mesma senha
+        senha = PrioridadeService.chamar_proxima_das_filas(
+            db.session, config, _filas_do_guiche(data.get('filas')), current_user.id, guiche
+        )
         
         if not senha:
             return jsonify({'success': False, 'message': 'Nenhuma senha na fila.'}), 400
 
-        import time
-        commit_start = time.time()
-        
-        senha.chamado = True
-        senha.chamado_por = current_user.id
-        chamado_em_now = datetime.utcnow()
-        senha.chamado_em = chamado_em_now
-        senha.guiche = guiche
-        db.session.commit()
+        _registrar_chamada(senha)
+        chamado_em_now = senha.chamado_em
         
         commit_duration = (time.time() - commit_start) * 1000  # ms
         completo = senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
@@ -810,12 +970,7 @@ def painel_action():
         if commit_duration > 50:
             print(f"[PERF] api/painel_action commit demorou {commit_duration:.2f}ms - Senha: {completo}")
         
-        # Atualizar contador na sessão
-        session['contador_normais'] = novo_contador
-
         completo = senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
-        mensagem_voz = tts_service.formatar_mensagem_voz(completo, guiche)
-        session['mensagem_voz'] = mensagem_voz
         return jsonify({'success': True, 'message': f"📢 Próxima senha: {completo}, dirija-se ao guichê {guiche}"})
 
     elif acao == 'rechamar':
@@ -828,6 +983,7 @@ def painel_action():
         senha.guiche = guiche
         senha.chamado_por = current_user.id
         db.session.commit()
+        _registrar_chamada(senha)
         
         completo = senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
         mensagem_voz = tts_service.formatar_mensagem_voz(completo, guiche)
@@ -844,12 +1000,11 @@ def painel_action():
         if senha.chamado:
             return jsonify({'success': False, 'error': 'Esta senha já foi chamada.'}), 400
         
-        # Chamar a senha específica fora de ordem
-        senha.chamado = True
-        senha.chamado_em = datetime.utcnow()
-        senha.guiche = guiche
-        senha.chamado_por = current_user.id
-        db.session.commit()
+        # Chamar a senha específica fora de ordem (UPDATE condicional: pode
+        # ter sido chamada por outro guichê depois da consulta acima)
+        if not PrioridadeService(db.session, config).marcar_chamada(senha, current_user.id, guiche):
+            return jsonify({'success': False, 'error': 'Esta senha já foi chamada.'}), 400
+        _registrar_chamada(senha)
         
         completo = senha.sigla if senha.numero == 0 else f"{senha.sigla}{str(senha.numero).zfill(4)}"
         mensagem_voz = tts_service.formatar_mensagem_voz(completo, guiche)
@@ -879,7 +1034,7 @@ def atualizacoes():
     system_info = version_manager.get_system_info()
     
     return render_template('atualizacoes.html', 
-                         config=ConfiguracaoSistema.query.first(),
+                         config=config_cache.obter(),
                          system_info=system_info)
 
 @bp.route('/api/check_updates')
@@ -946,30 +1101,20 @@ def api_download_updater_script():
 @bp.route('/limpar_dados_teste', methods=['POST'])
 @login_required
 def limpar_dados_teste():
-    """Limpar dados antigos de teste do banco de dados"""
-    from datetime import datetime, timedelta
-    
+    """Move as senhas de dias anteriores para o arquivo (continuam nos relatórios)"""
     try:
-        # Definir data limite (7 dias atrás)
-        data_limite = datetime.now() - timedelta(days=7)
+        # Commit a cada lote (ver arquivo.py)
+        senhas_arquivadas = arquivo_senhas.arquivar()
         
-        # Contar senhas que serão removidas
-        senhas_para_remover = Senha.query.filter(
-            Senha.gerado_em < data_limite
-        ).count()
+        ultimas_chamadas.carregar()
+        chamadas_por_fila.carregar()
+        motor_fila.carregar()
         
-        # Remover senhas antigas
-        Senha.query.filter(
-            Senha.gerado_em < data_limite
-        ).delete()
-        
-        db.session.commit()
-        
-        flash(f'Removidas {senhas_para_remover} senhas antigas (anteriores a {data_limite.strftime("%d/%m/%Y")})', 'success')
+        flash(f'{senhas_arquivadas} senhas de dias anteriores movidas para o arquivo (continuam nos relatórios)', 'success')
         
     except Exception as e:
         db.session.rollback()
-        flash(f'Erro ao limpar dados: {str(e)}', 'danger')
+        flash(f'Erro ao arquivar dados: {str(e)}', 'danger')
     
     return redirect(url_for('main.relatorios'))
 
@@ -977,98 +1122,27 @@ def limpar_dados_teste():
 @login_required
 def relatorios():
     """Página principal de relatórios com dashboard"""
-    config = ConfiguracaoSistema.query.first()
-    
-    # Estatísticas gerais
-    total_senhas = Senha.query.count()
-    senhas_chamadas = Senha.query.filter_by(chamado=True).count()
-    senhas_aguardando = Senha.query.filter_by(chamado=False).count()
-    
-    # Por tipo de paciente
-    normais = Senha.query.filter_by(tipo_paciente='normal').count()
-    preferenciais = Senha.query.filter_by(tipo_paciente='preferencial').count()
-    
-    # Por primeira vez
-    primeira_vez = Senha.query.filter_by(primeira_vez=True).count()
-    recorrentes = Senha.query.filter_by(primeira_vez=False).count()
-    
-    # Por usuário que chamou
-    chamadas_por_usuario = db.session.query(
-        Usuario.nome,
-        db.func.count(Senha.id).label('total_chamadas')
-    ).join(Senha, Usuario.id == Senha.chamado_por)\
-     .filter(Senha.chamado == True)\
-     .group_by(Usuario.id, Usuario.nome)\
-     .order_by(db.func.count(Senha.id).desc())\
-     .all()
-    
-    # Senhas por dia (últimos 30 dias)
-    from datetime import datetime, timedelta
-    hoje = datetime.now().date()
-    senhas_por_dia = []
-    
-    # Buscar dados dos últimos 30 dias
-    for i in range(30):
-        data = hoje - timedelta(days=i)
-        count = Senha.query.filter(
-            db.func.date(Senha.gerado_em) == data
-        ).count()
-        if count > 0:  # Só incluir dias com senhas
-            senhas_por_dia.append({
-                'data': data,
-                'total': count
-            })
-    
-    # Ordenar por data (mais antiga primeiro)
-    senhas_por_dia.sort(key=lambda x: x['data'])
-    
-    # Tempo médio de espera (senhas chamadas nos últimos 30 dias)
-    tempo_medio = None
-    data_limite = datetime.now() - timedelta(days=30)
-    senhas_chamadas_validas = Senha.query.filter(
-        Senha.chamado == True,
-        Senha.chamado_em != None,
-        Senha.gerado_em != None,
-        Senha.chamado_em > Senha.gerado_em,
-        Senha.gerado_em >= data_limite  # Apenas senhas dos últimos 30 dias
-    ).all()
-    if senhas_chamadas_validas:
-        tempos = [
-            (s.chamado_em - s.gerado_em).total_seconds() / 60
-            for s in senhas_chamadas_validas
-        ]
-        # Filtrar tempos muito altos (acima de 2 horas) que podem ser dados de teste
-        tempos_filtrados = [t for t in tempos if t <= 120]  # Máximo 2 horas
-        if tempos_filtrados:
-            tempo_medio = round(sum(tempos_filtrados) / len(tempos_filtrados), 1)
-    
-    return render_template('relatorios.html', 
-                         config=config,
-                         total_senhas=total_senhas,
-                         senhas_chamadas=senhas_chamadas,
-                         senhas_aguardando=senhas_aguardando,
-                         normais=normais,
-                         preferenciais=preferenciais,
-                         primeira_vez=primeira_vez,
-                         recorrentes=recorrentes,
-                         chamadas_por_usuario=chamadas_por_usuario,
-                         senhas_por_dia=senhas_por_dia,
-                         tempo_medio=tempo_medio)
+    config = config_cache.obter()
+    # Lido das estatísticas diárias consolidadas (ver RelatorioService); percentis,
+    # mapa de calor e guichês calculados sobre os arrays em memória (ver analise.py)
+    return render_template('relatorios.html', config=config, analise=analise_espera.analisar(dias=30),
+                           dias_semana=DIAS_SEMANA, **RelatorioService(db.session).dashboard(dias=30))
 
 @bp.route('/relatorio_personalizado')
 @login_required
 def relatorio_personalizado():
     """Página para criar relatórios personalizados"""
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     
     # Buscar dados para filtros
     usuarios = Usuario.query.all()
     tipos_paciente = db.session.query(Senha.tipo_paciente).distinct().all()
     
     # Calcular estatísticas rápidas
-    total_senhas = Senha.query.count()
-    senhas_chamadas = Senha.query.filter_by(chamado=True).count()
-    senhas_aguardando = Senha.query.filter_by(chamado=False).count()
+    contagens = RelatorioService(db.session).contagens()
+    total_senhas = contagens['total_senhas']
+    senhas_chamadas = contagens['senhas_chamadas']
+    senhas_aguardando = contagens['senhas_aguardando']
     
     return render_template('relatorio_personalizado.html', 
                          config=config,
@@ -1081,286 +1155,28 @@ def relatorio_personalizado():
 @bp.route('/gerar_relatorio', methods=['POST'])
 @login_required
 def gerar_relatorio():
-    """Gerar relatório personalizado em PDF ou Excel"""
-    from datetime import datetime, timedelta
-    import json
+    """Gerar relatório personalizado em PDF ou Excel (na própria requisição)
     
-    # Obter parâmetros do formulário
+    A página de relatório personalizado usa /api/relatorios/trabalhos, que gera
+    em segundo plano; esta rota continua para envio direto do formulário.
+    """
     formato = request.form.get('formato', 'pdf')
-    data_inicio = request.form.get('data_inicio')
-    data_fim = request.form.get('data_fim')
-    tipo_paciente = request.form.get('tipo_paciente')
-    primeira_vez = request.form.get('primeira_vez')
-    usuario_id = request.form.get('usuario_id')
-    chamadas_apenas = request.form.get('chamadas_apenas') == 'on'
-    
-    # Construir query base
-    query = Senha.query
-    
-    # Aplicar filtros
-    if data_inicio:
-        query = query.filter(Senha.gerado_em >= datetime.strptime(data_inicio, '%Y-%m-%d'))
-    if data_fim:
-        query = query.filter(Senha.gerado_em <= datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1))
-    if tipo_paciente:
-        query = query.filter(Senha.tipo_paciente == tipo_paciente)
-    if primeira_vez:
-        query = query.filter(Senha.primeira_vez == (primeira_vez == 'true'))
-    if usuario_id:
-        query = query.filter(Senha.chamado_por == usuario_id)
-    if chamadas_apenas:
-        query = query.filter(Senha.chamado == True)
-    
-    # Executar query
-    senhas = query.order_by(Senha.gerado_em.desc()).all()
     
-    # Gerar relatório
     if formato == 'pdf':
-        return gerar_pdf_relatorio(senhas, request.form)
+        return gerar_pdf_relatorio(request.form)
+    elif formato == 'pacote':
+        return gerar_pacote_relatorio(request.form)
     else:
-        return gerar_excel_relatorio(senhas, request.form)
+        return gerar_excel_relatorio(request.form)
 
-def gerar_pdf_relatorio(senhas, parametros):
+def gerar_pdf_relatorio(parametros):
     """Gerar relatório em PDF com formatação melhorada e totais"""
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    from io import BytesIO
-    from datetime import datetime
-    from collections import defaultdict
+    from .relatorios import escrever_pdf
     
-    # Criar buffer para o PDF
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1,  # Centralizado
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=20,
-        alignment=1,
-        fontName='Helvetica-Bold'
-    )
-    
-    section_style = ParagraphStyle(
-        'Section',
-        parent=styles['Heading3'],
-        fontSize=12,
-        spaceAfter=15,
-        fontName='Helvetica-Bold'
-    )
-    
-    # ============================================================================
-    # CABEÇALHO DO RELATÓRIO
-    # ============================================================================
-    elements.append(Paragraph("SISTEMA DE SENHAS - IAAM", title_style))
-    elements.append(Paragraph("RELATÓRIO PERSONALIZADO", subtitle_style))
-    elements.append(Spacer(1, 20))
-    
-    # ============================================================================
-    # INFORMAÇÕES DO RELATÓRIO
-    # ============================================================================
-    elements.append(Paragraph("INFORMAÇÕES DO RELATÓRIO", section_style))
-    
-    info_data = [
-        ['Gerado em:', datetime.now().strftime('%d/%m/%Y às %H:%M:%S')],
-        ['Gerado por:', current_user.nome],
-        ['Total de registros:', str(len(senhas))],
-    ]
-    
-    # Adicionar filtros aplicados
-    filtros_aplicados = []
-    if parametros.get('data_inicio'):
-        filtros_aplicados.append(f"De {parametros['data_inicio']}")
-    if parametros.get('data_fim'):
-        filtros_aplicados.append(f"Até {parametros['data_fim']}")
-    if parametros.get('tipo_paciente'):
-        tipo = 'Preferencial' if parametros['tipo_paciente'] == 'preferencial' else 'Normal'
-        filtros_aplicados.append(f"Tipo: {tipo}")
-    if parametros.get('primeira_vez'):
-        vez = 'Primeira vez' if parametros['primeira_vez'] == 'true' else 'Recorrentes'
-        filtros_aplicados.append(f"Categoria: {vez}")
-    if parametros.get('usuario_id'):
-        usuario = Usuario.query.get(parametros['usuario_id'])
-        if usuario:
-            filtros_aplicados.append(f"Usuário: {usuario.nome}")
-    if parametros.get('chamadas_apenas') == 'on':
-        filtros_aplicados.append("Apenas senhas chamadas")
-    
-    if filtros_aplicados:
-        info_data.append(['Filtros aplicados:', ', '.join(filtros_aplicados)])
-    
-    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 30))
-    
-    # ============================================================================
-    # RESUMO ESTATÍSTICO
-    # ============================================================================
-    if senhas:
-        elements.append(Paragraph("RESUMO ESTATÍSTICO", section_style))
-        
-        # Calcular estatísticas
-        total_senhas = len(senhas)
-        senhas_normais = len([s for s in senhas if s.tipo_paciente == 'normal'])
-        senhas_preferenciais = len([s for s in senhas if s.tipo_paciente == 'preferencial'])
-        primeira_vez = len([s for s in senhas if s.primeira_vez])
-        recorrentes = len([s for s in senhas if not s.primeira_vez])
-        senhas_chamadas = len([s for s in senhas if s.chamado])
-        senhas_aguardando = len([s for s in senhas if not s.chamado])
-        
-        # Estatísticas por tipo
-        stats_data = [
-            ['CATEGORIA', 'QUANTIDADE', 'PERCENTUAL'],
-            ['Total de Senhas', str(total_senhas), '100%'],
-            ['Senhas Normais', str(senhas_normais), f"{senhas_normais/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
-            ['Senhas Preferenciais', str(senhas_preferenciais), f"{senhas_preferenciais/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
-            ['Primeira Vez', str(primeira_vez), f"{primeira_vez/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
-            ['Recorrentes', str(recorrentes), f"{recorrentes/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
-            ['Chamadas', str(senhas_chamadas), f"{senhas_chamadas/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
-            ['Aguardando', str(senhas_aguardando), f"{senhas_aguardando/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'],
-        ]
-        
-        stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch])
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-        ]))
-        elements.append(stats_table)
-        elements.append(Spacer(1, 30))
-        
-        # ============================================================================
-        # CHAMADAS POR USUÁRIO
-        # ============================================================================
-        elements.append(Paragraph("CHAMADAS POR USUÁRIO", section_style))
-        
-        # Calcular chamadas por usuário
-        chamadas_por_usuario = defaultdict(int)
-        for senha in senhas:
-            if senha.chamado and senha.usuario_chamador:
-                chamadas_por_usuario[senha.usuario_chamador.nome] += 1
-        
-        if chamadas_por_usuario:
-            user_data = [['USUÁRIO', 'TOTAL DE CHAMADAS', 'PERCENTUAL']]
-            for usuario, total in sorted(chamadas_por_usuario.items(), key=lambda x: x[1], reverse=True):
-                percentual = f"{total/senhas_chamadas*100:.1f}%" if senhas_chamadas > 0 else '0%'
-                user_data.append([usuario, str(total), percentual])
-            
-            user_table = Table(user_data, colWidths=[3*inch, 1.5*inch, 1.5*inch])
-            user_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgreen),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-            ]))
-            elements.append(user_table)
-        else:
-            elements.append(Paragraph("Nenhuma chamada registrada no período.", styles['Normal']))
-        
-        elements.append(Spacer(1, 30))
-        
-        # ============================================================================
-        # DADOS DETALHADOS DAS SENHAS
-        # ============================================================================
-        elements.append(Paragraph("DADOS DETALHADOS DAS SENHAS", section_style))
-        
-        # Cabeçalho da tabela
-        data = [['Nº', 'TIPO', '1ª VEZ', 'GERADO EM', 'CHAMADO', 'CHAMADO POR', 'GUICHÊ', 'TEMPO ESPERA']]
-        
-        for senha in senhas:
-            chamado_por = senha.usuario_chamador.nome if senha.usuario_chamador else 'Não chamado'
-            gerado_em = senha.gerado_em.strftime('%d/%m %H:%M')
-            
-            # Calcular tempo de espera
-            tempo_espera = '-'
-            if senha.chamado and senha.chamado_em and senha.gerado_em:
-                diff = senha.chamado_em - senha.gerado_em
-                minutos = int(diff.total_seconds() / 60)
-                # Validar se o tempo é razoável (máximo 2 horas)
-                if 0 <= minutos <= 120:
-                    tempo_espera = f"{minutos}min"
-                else:
-                    tempo_espera = "Inválido"
-            
-            data.append([
-                f"{senha.sigla}{senha.numero:03d}",
-                'Pref' if senha.tipo_paciente == 'preferencial' else 'Norm',
-                'Sim' if senha.primeira_vez else 'Não',
-                gerado_em,
-                'Sim' if senha.chamado else 'Não',
-                chamado_por[:15] + '...' if len(chamado_por) > 15 else chamado_por,
-                senha.guiche or '-',
-                tempo_espera
-            ])
-        
-        # Criar tabela com larguras ajustadas
-        table = Table(data, colWidths=[0.7*inch, 0.6*inch, 0.5*inch, 1*inch, 0.6*inch, 1.5*inch, 0.6*inch, 0.8*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.beige, colors.white]),
-        ]))
-        elements.append(table)
-    else:
-        elements.append(Paragraph("Nenhum registro encontrado com os filtros aplicados.", styles['Normal']))
-    
-    # ============================================================================
-    # RODAPÉ
-    # ============================================================================
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph(f"Relatório gerado automaticamente pelo Sistema de Senhas IAAM em {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}", 
-                             ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=1)))
-    
-    # Gerar PDF
-    doc.build(elements)
+    escrever_pdf(parametros, buffer, current_user.nome)
     buffer.seek(0)
     
-    # Retornar arquivo
-    from flask import send_file
     return send_file(
         buffer,
         as_attachment=True,
@@ -1368,191 +1184,74 @@ def gerar_pdf_relatorio(senhas, parametros):
         mimetype='application/pdf'
     )
 
-def gerar_excel_relatorio(senhas, parametros):
-    """Gerar relatório em Excel com formatação melhorada e totais"""
-    import pandas as pd
-    from io import BytesIO
-    from datetime import datetime
-    from collections import defaultdict
-    
-    # Preparar dados detalhados
-    dados = []
-    for senha in senhas:
-        # Calcular tempo de espera
-        tempo_espera = '-'
-        if senha.chamado and senha.chamado_em and senha.gerado_em:
-            diff = senha.chamado_em - senha.gerado_em
-            minutos = int(diff.total_seconds() / 60)
-            # Validar se o tempo é razoável (máximo 2 horas)
-            if 0 <= minutos <= 120:
-                tempo_espera = f"{minutos} minutos"
-            else:
-                tempo_espera = "Inválido"
-        
-        dados.append({
-            'Número': f"{senha.sigla}{senha.numero:03d}",
-            'Tipo': 'Preferencial' if senha.tipo_paciente == 'preferencial' else 'Normal',
-            'Primeira Vez': 'Sim' if senha.primeira_vez else 'Não',
-            'Gerado em': senha.gerado_em.strftime('%d/%m/%Y %H:%M'),
-            'Chamado': 'Sim' if senha.chamado else 'Não',
-            'Chamado em': senha.chamado_em.strftime('%d/%m/%Y %H:%M') if senha.chamado_em else 'Não chamado',
-            'Chamado por': senha.usuario_chamador.nome if senha.usuario_chamador else 'Não chamado',
-            'Guichê': senha.guiche or '-',
-            'Tempo de Espera': tempo_espera
-        })
-    
-    # Criar DataFrame
-    df = pd.DataFrame(dados)
+def gerar_excel_relatorio(parametros):
+    """Gerar relatório em Excel (streaming: senhas em lotes, openpyxl write-only)"""
+    return _enviar_relatorio_temporario(parametros, 'excel')
+
+def gerar_pacote_relatorio(parametros):
+    """Gerar PDF e Excel de uma só consulta, renderizados em paralelo, num ZIP"""
+    return _enviar_relatorio_temporario(parametros, 'pacote')
+
+def _enviar_relatorio_temporario(parametros, formato):
+    from .relatorios import gerar_temporario, ler_em_blocos, FORMATOS
     
-    # Criar buffer para Excel
-    buffer = BytesIO()
+    _, extensao, mimetype = FORMATOS[formato]
+    caminho = gerar_temporario(parametros, current_user.nome, formato)
+    nome_arquivo = f'relatorio_senhas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extensao}'
     
-    # Criar Excel com múltiplas abas
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        # ============================================================================
-        # ABA 1: DADOS DETALHADOS
-        # ============================================================================
-        df.to_excel(writer, sheet_name='Dados Detalhados', index=False)
-        
-        # ============================================================================
-        # ABA 2: INFORMAÇÕES DO RELATÓRIO
-        # ============================================================================
-        # Adicionar filtros aplicados
-        filtros_aplicados = []
-        if parametros.get('data_inicio'):
-            filtros_aplicados.append(f"De {parametros['data_inicio']}")
-        if parametros.get('data_fim'):
-            filtros_aplicados.append(f"Até {parametros['data_fim']}")
-        if parametros.get('tipo_paciente'):
-            tipo = 'Preferencial' if parametros['tipo_paciente'] == 'preferencial' else 'Normal'
-            filtros_aplicados.append(f"Tipo: {tipo}")
-        if parametros.get('primeira_vez'):
-            vez = 'Primeira vez' if parametros['primeira_vez'] == 'true' else 'Recorrentes'
-            filtros_aplicados.append(f"Categoria: {vez}")
-        if parametros.get('usuario_id'):
-            usuario = Usuario.query.get(parametros['usuario_id'])
-            if usuario:
-                filtros_aplicados.append(f"Usuário: {usuario.nome}")
-        if parametros.get('chamadas_apenas') == 'on':
-            filtros_aplicados.append("Apenas senhas chamadas")
-        
-        info_data = {
-            'Informação': [
-                'Relatório gerado em',
-                'Gerado por',
-                'Total de registros',
-                'Filtros aplicados'
-            ],
-            'Valor': [
-                datetime.now().strftime('%d/%m/%Y às %H:%M:%S'),
-                current_user.nome,
-                len(senhas),
-                ', '.join(filtros_aplicados) if filtros_aplicados else 'Nenhum filtro aplicado'
-            ]
+    # Envia o arquivo em blocos; o temporário é removido ao fim do envio
+    return Response(
+        ler_em_blocos(caminho),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={nome_arquivo}',
+            'Content-Length': str(os.path.getsize(caminho))
         }
-        
-        info_df = pd.DataFrame(info_data)
-        info_df.to_excel(writer, sheet_name='Informações', index=False)
-        
-        # ============================================================================
-        # ABA 3: RESUMO ESTATÍSTICO
-        # ============================================================================
-        if senhas:
-            # Calcular estatísticas
-            total_senhas = len(senhas)
-            senhas_normais = len([s for s in senhas if s.tipo_paciente == 'normal'])
-            senhas_preferenciais = len([s for s in senhas if s.tipo_paciente == 'preferencial'])
-            primeira_vez = len([s for s in senhas if s.primeira_vez])
-            recorrentes = len([s for s in senhas if not s.primeira_vez])
-            senhas_chamadas = len([s for s in senhas if s.chamado])
-            senhas_aguardando = len([s for s in senhas if not s.chamado])
-            
-            stats_data = {
-                'Categoria': [
-                    'Total de Senhas',
-                    'Senhas Normais',
-                    'Senhas Preferenciais',
-                    'Primeira Vez',
-                    'Recorrentes',
-                    'Chamadas',
-                    'Aguardando'
-                ],
-                'Quantidade': [
-                    total_senhas,
-                    senhas_normais,
-                    senhas_preferenciais,
-                    primeira_vez,
-                    recorrentes,
-                    senhas_chamadas,
-                    senhas_aguardando
-                ],
-                'Percentual': [
-                    '100%',
-                    f"{senhas_normais/total_senhas*100:.1f}%" if total_senhas > 0 else '0%',
-                    f"{senhas_preferenciais/total_senhas*100:.1f}%" if total_senhas > 0 else '0%',
-                    f"{primeira_vez/total_senhas*100:.1f}%" if total_senhas > 0 else '0%',
-                    f"{recorrentes/total_senhas*100:.1f}%" if total_senhas > 0 else '0%',
-                    f"{senhas_chamadas/total_senhas*100:.1f}%" if total_senhas > 0 else '0%',
-                    f"{senhas_aguardando/total_senhas*100:.1f}%" if total_senhas > 0 else '0%'
-                ]
-            }
-            
-            stats_df = pd.DataFrame(stats_data)
-            stats_df.to_excel(writer, sheet_name='Resumo Estatístico', index=False)
-            
-            # ============================================================================
-            # ABA 4: CHAMADAS POR USUÁRIO
-            # ============================================================================
-            # Calcular chamadas por usuário
-            chamadas_por_usuario = defaultdict(int)
-            for senha in senhas:
-                if senha.chamado and senha.usuario_chamador:
-                    chamadas_por_usuario[senha.usuario_chamador.nome] += 1
-            
-            if chamadas_por_usuario:
-                user_data = []
-                for usuario, total in sorted(chamadas_por_usuario.items(), key=lambda x: x[1], reverse=True):
-                    percentual = f"{total/senhas_chamadas*100:.1f}%" if senhas_chamadas > 0 else '0%'
-                    user_data.append({
-                        'Usuário': usuario,
-                        'Total de Chamadas': total,
-                        'Percentual': percentual
-                    })
-                
-                user_df = pd.DataFrame(user_data)
-                user_df.to_excel(writer, sheet_name='Chamadas por Usuário', index=False)
-            
-            # ============================================================================
-            # ABA 5: ANÁLISE TEMPORAL
-            # ============================================================================
-            # Agrupar por data
-            senhas_por_data = defaultdict(int)
-            for senha in senhas:
-                data = senha.gerado_em.strftime('%d/%m/%Y')
-                senhas_por_data[data] += 1
-            
-            if senhas_por_data:
-                temporal_data = []
-                for data, total in sorted(senhas_por_data.items()):
-                    temporal_data.append({
-                        'Data': data,
-                        'Total de Senhas': total
-                    })
-                
-                temporal_df = pd.DataFrame(temporal_data)
-                temporal_df.to_excel(writer, sheet_name='Análise Temporal', index=False)
+    )
+
+@bp.route('/api/relatorios/trabalhos', methods=['POST'])
+@login_required
+def api_enviar_relatorio():
+    """Agenda o relatório personalizado; a página acompanha pelo id retornado"""
+    from .relatorios import fila_relatorios
     
-    buffer.seek(0)
+    trabalho = fila_relatorios.enviar(request.form.get('formato', 'pdf'), request.form, current_user.nome)
+    return jsonify(_dados_trabalho_relatorio(trabalho)), 202
+
+@bp.route('/api/relatorios/trabalhos/<trabalho_id>')
+@login_required
+def api_status_relatorio(trabalho_id):
+    """Status e progresso de um relatório (pendente, gerando, concluido, falhou)"""
+    from .relatorios import fila_relatorios
     
-    # Retornar arquivo
-    from flask import send_file
+    trabalho = fila_relatorios.obter(trabalho_id)
+    if not trabalho:
+        return jsonify({'erro': 'Relatório não encontrado'}), 404
+    return jsonify(_dados_trabalho_relatorio(trabalho))
+
+@bp.route('/relatorios/trabalhos/<trabalho_id>/download')
+@login_required
+def baixar_relatorio(trabalho_id):
+    """Download do arquivo de um relatório gerado em segundo plano"""
+    from .relatorios import fila_relatorios, TrabalhoRelatorio
+    
+    trabalho = fila_relatorios.obter(trabalho_id)
+    if not trabalho or trabalho.status != TrabalhoRelatorio.CONCLUIDO or not os.path.exists(trabalho.caminho):
+        flash('Relatório não disponível. Gere-o novamente.', 'warning')
+        return redirect(url_for('main.relatorio_personalizado'))
     return send_file(
-        buffer,
+        trabalho.caminho,
         as_attachment=True,
-        download_name=f'relatorio_senhas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        download_name=trabalho.nome_arquivo,
+        mimetype=trabalho.mimetype
     )
 
+def _dados_trabalho_relatorio(trabalho):
+    dados = trabalho.to_dict()
+    if trabalho.status == trabalho.CONCLUIDO:
+        dados['download'] = url_for('main.baixar_relatorio', trabalho_id=trabalho.id)
+    return dados
+
 @bp.route('/api/buscar_usuarios')
 @login_required
 @role_required('admin')
@@ -2,40 +2,83 @@
 Serviços centralizados para o sistema de senhas
 """
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from random import choices
+from types import SimpleNamespace
 from typing import Optional, Tuple
+from flask import current_app, has_app_context
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
 
-from .models import Senha, ConfiguracaoSistema
+from .models import Senha, Usuario, ConfiguracaoSistema, SequenciaSenha, EstatisticaDiaria, FILA_PADRAO
+from .cache import TZ_BRASIL, TZ_UTC
+from .fila import motor_fila, contador_intercalamento
+from .arquivo import todas_as_senhas
+from .impressao import spooler_impressao, enviar_para_impressora, obter_template, TrabalhoImpressao
+from .tts import cache_audio, chave_audio, biblioteca_fragmentos, cliente_tts, mensagem_anuncio, FORMATO_AUDIO
+
+
+# Campos de prioridade que uma fila pode sobrescrever (None = usa o do sistema)
+CAMPOS_PRIORIDADE = ('tipo_prioridade', 'intercalamento_valor', 'peso_normal',
+                     'peso_preferencial', 'tolerancia_minutos')
 
 
 class PrioridadeService:
-    """Serviço para gerenciar lógicas de prioridade de senhas"""
+    """Serviço para gerenciar lógicas de prioridade de senhas (de uma fila)"""
+    
+    # Candidatas testadas antes de desistir quando outros guichês chamam ao mesmo tempo
+    MAX_TENTATIVAS_CHAMADA = 50
     
-    def __init__(self, db_session: Session, config: ConfiguracaoSistema):
+    def __init__(self, db_session: Session, config: ConfiguracaoSistema, fila=None):
         self.db = db_session
+        self.fila_id = fila.id if fila is not None else FILA_PADRAO
+        if fila is not None:
+            config = SimpleNamespace(**{
+                campo: getattr(config, campo) if getattr(fila, campo) is None else getattr(fila, campo)
+                for campo in CAMPOS_PRIORIDADE
+            })
         self.config = config
     
+    @classmethod
+    def chamar_proxima_das_filas(cls, db_session: Session, config: ConfiguracaoSistema, filas: list,
+                                 usuario_id: int, guiche: str) -> Optional[Senha]:
+        """Chama a próxima senha entre as filas atendidas pelo guichê
+        
+        A fila cuja senha está esperando há mais tempo é atendida primeiro,
+        cada uma com a sua estratégia de prioridade.
+        """
+        candidatas = [(motor_fila.mais_antiga(fila.id), fila) for fila in filas]
+        candidatas = sorted((c for c in candidatas if c[0] is not None), key=lambda c: c[0])
+        for _, fila in candidatas:
+            senha = cls(db_session, config, fila).chamar_proxima_senha(usuario_id, guiche)
+            if senha:
+                return senha
+        return None
+    
     def selecionar_senha_prioritaria(self) -> Optional[Senha]:
         """Seleciona a próxima senha preferencial"""
-        return (self.db.query(Senha)
-                .filter_by(chamado=False, tipo_paciente='preferencial')
-                .order_by(Senha.id)
-                .first())
+        return self._primeira_da_fila('preferencial')
     
     def selecionar_senha_normal(self) -> Optional[Senha]:
         """Seleciona a próxima senha normal"""
-        return (self.db.query(Senha)
-                .filter_by(chamado=False, tipo_paciente='normal')
-                .order_by(Senha.id)
-                .first())
+        return self._primeira_da_fila('normal')
     
     def contar_senhas_aguardando(self) -> Tuple[int, int]:
         """Conta senhas normais e preferenciais aguardando"""
-        normais = self.db.query(Senha).filter_by(chamado=False, tipo_paciente='normal').count()
-        preferenciais = self.db.query(Senha).filter_by(chamado=False, tipo_paciente='preferencial').count()
-        return normais, preferenciais
+        return motor_fila.tamanho('normal', self.fila_id), motor_fila.tamanho('preferencial', self.fila_id)
+    
+    def _primeira_da_fila(self, tipo: str) -> Optional[Senha]:
+        """Carrega (pela PK) a senha no início da fila em memória"""
+        while True:
+            senha_id = motor_fila.primeiro(tipo, self.fila_id)
+            if senha_id is None:
+                return None
+            senha = self.db.get(Senha, senha_id)
+            if senha and not senha.chamado:
+                return senha
+            # Removida ou chamada fora das rotas: descarta e tenta a seguinte
+            motor_fila.descartar(senha_id)
     
     def aplicar_intercalamento(self, contador_normais: int) -> Tuple[Optional[Senha], int]:
         """Aplica lógica de intercalamento fixo"""
@@ -110,28 +153,18 @@ class PrioridadeService:
         tolerancia = self.config.tolerancia_minutos or 5
         agora = datetime.utcnow()
         
-        # Buscar senhas aguardando
-        preferenciais = (self.db.query(Senha)
-                        .filter_by(chamado=False, tipo_paciente='preferencial')
-                        .order_by(Senha.id)
-                        .all())
-        
-        normais = (self.db.query(Senha)
-                  .filter_by(chamado=False, tipo_paciente='normal')
-                  .order_by(Senha.id)
-                  .all())
+        # Apenas os tamanhos (em cache) e, depois da decisão, o início de uma
+        # das filas: o custo não depende de quantas senhas estão aguardando
+        total_normais, total_preferenciais = self.contar_senhas_aguardando()
         
-        print(f"[DEBUG Alternância] Aguardando: {len(normais)} normais, {len(preferenciais)} preferenciais")
+        print(f"[DEBUG Alternância] Aguardando: {total_normais} normais, {total_preferenciais} preferenciais")
         
         # Verificar última senha preferencial chamada
-        ultima_pref = (self.db.query(Senha)
-                      .filter_by(chamado=True, tipo_paciente='preferencial')
-                      .order_by(Senha.chamado_em.desc())
-                      .first())
+        ultima_pref_em = motor_fila.ultima_preferencial_em(self.fila_id)
         
         # Calcular tempo de espera desde a última preferencial
-        if ultima_pref and ultima_pref.chamado_em:
-            tempo_espera = (agora - ultima_pref.chamado_em).total_seconds() / 60
+        if ultima_pref_em:
+            tempo_espera = (agora - ultima_pref_em).total_seconds() / 60
             print(f"[DEBUG] Última preferencial chamada há: {tempo_espera:.2f} min")
         else:
             tempo_espera = 0  # Se nunca houve preferencial chamada
@@ -140,12 +173,12 @@ class PrioridadeService:
         # Decidir qual tipo chamar baseado no tempo de espera
         if tempo_espera >= tolerancia:
             # Se preferenciais esperaram muito (> tolerância), priorizar eles
-            senha = preferenciais[0] if preferenciais else (normais[0] if normais else None)
+            senha = self.selecionar_senha_prioritaria() or self.selecionar_senha_normal()
             print(f"[DEBUG] TOLERÂNCIA ATINGIDA ({tempo_espera:.1f} >= {tolerancia}min) - Chamando PREFERENCIAL")
         else:
             # Se ainda não atingiu tolerância, pode chamar normal
-            senha = normais[0] if normais else (preferenciais[0] if preferenciais else None)
-            tipo_chamado = 'NORMAL' if normais else 'PREFERENCIAL'
+            senha = self.selecionar_senha_normal() or self.selecionar_senha_prioritaria()
+            tipo_chamado = 'NORMAL' if senha and senha.tipo_paciente == 'normal' else 'PREFERENCIAL'
             print(f"[DEBUG] Dentro da tolerância ({tempo_espera:.1f}/{tolerancia}min) - Chamando {tipo_chamado}")
         
         return senha
@@ -183,12 +216,350 @@ class PrioridadeService:
         
         print(f"[DEBUG PRIORIDADE] === Fim da seleção ===")
         return senha, novo_contador
+    
+    def chamar_proxima_senha(self, usuario_id: int, guiche: str) -> Optional[Senha]:
+        """Seleciona a próxima senha e a marca como chamada (já com commit)
+        
+        A senha é reservada na fila em memória, o que distribui candidatas
+        diferentes entre guichês simultâneos, e gravada com um UPDATE
+        condicional (chamado = 0). Se outro guichê chamou antes, tenta a próxima.
+        O contador do intercalamento é o compartilhado por todos os guichês e
+        avança por compare-and-set antes da chamada: se outro guichê o alterou
+        depois da leitura, a senha é devolvida e a decisão é refeita.
+        """
+        for _ in range(self.MAX_TENTATIVAS_CHAMADA):
+            contador_normais = contador_intercalamento.valor(self.fila_id)
+            senha, novo_contador = self.selecionar_proxima_senha(contador_normais)
+            if not senha:
+                return None
+            
+            if not motor_fila.reservar(senha.id):
+                continue        # reservada por outro guichê: tenta a próxima
+            
+            avancou = novo_contador != contador_normais
+            if avancou and not contador_intercalamento.trocar(self.fila_id, contador_normais, novo_contador):
+                motor_fila.devolver(senha)
+                continue        # contador alterado por outro guichê: refaz a seleção
+            
+            try:
+                chamada = self.marcar_chamada(senha, usuario_id, guiche)
+            except Exception:
+                self.db.rollback()
+                motor_fila.devolver(senha)
+                if avancou:
+                    contador_intercalamento.trocar(self.fila_id, novo_contador, contador_normais)
+                raise
+            
+            if chamada:
+                return senha
+            if avancou:
+                contador_intercalamento.trocar(self.fila_id, novo_contador, contador_normais)
+            # já chamada em outro guichê: tenta a próxima
+        
+        return None
+    
+    def marcar_chamada(self, senha: Senha, usuario_id: int, guiche: str) -> bool:
+        """Grava a chamada apenas se a senha ainda estiver aguardando (com commit)"""
+        chamado_em = datetime.utcnow()
+        resultado = self.db.execute(
+            update(Senha)
+            .where(Senha.id == senha.id, Senha.chamado == False)
+            .values(chamado=True, chamado_por=usuario_id,
+                    chamado_em=chamado_em, guiche=guiche)
+        )
+        if resultado.rowcount != 1:
+            self.db.rollback()
+            return False
+        EstatisticaService(self.db).registrar_chamada(senha, usuario_id, guiche, chamado_em)
+        self.db.commit()
+        return True
+
+
+class SequenciaService:
+    """Numeração diária das senhas, um contador por sigla
+
+    O número é reservado com um único UPDATE ... RETURNING dentro da mesma
+    transação que grava a senha: o lock de escrita do SQLite serializa os
+    quiosques concorrentes e, se a gravação falhar, o rollback devolve o número.
+    """
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def proximo_numero(self, sigla: str, agora: datetime = None) -> int:
+        """Reserva o próximo número do dia para a sigla (efetivado no commit)"""
+        data = (agora or datetime.now(TZ_BRASIL)).date()
+        tabela = SequenciaSenha.__table__
+
+        numero = self.db.execute(
+            update(tabela)
+            .where(tabela.c.data == data, tabela.c.sigla == sigla)
+            .values(ultimo_numero=tabela.c.ultimo_numero + 1)
+            .returning(tabela.c.ultimo_numero)
+        ).scalar()
+        if numero is not None:
+            return numero
+
+        # Primeira senha do dia para a sigla: continua a partir das senhas já
+        # emitidas hoje (ex.: atualização no meio do expediente)
+        inicial = self._maior_numero_do_dia(sigla, data) + 1
+        stmt = insert(tabela).values(data=data, sigla=sigla, ultimo_numero=inicial)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabela.c.data, tabela.c.sigla],
+            set_={'ultimo_numero': tabela.c.ultimo_numero + 1}
+        ).returning(tabela.c.ultimo_numero)
+        return self.db.execute(stmt).scalar()
+
+    def _maior_numero_do_dia(self, sigla: str, data) -> int:
+        inicio_dia = datetime.combine(data, datetime.min.time(), TZ_BRASIL)
+        inicio_utc = inicio_dia.astimezone(TZ_UTC).replace(tzinfo=None)
+        maior = (self.db.query(func.max(Senha.numero))
+                 .filter(Senha.sigla == sigla, Senha.gerado_em >= inicio_utc)
+                 .scalar())
+        return maior or 0
+
+
+class EstatisticaService:
+    """Mantém a tabela estatistica_diaria (upsert na mesma transação da senha)
+
+    Na emissão soma 1 em `emitidas` na linha do dia sem usuário/guichê; na
+    chamada soma 1 em `chamadas` e registra o tempo de espera na linha do dia
+    × usuário × guichê. `recalcular` refaz as linhas a partir das senhas.
+    """
+
+    # Limites do histograma de espera, em minutos (e a coluna de cada faixa)
+    FAIXAS = ((5, 'faixa_ate_5'), (15, 'faixa_ate_15'), (30, 'faixa_ate_30'),
+              (60, 'faixa_ate_60'), (120, 'faixa_ate_120'))
+    FAIXA_EXCEDENTE = 'faixa_acima_120'
+    ESPERA_MAXIMA_MINUTOS = 120
+
+    CHAVES = ('data', 'tipo_paciente', 'primeira_vez', 'usuario_id', 'guiche')
+    CONTADORES = ('emitidas', 'chamadas', 'espera_qtd', 'espera_soma') + \
+        tuple(coluna for _, coluna in FAIXAS) + (FAIXA_EXCEDENTE,)
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def registrar_emissao(self, senha: Senha) -> None:
+        """Senha emitida (chamar antes do commit da senha)"""
+        gerado_em = senha.gerado_em or datetime.utcnow()
+        self._somar(self._chaves(senha, gerado_em), {'emitidas': 1})
+
+    def registrar_chamada(self, senha: Senha, usuario_id: int, guiche: str, chamado_em: datetime) -> None:
+        """Primeira chamada da senha (chamar antes do commit da chamada)"""
+        gerado_em = senha.gerado_em or chamado_em
+        espera = round((chamado_em - gerado_em).total_seconds())
+        incrementos = {'chamadas': 1, self._faixa(espera): 1}
+        valida = 0 < espera <= self.ESPERA_MAXIMA_MINUTOS * 60
+        if valida:
+            incrementos.update(espera_qtd=1, espera_soma=espera)
+        self._somar(self._chaves(senha, gerado_em, usuario_id, guiche), incrementos,
+                    espera if valida else None)
+
+    def recalcular(self, desde: date = None) -> int:
+        """Refaz as estatísticas (todas ou a partir de `desde`) a partir das senhas
+
+        Lê a tabela senha e o arquivo (senha_arquivo). Não faz commit.
+        Retorna o número de linhas gravadas.
+        """
+        tabela = EstatisticaDiaria.__table__
+        remocao = tabela.delete()
+        if desde is not None:
+            remocao = remocao.where(tabela.c.data >= desde)
+        self.db.execute(remocao)
+
+        senhas = todas_as_senhas().c
+        dia = func.date(senhas.gerado_em)
+        filtros = [senhas.gerado_em.isnot(None)]
+        if desde is not None:
+            filtros.append(senhas.gerado_em >= datetime.combine(desde, datetime.min.time()))
+
+        linhas = {}
+
+        def linha(data_texto, tipo, primeira_vez, usuario_id=0, guiche=''):
+            chave = (date.fromisoformat(data_texto), tipo, bool(primeira_vez), usuario_id or 0, guiche or '')
+            if chave not in linhas:
+                linhas[chave] = dict(zip(self.CHAVES, chave), **dict.fromkeys(self.CONTADORES, 0),
+                                     espera_min=None, espera_max=None)
+            return linhas[chave]
+
+        emissoes = (self.db.query(dia, senhas.tipo_paciente, senhas.primeira_vez, func.count(senhas.id))
+                    .filter(*filtros)
+                    .group_by(dia, senhas.tipo_paciente, senhas.primeira_vez))
+        for data_texto, tipo, primeira_vez, quantidade in emissoes:
+            linha(data_texto, tipo, primeira_vez)['emitidas'] += quantidade
+
+        espera = func.round((func.julianday(senhas.chamado_em) - func.julianday(senhas.gerado_em)) * 86400)
+        valida = (espera > 0) & (espera <= self.ESPERA_MAXIMA_MINUTOS * 60)
+        faixas = []
+        anterior = None
+        for limite, _ in self.FAIXAS:
+            condicao = espera <= limite * 60 if anterior is None else (espera > anterior * 60) & (espera <= limite * 60)
+            faixas.append(func.sum(case((condicao, 1), else_=0)))
+            anterior = limite
+        faixas.append(func.sum(case((espera > anterior * 60, 1), else_=0)))
+
+        usuario = func.coalesce(senhas.chamado_por, 0)
+        guiche = func.coalesce(senhas.guiche, '')
+        chamadas = (self.db.query(dia, senhas.tipo_paciente, senhas.primeira_vez, usuario, guiche,
+                                  func.count(senhas.id),
+                                  func.sum(case((valida, 1), else_=0)),
+                                  func.sum(case((valida, espera), else_=0)),
+                                  func.min(case((valida, espera))),
+                                  func.max(case((valida, espera))),
+                                  *faixas)
+                    .filter(*filtros, senhas.chamado == True)
+                    .group_by(dia, senhas.tipo_paciente, senhas.primeira_vez, usuario, guiche))
+        colunas_faixas = [coluna for _, coluna in self.FAIXAS] + [self.FAIXA_EXCEDENTE]
+        for data_texto, tipo, primeira_vez, usuario_id, guiche_, quantidade, qtd, soma, minimo, maximo, *contagens \
+                in chamadas:
+            item = linha(data_texto, tipo, primeira_vez, usuario_id, guiche_)
+            item['chamadas'] += quantidade
+            item['espera_qtd'] += qtd or 0
+            item['espera_soma'] += int(soma or 0)
+            item['espera_min'] = None if minimo is None else int(minimo)
+            item['espera_max'] = None if maximo is None else int(maximo)
+            for coluna, valor in zip(colunas_faixas, contagens):
+                item[coluna] += valor or 0
+
+        if linhas:
+            self.db.execute(insert(tabela), list(linhas.values()))
+        return len(linhas)
+
+    def _chaves(self, senha: Senha, gerado_em: datetime, usuario_id: int = 0, guiche: str = '') -> dict:
+        return {
+            'data': gerado_em.date(),
+            'tipo_paciente': senha.tipo_paciente,
+            'primeira_vez': bool(senha.primeira_vez),
+            'usuario_id': usuario_id or 0,
+            'guiche': guiche or '',
+        }
+
+    def _faixa(self, espera_segundos: int) -> str:
+        for limite, coluna in self.FAIXAS:
+            if espera_segundos <= limite * 60:
+                return coluna
+        return self.FAIXA_EXCEDENTE
+
+    def _somar(self, chaves: dict, incrementos: dict, espera: int = None) -> None:
+        tabela = EstatisticaDiaria.__table__
+        valores = dict(chaves, **incrementos)
+        if espera is not None:
+            valores.update(espera_min=espera, espera_max=espera)
+        stmt = insert(tabela).values(**valores)
+        atualizar = {coluna: tabela.c[coluna] + stmt.excluded[coluna] for coluna in incrementos}
+        if espera is not None:
+            # min()/max() com dois argumentos são funções escalares no SQLite
+            atualizar['espera_min'] = func.min(func.coalesce(tabela.c.espera_min, espera), espera)
+            atualizar['espera_max'] = func.max(func.coalesce(tabela.c.espera_max, espera), espera)
+        self.db.execute(stmt.on_conflict_do_update(index_elements=list(self.CHAVES), set_=atualizar))
+
+
+class RelatorioService:
+    """Estatísticas dos relatórios lidas de estatistica_diaria
+
+    Algumas centenas de linhas consolidadas por período, em vez de varrer as
+    senhas: uma consulta para os totais e chamadas por usuário e outra para a
+    série diária com o tempo médio de espera.
+    """
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def contagens(self) -> dict:
+        """Totais do sistema e chamadas por usuário (ordem decrescente)"""
+        e = EstatisticaDiaria
+        linhas = (self.db.query(e.tipo_paciente, e.primeira_vez, Usuario.nome,
+                                func.sum(e.emitidas), func.sum(e.chamadas))
+                  .outerjoin(Usuario, Usuario.id == e.usuario_id)
+                  .group_by(e.tipo_paciente, e.primeira_vez, e.usuario_id)
+                  .all())
+        return self._totalizar(linhas, chamadas_apenas=False)
+
+    def por_dia(self, dias: int = 30, hoje: date = None) -> dict:
+        """Senhas geradas por dia (só dias com senhas) e tempo médio de espera nos últimos `dias` dias"""
+        hoje = hoje or datetime.utcnow().date()
+        e = EstatisticaDiaria
+        linhas = (self.db.query(e.data, func.sum(e.emitidas), func.sum(e.espera_soma), func.sum(e.espera_qtd))
+                  .filter(e.data >= hoje - timedelta(days=dias - 1), e.data <= hoje)
+                  .group_by(e.data)
+                  .order_by(e.data)
+                  .all())
+        soma = sum(soma or 0 for _, _, soma, _ in linhas)
+        quantidade = sum(qtd or 0 for _, _, _, qtd in linhas)
+        return {
+            'senhas_por_dia': [{'data': data, 'total': total} for data, total, _, _ in linhas if total],
+            'tempo_medio': round(soma / quantidade / 60, 1) if quantidade else None,
+        }
+
+    def dashboard(self, dias: int = 30) -> dict:
+        """Variáveis do template relatorios.html"""
+        return {**self.contagens(), **self.por_dia(dias)}
+
+    def resumo(self, parametros) -> dict:
+        """Resumo estatístico de um relatório personalizado (mesmos filtros do formulário)
+
+        Com filtro de usuário ou "apenas chamadas" conta as senhas chamadas;
+        senão, as emitidas. Inclui a série por data (`por_data`).
+        """
+        e = EstatisticaDiaria
+        consulta = self.db.query(e.tipo_paciente, e.primeira_vez, Usuario.nome,
+                                 func.sum(e.emitidas), func.sum(e.chamadas), e.data)
+        consulta = consulta.outerjoin(Usuario, Usuario.id == e.usuario_id)
+        if parametros.get('data_inicio'):
+            consulta = consulta.filter(e.data >= date.fromisoformat(parametros['data_inicio']))
+        if parametros.get('data_fim'):
+            consulta = consulta.filter(e.data <= date.fromisoformat(parametros['data_fim']))
+        if parametros.get('tipo_paciente'):
+            consulta = consulta.filter(e.tipo_paciente == parametros['tipo_paciente'])
+        if parametros.get('primeira_vez'):
+            consulta = consulta.filter(e.primeira_vez == (parametros['primeira_vez'] == 'true'))
+        chamadas_apenas = bool(parametros.get('usuario_id')) or parametros.get('chamadas_apenas') == 'on'
+        if parametros.get('usuario_id'):
+            consulta = consulta.filter(e.usuario_id == int(parametros['usuario_id']))
+
+        linhas = consulta.group_by(e.data, e.tipo_paciente, e.primeira_vez, e.usuario_id).all()
+        resumo = self._totalizar([linha[:5] for linha in linhas], chamadas_apenas)
+        por_data = {}
+        for _, _, _, emitidas, chamadas, data in linhas:
+            por_data[data] = por_data.get(data, 0) + ((chamadas if chamadas_apenas else emitidas) or 0)
+        resumo['por_data'] = [(data, total) for data, total in sorted(por_data.items()) if total]
+        return resumo
+
+    @staticmethod
+    def _totalizar(linhas, chamadas_apenas: bool) -> dict:
+        """Soma linhas (tipo, primeira_vez, nome do usuário, emitidas, chamadas)"""
+        totais = dict.fromkeys(('total_senhas', 'senhas_chamadas', 'senhas_aguardando', 'normais',
+                                'preferenciais', 'primeira_vez', 'recorrentes'), 0)
+        por_usuario = {}
+        for tipo, primeira_vez, nome, emitidas, chamadas in linhas:
+            emitidas, chamadas = emitidas or 0, chamadas or 0
+            quantidade = chamadas if chamadas_apenas else emitidas
+            totais['total_senhas'] += quantidade
+            totais['senhas_chamadas'] += chamadas
+            if tipo in ('normal', 'preferencial'):
+                totais['normais' if tipo == 'normal' else 'preferenciais'] += quantidade
+            totais['primeira_vez' if primeira_vez else 'recorrentes'] += quantidade
+            if chamadas and nome is not None:
+                por_usuario[nome] = por_usuario.get(nome, 0) + chamadas
+        totais['senhas_aguardando'] = totais['total_senhas'] - totais['senhas_chamadas']
+
+        totais['chamadas_por_usuario'] = [
+            SimpleNamespace(nome=nome, total_chamadas=total)
+            for nome, total in sorted(por_usuario.items(), key=lambda item: item[1], reverse=True)
+        ]
+        return totais
 
 
 class ImpressoraService:
     """Serviço para gerenciar impressão de senhas"""
     
-    def __init__(self, config: ConfiguracaoSistema = None):
+    def __init__(self, config: ConfiguracaoSistema = None, layout: dict = None):
+        # Layout do ticket: parâmetro, TICKET_LAYOUT do config.py ou padrão
+        if layout is None and has_app_context():
+            layout = current_app.config.get('TICKET_LAYOUT')
+        self.template = obter_template(layout)
+
         # Buscar configurações do banco de dados ou usar padrões
         if config:
             self.impressoras = {
@@ -208,104 +579,44 @@ class ImpressoraService:
                 'secundaria': {'ip': '192.168.0.48', 'porta': 9100}
             }
     
-    def gerar_comandos_escpos(self, senha_completa: str) -> bytes:
-        """Gera comandos ESC/POS para impressão com formatação melhorada"""
-        from datetime import datetime
-        from zoneinfo import ZoneInfo
-        
-        ESC = b'\x1b'
-        GS = b'\x1d'
-        
-        # Obter data e hora atual no fuso horário de Manaus
-        TZ_MANAUS = ZoneInfo('America/Manaus')
-        agora = datetime.now(TZ_MANAUS)
-        data_hora = agora.strftime('%d/%m/%Y - %H:%M:%S')
-        
-        # Determinar tipo de senha
-        tipo_senha = "NORMAL"
-        if senha_completa.startswith('PP') or senha_completa.startswith('PR'):
-            tipo_senha = "PREFERENCIAL"
-        
-        comandos = b""
-        
-        # Inicializar impressora
-        comandos += ESC + b'@'
-        comandos += b'\n'
-        
-        # Cabeçalho - Nome da instituição
-        comandos += ESC + b'a' + b'\x01'  # Centralizar
-        comandos += ESC + b'!' + b'\x10'  # Fonte grande
-        comandos += b"================================\n"
-        comandos += ESC + b'!' + b'\x20'  # Fonte dupla altura
-        comandos += b"IAAM\n"
-        comandos += ESC + b'!' + b'\x00'  # Fonte normal
-        comandos += b"Sistema de Senhas\n"
-        comandos += b"================================\n"
-        comandos += b'\n'
-        
-        # Tipo de atendimento
-        comandos += ESC + b'!' + b'\x10'  # Fonte média
-        comandos += f"Tipo: {tipo_senha}\n".encode('utf-8')
-        comandos += ESC + b'!' + b'\x00'  # Fonte normal
-        comandos += b'\n'
-        
-        # Número da senha - DESTAQUE
-        comandos += b"--------------------------------\n"
-        comandos += ESC + b'!' + b'\x38'  # Dupla altura e largura
-        comandos += b"  SENHA  \n"
-        comandos += b'\n'
-        comandos += f" {senha_completa} \n".encode('utf-8')
-        comandos += b'\n'
-        comandos += ESC + b'!' + b'\x00'  # Fonte normal
-        comandos += b"--------------------------------\n"
-        comandos += b'\n\n'
-        
-        # Data e hora
-        comandos += ESC + b'!' + b'\x00'  # Fonte normal
-        comandos += f"{data_hora}\n".encode('utf-8')
-        comandos += b'\n\n'
-        
-        # Instruções
-        comandos += b"--------------------------------\n"
-        comandos += ESC + b'!' + b'\x10'  # Fonte média
-        comandos += b"   AGUARDE SER CHAMADO   \n"
-        comandos += ESC + b'!' + b'\x00'  # Fonte normal
-        comandos += b"--------------------------------\n"
-        comandos += b'\n'
-        comandos += b"Fique atento ao painel\n"
-        comandos += b"de chamadas\n"
-        comandos += b'\n'
-        comandos += b"Obrigado pela preferencia!\n"
-        comandos += b'\n\n\n\n\n\n'
-        
-        # Cortar papel
-        comandos += GS + b'V' + b'\x00'
-        
-        return comandos
+    def gerar_comandos_escpos(self, senha_completa: str, tipo_paciente: str) -> bytes:
+        """Gera comandos ESC/POS a partir do template pré-compilado do layout"""
+        return self.template.renderizar(senha_completa, tipo_paciente)
     
-    def imprimir_senha(self, senha_completa: str, impressora: str = 'principal') -> bool:
-        """Imprime uma senha na impressora especificada"""
-        import socket
-        
+    def imprimir_senha(self, senha_completa: str, tipo_paciente: str, impressora: str = 'principal') -> bool:
+        """Imprime uma senha na impressora especificada (síncrono)"""
         try:
             config = self.impressoras.get(impressora, self.impressoras['principal'])
-            comandos = self.gerar_comandos_escpos(senha_completa)
-            
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)  # Timeout de 5 segundos
-            sock.connect((config['ip'], config['porta']))
-            sock.sendall(comandos)
-            sock.close()
-            
+            comandos = self.gerar_comandos_escpos(senha_completa, tipo_paciente)
+            enviar_para_impressora((config['ip'], config['porta']), comandos, timeout=5)
             return True
         except Exception as e:
             print(f'Erro ao imprimir senha: {e}')
             return False
 
+    def destinos(self) -> dict:
+        """Endereços configurados: {'principal': (ip, porta), ...}"""
+        return {nome: (dados['ip'], dados['porta']) for nome, dados in self.impressoras.items()}
+
+    def impressora_disponivel(self, impressora: str = 'principal') -> bool:
+        """Indica se a fila de impressão ainda aceita trabalhos"""
+        return spooler_impressao.disponivel(impressora)
+
+    def agendar_impressao(self, senha_completa: str, tipo_paciente: str,
+                          impressora: str = 'principal') -> TrabalhoImpressao:
+        """Enfileira a impressão no spooler e retorna sem esperar a impressora"""
+        config = self.impressoras.get(impressora, self.impressoras['principal'])
+        comandos = self.gerar_comandos_escpos(senha_completa, tipo_paciente)
+        return spooler_impressao.enviar(
+            impressora, (config['ip'], config['porta']), comandos, descricao=senha_completa
+        )
+
 
 class TTSService:
     """Serviço para síntese de voz"""
     
+    FORMATO_AUDIO = FORMATO_AUDIO
+    
     def __init__(self, config: ConfiguracaoSistema):
         self.config = config
         self.chave_azure = (os.environ.get('TTS_AZURE_KEY') or '').strip()
@@ -313,22 +624,23 @@ class TTSService:
             os.environ.get('TTS_AZURE_ENDPOINT') or 'https://brazilsouth.tts.speech.microsoft.com'
         ).rstrip('/')
 
-    def gerar_audio(self, texto: str, nome_voz: str = '') -> bytes:
-        """Gera áudio usando Azure TTS"""
-        import requests
+    def voz(self, nome_voz: str = '') -> str:
+        """Voz informada ou a configurada no sistema"""
+        return nome_voz or self.config.voz_azure or 'pt-BR-FranciscaNeural'
 
+    def gerar_audio(self, texto: str, nome_voz: str = '') -> bytes:
+        """Gera áudio usando Azure TTS (sessão compartilhada, ver ClienteTTS)"""
         if not self.chave_azure:
             raise RuntimeError('TTS Azure não configurado: defina a variável TTS_AZURE_KEY.')
         
-        if not nome_voz:
-            nome_voz = self.config.voz_azure or 'pt-BR-FranciscaNeural'
+        nome_voz = self.voz(nome_voz)
         
         url = f"{self.endpoint_azure}/cognitiveservices/v1"
         
         headers = {
             "Ocp-Apim-Subscription-Key": self.chave_azure,
             "Content-Type": "application/ssml+xml",
-            "X-Microsoft-OutputFormat": "audio-16khz-32kbitrate-mono-mp3",
+            "X-Microsoft-OutputFormat": self.FORMATO_AUDIO,
             "User-Agent": "IAAM-SistemaSenhas"
         }
         
@@ -340,26 +652,39 @@ class TTSService:
         </speak>
         """
         
-        resposta = requests.post(url, headers=headers, data=ssml.encode('utf-8'), timeout=10)
+        return cliente_tts.sintetizar(url, headers, ssml.encode('utf-8'))
+    
+    def obter_audio(self, texto: str, nome_voz: str = '') -> Tuple[str, str]:
+        """Caminho do áudio no cache em disco e sua chave (usada como ETag)
         
-        if resposta.status_code == 200:
-            return resposta.content
-        else:
-            raise Exception(f"Erro Azure TTS: {resposta.status_code} - {resposta.text}")
+        O Azure só é chamado na primeira vez que a frase é pedida com a voz.
+        Anúncios de senha são montados com a biblioteca de fragmentos (sem
+        rede): sempre, no modo 'preferir', e também quando o Azure falha ou
+        o disjuntor do cliente está aberto.
+        """
+        nome_voz = self.voz(nome_voz)
+        chave = chave_audio(texto, nome_voz, self.FORMATO_AUDIO)
+        caminho = cache_audio.obter(chave)
+        if caminho is not None:
+            return caminho, chave
+
+        if biblioteca_fragmentos.modo == 'preferir':
+            dados = biblioteca_fragmentos.montar(texto, nome_voz, self.gerar_audio)
+            if dados is not None:
+                return cache_audio.salvar(chave, dados), chave
+
+        try:
+            dados = self.gerar_audio(texto, nome_voz)
+        except Exception:
+            if biblioteca_fragmentos.modo == 'desligado':
+                raise
+            dados = biblioteca_fragmentos.montar(texto, nome_voz)
+            if dados is None:
+                raise
+            # Chave própria: a frase completa do Azure substitui quando ele voltar
+            chave = chave_audio(texto, nome_voz, 'fragmentos')
+        return cache_audio.salvar(chave, dados), chave
     
     def formatar_mensagem_voz(self, senha_completa: str, guiche: str) -> str:
-        """Formata mensagem para síntese de voz"""
-        # Verifica se é chamada personalizada (apenas texto)
-        if senha_completa.isalpha():
-            return f"{senha_completa}, dirija-se ao guichê {guiche}"
-        
-        # Formata senha numérica - versão Python
-        import re
-        match = re.match(r'(\D+)(\d+)', senha_completa)
-        if match:
-            prefixo, numero = match.groups()
-            spelled = ' '.join(prefixo + numero)
-        else:
-            spelled = ' '.join(senha_completa)
-        
-        return f"Senha {spelled}, dirija-se ao guichê {guiche}" 
\ No newline at end of file
+        """Formata mensagem para síntese de voz (o mesmo texto que o display pede ao /tts_audio)"""
+        return mensagem_anuncio(senha_completa, guiche) 
\ No newline at end of file
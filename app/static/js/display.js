@@ -51,7 +51,7 @@ function tocarSomChamada(tipo) {
 }
 
 document.addEventListener('DOMContentLoaded', () => {
-  const { ultimaChamadaUrl, filaJsonUrl } = window.DISPLAY_CONFIG;
+  const { ultimaChamadaUrl, filaJsonUrl, eventosUrl } = window.DISPLAY_CONFIG;
 
   let lastCall = { id: null, ts: 0 };
   let isOverlayShowing = false;
@@ -371,6 +371,19 @@ document.addEventListener('DOMContentLoaded', () => {
   const NORMAL_MODE_INTERVAL = 100; // Modo normal ultra rápido - 100ms (10 verificações por segundo)
   const SLOW_MODE_INTERVAL = 500; // Modo lento apenas se WiFi muito lento
   
+  // ETags por URL: o servidor responde 304 quando nada mudou
+  const etags = {};
+
+  async function fetchCondicional(url, timeout) {
+    const headers = etags[url] ? { 'If-None-Match': etags[url] } : {};
+    const response = await fetchWithTimeout(url, { headers }, timeout, 0);
+    if (response.status === 304) return null;
+    if (!response.ok) return null;
+    const etag = response.headers.get('ETag');
+    if (etag) etags[url] = etag;
+    return response.json();
+  }
+
   async function fetchWithTimeout(url, options = {}, timeout = 3000, retries = 0) {
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), timeout);
@@ -422,77 +435,75 @@ document.addEventListener('DOMContentLoaded', () => {
   // ========================================
   let loopRunning = false;
 
+  function atualizarLista(dados) {
+    if (dados.versao !== ultimaVersao || firstRun) {
+      ultimaVersao = dados.versao;
+      const chamadas = dados.senhas || dados;
+      updateQueueDisplay(chamadas);
+    }
+  }
+
+  function processarChamada(u) {
+    if (!u.id) return;
+    const ts = new Date(u.chamado_em).getTime();
+
+    if (u.id === lastCall.id && ts <= lastCall.ts) return;
+
+    if (firstRun) {
+      lastCall = { id: u.id, ts };
+      firstRun = false;
+      return;
+    }
+
+    // NOVA CHAMADA DETECTADA - ATIVAR MODO RÁPIDO
+    if (!fastModeActive) {
+      fastModeActive = true;
+      currentPollingInterval = FAST_MODE_INTERVAL;
+      console.log('⚡ Modo rápido ativado para detectar chamadas rapidamente');
+      
+      // Cancelar próximo loop agendado e reagendar imediatamente
+      if (nextLoopTimeout) clearTimeout(nextLoopTimeout);
+      scheduleNextLoop();
+    }
+    
+    // Resetar timeout do modo rápido (estender por mais 5s)
+    if (fastModeTimeout) clearTimeout(fastModeTimeout);
+    fastModeTimeout = setTimeout(() => {
+      fastModeActive = false;
+      currentPollingInterval = NORMAL_MODE_INTERVAL;
+      console.log('✅ Voltando ao modo normal');
+    }, 5000);
+    
+    lastCall = { id: u.id, ts };
+    if (isOverlayShowing) {
+      const jaEstaNaFila = callQueue.some(item => item.id === u.id);
+      
+      if (jaEstaNaFila) {
+        console.log('⚠️ Já na fila:', u.senha);
+      } else {
+        console.log('⏳ Adicionando à fila:', u.senha);
+        callQueue.push(u);
+      }
+    } else {
+      console.log('🚀 Mostrando:', u.senha);
+      mostrarOverlay(u);
+    }
+  }
+
   async function loop() {
     if (loopRunning) return;
     
     loopRunning = true;
     
     try {
-      const [rLista, rUltima] = await Promise.all([
-        fetchWithTimeout(filaJsonUrl, {}, 2000, 0),
-        fetchWithTimeout(ultimaChamadaUrl, {}, 2000, 0)
+      const [lista, ultima] = await Promise.all([
+        fetchCondicional(filaJsonUrl, 2000),
+        fetchCondicional(ultimaChamadaUrl, 2000)
       ]);
 
-      if (rLista.ok) {
-        const dados = await rLista.json();
-        if (dados.versao !== ultimaVersao || firstRun) {
-          ultimaVersao = dados.versao;
-          const chamadas = dados.senhas || dados;
-          updateQueueDisplay(chamadas);
-        }
-      }
-
-      if (rUltima.ok) {
-        const u = await rUltima.json();
-        if (u.id) {
-          const ts = new Date(u.chamado_em).getTime();
-          
-          if (u.id !== lastCall.id || ts > lastCall.ts) {
-            if (firstRun) {
-              lastCall = { id: u.id, ts };
-              firstRun = false;
-            } else {
-              // NOVA CHAMADA DETECTADA - ATIVAR MODO RÁPIDO
-              const isNewCall = u.id !== lastCall.id || ts > lastCall.ts;
-              
-              if (isNewCall) {
-                if (!fastModeActive) {
-                  fastModeActive = true;
-                  currentPollingInterval = FAST_MODE_INTERVAL;
-                  console.log('⚡ Modo rápido ativado para detectar chamadas rapidamente');
-                  
-                  // Cancelar próximo loop agendado e reagendar imediatamente
-                  if (nextLoopTimeout) clearTimeout(nextLoopTimeout);
-                  scheduleNextLoop();
-                }
-                
-                // Resetar timeout do modo rápido (estender por mais 5s)
-                if (fastModeTimeout) clearTimeout(fastModeTimeout);
-                fastModeTimeout = setTimeout(() => {
-                  fastModeActive = false;
-                  currentPollingInterval = NORMAL_MODE_INTERVAL;
-                  console.log('✅ Voltando ao modo normal');
-                }, 5000);
-              }
-              
-              lastCall = { id: u.id, ts };
-              if (isOverlayShowing) {
-                const jaEstaNaFila = callQueue.some(item => item.id === u.id);
-                
-                if (jaEstaNaFila) {
-                  console.log('⚠️ Já na fila:', u.senha);
-                } else {
-                  console.log('⏳ Adicionando à fila:', u.senha);
-                  callQueue.push(u);
-                }
-              } else {
-                console.log('🚀 Mostrando:', u.senha);
-                mostrarOverlay(u);
-              }
-            }
-          }
-        }
-      }
+      // null = 304 Not Modified (nada mudou desde a última consulta)
+      if (lista) atualizarLista(lista);
+      if (ultima) processarChamada(ultima);
     } catch (err) {
       console.error('Erro no loop:', err);
     } finally {
@@ -500,6 +511,45 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // ========================================
+  // Stream de chamadas (SSE) - polling só quando o stream cai
+  // ========================================
+  let streamAtivo = false;
+
+  function conectarStream() {
+    if (!eventosUrl || !window.EventSource) return;
+
+    const fonte = new EventSource(eventosUrl);
+
+    fonte.addEventListener('open', () => {
+      streamAtivo = true;
+      if (nextLoopTimeout) clearTimeout(nextLoopTimeout);
+      nextLoopTimeout = null;
+      // Sincroniza o que pode ter sido perdido enquanto estava desconectado
+      loop();
+      console.log('📡 Stream de chamadas conectado - polling suspenso');
+    });
+
+    fonte.addEventListener('chamada', async (e) => {
+      try {
+        processarChamada(JSON.parse(e.data));
+        const lista = await fetchCondicional(filaJsonUrl, 2000);
+        if (lista) atualizarLista(lista);
+      } catch (err) {
+        console.error('Erro ao processar evento:', err);
+      }
+    });
+
+    fonte.addEventListener('error', () => {
+      // O EventSource reconecta sozinho; enquanto isso volta ao polling
+      if (streamAtivo) {
+        streamAtivo = false;
+        console.warn('⚠️ Stream de chamadas caiu - voltando ao polling');
+        scheduleNextLoop();
+      }
+    });
+  }
+
   // ========================================
   // Sistema de reconexão
   // ========================================
@@ -537,6 +587,7 @@ document.addEventListener('DOMContentLoaded', () => {
   let nextLoopTimeout = null;
   function scheduleNextLoop() {
     if (nextLoopTimeout) clearTimeout(nextLoopTimeout);
+    if (streamAtivo) return;
     
     nextLoopTimeout = setTimeout(() => {
       loop().finally(() => {
@@ -545,6 +596,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }, currentPollingInterval);
   }
   scheduleNextLoop();
+  conectarStream();
   
   setInterval(checkServer, 6000); // Menos frequente
   
@@ -65,13 +65,71 @@ window.inicializarPainel = function() {
   btnProxima.addEventListener('click', () => {
     const guiche = guicheInput.value.trim();
     if (!guiche) return SistemaUtils.toastManager.warning('Informe o número do guichê');
-    executarAcao({ acao: 'proxima', guiche });
+    const payload = { acao: 'proxima', guiche };
+    const filas = filasSelecionadas();
+    if (filas !== null) payload.filas = filas;
+    executarAcao(payload);
   });
 
+  // ─── Filas atendidas pelo guichê ─────────────────────────────────────────────
+  // Guardadas no navegador; o servidor também guarda na sessão a cada chamada
+  const filasGuiche = document.getElementById('filas-guiche');
+  const filasOpcoes = document.getElementById('filas-guiche-opcoes');
+  const CHAVE_FILAS = 'filas_guiche';
+
+  function filasSelecionadas() {
+    if (!filasGuiche || filasGuiche.classList.contains('d-none')) return null;
+    return Array.from(filasOpcoes.querySelectorAll('input:checked')).map(input => parseInt(input.value, 10));
+  }
+
+  async function carregarFilasGuiche() {
+    if (!filasGuiche) return;
+    try {
+      const filas = (await SistemaUtils.ApiUtils.getJson('/api/filas')).filter(f => f.ativa);
+      if (filas.length < 2) return;
+      const salvas = JSON.parse(localStorage.getItem(CHAVE_FILAS) || '[]');
+      filasOpcoes.replaceChildren(...filas.map(fila => {
+        const rotulo = document.createElement('label');
+        rotulo.className = 'form-check form-check-inline mb-0';
+        const input = document.createElement('input');
+        input.type = 'checkbox';
+        input.className = 'form-check-input';
+        input.value = fila.id;
+        input.checked = salvas.includes(fila.id);
+        input.addEventListener('change', () => {
+          localStorage.setItem(CHAVE_FILAS, JSON.stringify(filasSelecionadas()));
+        });
+        const texto = document.createElement('span');
+        texto.className = 'form-check-label';
+        texto.textContent = fila.prefixo ? `${fila.nome} (${fila.prefixo})` : fila.nome;
+        rotulo.append(input, texto);
+        return rotulo;
+      }));
+      filasGuiche.classList.remove('d-none');
+    } catch (e) {
+      console.error(e);
+    }
+  }
+
   // ─── Atualiza tabela de fila ─────────────────────────────────────────────────
+  let etagFila = null;
+
+  // Retorna null quando o servidor responde 304 (fila sem alterações)
+  async function buscarFila() {
+    const headers = etagFila ? { 'If-None-Match': etagFila } : {};
+    const response = await fetch('/painel_fila_json', { headers, cache: 'no-store' });
+    if (response.status === 304) return null;
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    etagFila = response.headers.get('ETag');
+    return response.json();
+  }
+
   async function atualizarFila() {
     try {
-      const dados = await SistemaUtils.ApiUtils.getJson('/painel_fila_json');
+      const dados = await buscarFila();
+      if (!dados) return;
 
       // Verifica se houve mudança com base no conteúdo
       const versaoAtual = JSON.stringify(dados);
@@ -139,6 +197,7 @@ window.inicializarPainel = function() {
   }
 
   // ─── Inicialização ───────────────────────────────────────────────────────────
+  carregarFilasGuiche();
   atualizarFila();
   setInterval(atualizarFila, SISTEMA_CONFIG.INTERVALO_ATUALIZACAO);
 };
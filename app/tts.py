@@ -0,0 +1,642 @@
+"""
+Cache de áudio do TTS
+
+As frases anunciadas pelos displays se repetem muito ("Senha N P 0 0 1 2,
+dirija-se ao guichê 3"), então cada áudio gerado pelo Azure é guardado em disco,
+endereçado pelo conteúdo: sha256(texto|voz|formato). Um índice em memória
+(ordem LRU e tamanho de cada arquivo) evita listar o diretório a cada acesso e
+limita o espaço ocupado, removendo os áudios usados há mais tempo.
+
+Biblioteca de fragmentos
+    Os anúncios usam um vocabulário pequeno: "Senha", letras, dígitos,
+    "dirija-se ao guichê" e o número do guichê. Cada fragmento é sintetizado
+    uma vez por voz e guardado só com os quadros MP3 (sem ID3 nem o quadro
+    Xing/Info); qualquer anúncio é montado concatenando os quadros, sem chamar
+    o Azure. Os fragmentos ficam em TTS_CACHE_DIR/fragmentos, fora do LRU.
+
+Cliente do Azure
+    Uma única requests.Session (conexões keep-alive reaproveitadas entre as
+    threads), no máximo TTS_MAX_CONCORRENCIA sínteses simultâneas e um
+    disjuntor: depois de TTS_CIRCUITO_FALHAS erros seguidos as chamadas
+    falham na hora por TTS_CIRCUITO_ABERTO_S segundos, e o TTSService serve o
+    cache/fragmentos. Guarda a latência das últimas requisições.
+
+Pré-geração
+    Ao emitir uma senha o texto do anúncio já é conhecido, menos o guichê.
+    PregeracaoTTS sintetiza em segundo plano o anúncio da senha para os
+    guichês ativos (limitado a TTS_PREGERACAO_GUICHES), de modo que o
+    /tts_audio da chamada já encontre o áudio no cache.
+"""
+import hashlib
+import os
+import queue
+import re
+import string
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+EXTENSAO = '.mp3'
+FORMATO_AUDIO = 'audio-16khz-32kbitrate-mono-mp3'
+
+
+def chave_audio(texto: str, voz: str, formato: str) -> str:
+    """Chave do áudio no cache (também usada como ETag)"""
+    return hashlib.sha256(f"{texto}|{voz}|{formato}".encode('utf-8')).hexdigest()
+
+
+class CacheAudio:
+    """Arquivos de áudio em disco com remoção LRU limitada por tamanho"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indice = OrderedDict()    # chave -> tamanho em bytes (mais antigo primeiro)
+        self._total = 0
+        self._carregado = False
+        self.diretorio = None
+        self.limite_bytes = 100 * 1024 * 1024
+        self.acertos = 0
+        self.faltas = 0
+
+    def configurar(self, config) -> None:
+        self.diretorio = config.get('TTS_CACHE_DIR')
+        self.limite_bytes = int(config.get('TTS_CACHE_MAX_MB', 100)) * 1024 * 1024
+        self._carregado = False
+
+    # ------------------------------------------------------------------
+    # Acesso
+    # ------------------------------------------------------------------
+    def caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave + EXTENSAO)
+
+    def obter(self, chave: str) -> Optional[str]:
+        """Caminho do áudio em cache (marcado como usado agora) ou None"""
+        self._garantir_carregado()
+        with self._lock:
+            presente = chave in self._indice
+            if presente:
+                self._indice.move_to_end(chave)
+        caminho = self.caminho(chave)
+        if presente and not os.path.exists(caminho):
+            # Removido por fora (limpeza manual do diretório)
+            self._descartar(chave)
+            presente = False
+        if presente:
+            self.acertos += 1
+            return caminho
+        self.faltas += 1
+        return None
+
+    def contem(self, chave: str) -> bool:
+        self._garantir_carregado()
+        return chave in self._indice
+
+    def salvar(self, chave: str, dados: bytes) -> str:
+        """Grava o áudio (escrita atômica) e remove os mais antigos se passar do limite"""
+        self._garantir_carregado()
+        caminho = self.caminho(chave)
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                arquivo.write(dados)
+            os.replace(temporario, caminho)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+        with self._lock:
+            self._total += len(dados) - self._indice.pop(chave, 0)
+            self._indice[chave] = len(dados)
+            removidos = []
+            while self._total > self.limite_bytes and len(self._indice) > 1:
+                antigo, tamanho = self._indice.popitem(last=False)
+                self._total -= tamanho
+                removidos.append(antigo)
+
+        for antigo in removidos:
+            try:
+                os.remove(self.caminho(antigo))
+            except OSError:
+                pass
+        return caminho
+
+    def estatisticas(self) -> dict:
+        self._garantir_carregado()
+        return {
+            'arquivos': len(self._indice),
+            'bytes': self._total,
+            'limite_bytes': self.limite_bytes,
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+        }
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+    def _garantir_carregado(self) -> None:
+        if self._carregado:
+            return
+        with self._lock:
+            if self._carregado:
+                return
+            os.makedirs(self.diretorio, exist_ok=True)
+            arquivos = []
+            for entrada in os.scandir(self.diretorio):
+                if entrada.name.endswith(EXTENSAO) and entrada.is_file():
+                    info = entrada.stat()
+                    arquivos.append((info.st_mtime, entrada.name[:-len(EXTENSAO)], info.st_size))
+            # Sem registro de acesso entre reinícios: mais recentes por data de gravação
+            arquivos.sort()
+            self._indice = OrderedDict((chave, tamanho) for _, chave, tamanho in arquivos)
+            self._total = sum(self._indice.values())
+            self._carregado = True
+
+    def _descartar(self, chave: str) -> None:
+        with self._lock:
+            self._total -= self._indice.pop(chave, 0)
+
+
+# ----------------------------------------------------------------------
+# Quadros MP3
+# ----------------------------------------------------------------------
+# Layer III: bitrates (kbps) por índice no MPEG-1 e no MPEG-2/2.5
+_BITRATES_MPEG1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_MPEG2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_TAXAS_AMOSTRAGEM = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _tamanho_id3(dados: bytes) -> int:
+    """Bytes ocupados pela tag ID3v2 no início (0 se não houver)"""
+    if len(dados) < 10 or dados[:3] != b'ID3':
+        return 0
+    tamanho = (dados[6] << 21) | (dados[7] << 14) | (dados[8] << 7) | dados[9]
+    rodape = 10 if dados[5] & 0x10 else 0
+    return 10 + tamanho + rodape
+
+
+def _tamanho_quadro(dados: bytes, inicio: int) -> int:
+    """Tamanho do quadro MP3 (Layer III) que começa em `inicio`; 0 se não for um cabeçalho válido"""
+    if inicio + 4 > len(dados) or dados[inicio] != 0xFF or dados[inicio + 1] & 0xE0 != 0xE0:
+        return 0
+    versao = (dados[inicio + 1] >> 3) & 0x03
+    camada = (dados[inicio + 1] >> 1) & 0x03
+    indice_bitrate = dados[inicio + 2] >> 4
+    indice_taxa = (dados[inicio + 2] >> 2) & 0x03
+    if versao == 1 or camada != 1 or indice_bitrate in (0, 15) or indice_taxa == 3:
+        return 0
+    preenchimento = (dados[inicio + 2] >> 1) & 0x01
+    taxa = _TAXAS_AMOSTRAGEM[versao][indice_taxa]
+    if versao == 3:
+        return 144 * _BITRATES_MPEG1[indice_bitrate] * 1000 // taxa + preenchimento
+    return 72 * _BITRATES_MPEG2[indice_bitrate] * 1000 // taxa + preenchimento
+
+
+def _quadro_informativo(quadro: bytes) -> bool:
+    """Quadro Xing/Info/VBRI: só metadados (duração do arquivo original), sem áudio"""
+    mpeg1 = (quadro[1] >> 3) & 0x03 == 3
+    mono = quadro[3] >> 6 == 3
+    info_lateral = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    etiqueta = quadro[4 + info_lateral:8 + info_lateral]
+    return etiqueta in (b'Xing', b'Info') or quadro[36:40] == b'VBRI'
+
+
+def quadros_mp3(dados: bytes) -> bytes:
+    """Somente os quadros de áudio de um MP3 (remove ID3v2/ID3v1 e o quadro Xing/Info)"""
+    posicao = _tamanho_id3(dados)
+    quadros = []
+    primeiro = True
+    while posicao < len(dados):
+        tamanho = _tamanho_quadro(dados, posicao)
+        if not tamanho:
+            if quadros:
+                break                           # fim do áudio (ex.: tag ID3v1)
+            posicao += 1                        # lixo antes do primeiro quadro
+            continue
+        quadro = dados[posicao:posicao + tamanho]
+        if len(quadro) < tamanho:
+            break                               # quadro truncado
+        if not (primeiro and _quadro_informativo(quadro)):
+            quadros.append(quadro)
+        primeiro = False
+        posicao += tamanho
+    return b''.join(quadros)
+
+
+def concatenar_mp3(partes: List[bytes]) -> bytes:
+    """Junta vários MP3 (mesmo formato) em um só, quadro a quadro"""
+    return b''.join(quadros_mp3(parte) for parte in partes)
+
+
+# ----------------------------------------------------------------------
+# Texto do anúncio
+# ----------------------------------------------------------------------
+def mensagem_anuncio(senha: str, guiche: str) -> str:
+    """Frase falada pelo display (mostrarOverlay em display.js), caractere a caractere
+
+    A chave do cache é o texto: qualquer diferença (até nos espaços, como os
+    três entre sigla e número) faria o /tts_audio da chamada perder o cache.
+    """
+    prefixo = 'ao guichê' if re.fullmatch(r'\d+', guiche, re.ASCII) else 'a'
+    if re.fullmatch(r'[A-Za-z]+', senha):
+        return f"{senha}, dirija-se {prefixo} {guiche}"
+    soletrado = ' '.join(re.sub(r'(\D+)(\d+)', r'\1 \2', senha, count=1, flags=re.ASCII))
+    return f"Senha {soletrado}, dirija-se {prefixo} {guiche}"
+
+
+# ----------------------------------------------------------------------
+# Biblioteca de fragmentos
+# ----------------------------------------------------------------------
+TEXTO_SENHA = 'Senha'
+TEXTO_GUICHE = 'dirija-se ao guichê'
+
+# Mesma frase de TTSService.formatar_mensagem_voz e do display.js
+# ("Senha N P   0 0 1 2, dirija-se ao guichê 3")
+_ANUNCIO = re.compile(r'^Senha ([A-Za-z0-9 ]+), dirija-se ao guichê (\d{1,3})$')
+
+
+class BibliotecaFragmentos:
+    """Fragmentos de anúncio sintetizados uma vez por voz e montados sem rede"""
+
+    ESPERA_APOS_FALHA = 60          # segundos antes de tentar aquecer de novo a mesma voz
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fragmentos = {}       # (voz, texto) -> quadros MP3
+        self._em_preparo = set()    # vozes com aquecimento em andamento
+        self._falhas = {}           # voz -> time.monotonic() da última falha
+        self.diretorio = None
+        self.guiches = 20
+        self.modo = 'preferir'
+
+    def configurar(self, config) -> None:
+        self.diretorio = os.path.join(config.get('TTS_CACHE_DIR'), 'fragmentos')
+        self.guiches = int(config.get('TTS_FRAGMENTOS_GUICHES', 20))
+        self.modo = config.get('TTS_FRAGMENTOS_MODO', 'preferir')
+        with self._lock:
+            self._fragmentos.clear()
+
+    def vocabulario(self) -> List[str]:
+        """Textos de todos os fragmentos (números de guichê até TTS_FRAGMENTOS_GUICHES)"""
+        textos = [TEXTO_SENHA, TEXTO_GUICHE] + list(string.ascii_uppercase) + list(string.digits)
+        textos += [str(n) for n in range(10, self.guiches + 1)]
+        return textos
+
+    @staticmethod
+    def decompor(texto: str) -> Optional[List[str]]:
+        """Fragmentos do anúncio, na ordem; None se a frase não for do formato padrão"""
+        encontrado = _ANUNCIO.match(texto.strip())
+        if not encontrado:
+            return None
+        soletrado, guiche = encontrado.groups()
+        caracteres = [c.upper() for c in soletrado if c != ' ']
+        if not caracteres:
+            return None
+        return [TEXTO_SENHA] + caracteres + [TEXTO_GUICHE, str(int(guiche))]
+
+    # ------------------------------------------------------------------
+    # Montagem
+    # ------------------------------------------------------------------
+    def montar(self, texto: str, voz: str, sintetizar: Optional[Callable] = None) -> Optional[bytes]:
+        """Anúncio montado com os fragmentos da voz (sem rede) ou None
+
+        Se faltar algum fragmento e `sintetizar` for informado, a biblioteca da
+        voz é aquecida em segundo plano para os próximos anúncios.
+        """
+        partes = self.decompor(texto)
+        if partes is None:
+            return None
+        quadros = [self.fragmento(parte, voz) for parte in partes]
+        if any(q is None for q in quadros):
+            if sintetizar is not None:
+                faltando = [p for p, q in zip(partes, quadros) if q is None]
+                self.preaquecer_em_segundo_plano(voz, sintetizar, self.vocabulario() + faltando)
+            return None
+        return b''.join(quadros)
+
+    def fragmento(self, texto: str, voz: str) -> Optional[bytes]:
+        """Quadros do fragmento (memória, depois disco) ou None se ainda não sintetizado"""
+        quadros = self._fragmentos.get((voz, texto))
+        if quadros is not None:
+            return quadros
+        try:
+            with open(self._caminho(texto, voz), 'rb') as arquivo:
+                quadros = arquivo.read()
+        except OSError:
+            return None
+        self._fragmentos[(voz, texto)] = quadros
+        return quadros
+
+    # ------------------------------------------------------------------
+    # Aquecimento
+    # ------------------------------------------------------------------
+    def preaquecer(self, voz: str, sintetizar: Callable, textos: Optional[List[str]] = None) -> int:
+        """Sintetiza os fragmentos que faltam para a voz; retorna quantos foram gerados
+
+        `sintetizar(texto, voz)` devolve o MP3 (TTSService.gerar_audio).
+        Para no primeiro erro (Azure fora do ar, chave ausente...).
+        """
+        gerados = 0
+        for texto in dict.fromkeys(textos or self.vocabulario()):
+            if self.fragmento(texto, voz) is not None:
+                continue
+            quadros = quadros_mp3(sintetizar(self._ssml(texto), voz))
+            if not quadros:
+                raise ValueError(f"Áudio sem quadros MP3 para o fragmento {texto!r}")
+            self._gravar(self._caminho(texto, voz), quadros)
+            self._fragmentos[(voz, texto)] = quadros
+            gerados += 1
+        return gerados
+
+    def preaquecer_em_segundo_plano(self, voz: str, sintetizar: Callable,
+                                    textos: Optional[List[str]] = None) -> bool:
+        """Dispara o aquecimento em uma thread (uma por voz); False se já em andamento"""
+        with self._lock:
+            falha = self._falhas.get(voz)
+            if voz in self._em_preparo or (falha and time.monotonic() - falha < self.ESPERA_APOS_FALHA):
+                return False
+            self._em_preparo.add(voz)
+
+        def aquecer():
+            try:
+                gerados = self.preaquecer(voz, sintetizar, textos)
+                if gerados:
+                    print(f"🔊 Fragmentos de voz gerados para {voz}: {gerados}")
+            except Exception as e:
+                self._falhas[voz] = time.monotonic()
+                print(f"⚠️ Erro ao gerar fragmentos de voz ({voz}): {e}")
+            finally:
+                with self._lock:
+                    self._em_preparo.discard(voz)
+
+        threading.Thread(target=aquecer, name=f'fragmentos-{voz}', daemon=True).start()
+        return True
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _ssml(texto: str) -> str:
+        """Letras isoladas são soletradas ("ene", não o artigo)"""
+        if len(texto) == 1 and texto.isalpha():
+            return f"<say-as interpret-as='characters'>{texto}</say-as>"
+        return texto
+
+    def _caminho(self, texto: str, voz: str) -> str:
+        return os.path.join(self.diretorio, chave_audio(texto, voz, FORMATO_AUDIO) + EXTENSAO)
+
+    def _gravar(self, caminho: str, dados: bytes) -> None:
+        os.makedirs(self.diretorio, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                arquivo.write(dados)
+            os.replace(temporario, caminho)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+
+# ----------------------------------------------------------------------
+# Cliente do Azure
+# ----------------------------------------------------------------------
+class TTSIndisponivel(RuntimeError):
+    """Síntese recusada sem chamar o Azure (disjuntor aberto ou sem vaga)"""
+
+
+class ClienteTTS:
+    """Sessão HTTP compartilhada com concorrência limitada, disjuntor e métricas"""
+
+    FECHADO, ABERTO, MEIO_ABERTO = 'fechado', 'aberto', 'meio-aberto'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessao = None
+        self._vagas = threading.BoundedSemaphore(4)
+        self._latencias = deque(maxlen=500)     # (ms, sucesso) das últimas requisições
+        self.max_concorrencia = 4
+        self.espera_vaga = 2.0
+        self.timeout = (3.05, 10)               # (conexão, leitura) em segundos
+        self.falhas_para_abrir = 3
+        self.tempo_aberto = 30
+        self.estado = self.FECHADO
+        self._falhas_seguidas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self.total = 0
+        self.erros = 0
+        self.recusadas = 0
+
+    def configurar(self, config) -> None:
+        self.max_concorrencia = int(config.get('TTS_MAX_CONCORRENCIA', 4))
+        self.espera_vaga = float(config.get('TTS_ESPERA_VAGA', 2))
+        self.timeout = (float(config.get('TTS_TIMEOUT_CONEXAO', 3.05)), float(config.get('TTS_TIMEOUT', 10)))
+        self.falhas_para_abrir = int(config.get('TTS_CIRCUITO_FALHAS', 3))
+        self.tempo_aberto = float(config.get('TTS_CIRCUITO_ABERTO_S', 30))
+        with self._lock:
+            if self._sessao is not None:
+                self._sessao.close()
+            self._sessao = None
+            self._vagas = threading.BoundedSemaphore(self.max_concorrencia)
+            self.estado = self.FECHADO
+            self._falhas_seguidas = 0
+
+    def _obter_sessao(self) -> requests.Session:
+        if self._sessao is None:
+            with self._lock:
+                if self._sessao is None:
+                    sessao = requests.Session()
+                    adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_concorrencia)
+                    sessao.mount('https://', adaptador)
+                    sessao.mount('http://', adaptador)
+                    self._sessao = sessao
+        return self._sessao
+
+    # ------------------------------------------------------------------
+    # Síntese
+    # ------------------------------------------------------------------
+    def sintetizar(self, url: str, headers: dict, ssml: bytes) -> bytes:
+        """POST no Azure; devolve o áudio ou levanta (TTSIndisponivel sem tentar)"""
+        self._autorizar()
+        vagas = self._vagas
+        if not vagas.acquire(timeout=self.espera_vaga):
+            self._liberar_teste()
+            self.recusadas += 1
+            raise TTSIndisponivel('TTS Azure ocupado: limite de sínteses simultâneas atingido.')
+        inicio = time.perf_counter()
+        try:
+            resposta = self._obter_sessao().post(url, headers=headers, data=ssml, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._registrar(inicio, sucesso=False, falha_servico=True)
+            raise RuntimeError(f"Erro Azure TTS: {e}") from e
+        finally:
+            vagas.release()
+
+        if resposta.status_code == 200:
+            self._registrar(inicio, sucesso=True)
+            return resposta.content
+        # Lentidão/instabilidade do serviço abre o disjuntor; erro do pedido (400) não
+        self._registrar(inicio, sucesso=False,
+                        falha_servico=resposta.status_code >= 500 or resposta.status_code in (401, 403, 429))
+        raise RuntimeError(f"Erro Azure TTS: {resposta.status_code} - {resposta.text[:200]}")
+
+    def _autorizar(self) -> None:
+        """Disjuntor: aberto recusa; passado o tempo, deixa uma única requisição de teste"""
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return
+            if self.estado == self.ABERTO and time.monotonic() - self._aberto_em >= self.tempo_aberto:
+                self.estado = self.MEIO_ABERTO
+            if self.estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return
+        self.recusadas += 1
+        raise TTSIndisponivel('TTS Azure indisponível (disjuntor aberto após falhas seguidas).')
+
+    def _liberar_teste(self) -> None:
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def _registrar(self, inicio: float, sucesso: bool, falha_servico: bool = False) -> None:
+        latencia = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self._latencias.append((latencia, sucesso))
+            self.total += 1
+            self._teste_em_andamento = False
+            if sucesso or not falha_servico:
+                if self.estado != self.FECHADO:
+                    print("🔊 TTS Azure respondendo novamente: disjuntor fechado")
+                self.estado = self.FECHADO
+                self._falhas_seguidas = 0
+                if not sucesso:
+                    self.erros += 1
+                return
+            self.erros += 1
+            self._falhas_seguidas += 1
+            if self.estado == self.MEIO_ABERTO or self._falhas_seguidas >= self.falhas_para_abrir:
+                if self.estado != self.ABERTO:
+                    print(f"⚠️ TTS Azure com {self._falhas_seguidas} falha(s) seguida(s): disjuntor aberto")
+                self.estado = self.ABERTO
+                self._aberto_em = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    def metricas(self) -> dict:
+        with self._lock:
+            latencias = sorted(ms for ms, _ in self._latencias)
+            ultimas_ok = sum(1 for _, ok in self._latencias if ok)
+        amostras = len(latencias)
+
+        def percentil(p):
+            return round(latencias[min(amostras - 1, int(amostras * p))], 1) if amostras else None
+
+        return {
+            'estado_circuito': self.estado,
+            'requisicoes': self.total,
+            'erros': self.erros,
+            'recusadas': self.recusadas,
+            'amostras': amostras,
+            'sucesso_amostras': ultimas_ok,
+            'latencia_ms': {
+                'p50': percentil(0.50),
+                'p95': percentil(0.95),
+                'max': round(latencias[-1], 1) if amostras else None,
+            },
+            'max_concorrencia': self.max_concorrencia,
+        }
+
+
+# ----------------------------------------------------------------------
+# Pré-geração
+# ----------------------------------------------------------------------
+class PregeracaoTTS:
+    """Worker que deixa no cache os anúncios das senhas recém-emitidas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fila = None
+        self._worker = None
+        self.ativa = True
+        self.max_guiches = 8
+        self.janela_minutos = 60
+        self.tamanho_fila = 200
+        self.geradas = 0
+        self.ja_em_cache = 0
+        self.descartadas = 0
+        self.erros = 0
+
+    def configurar(self, config) -> None:
+        self.ativa = bool(config.get('TTS_PREGERACAO', True))
+        self.max_guiches = int(config.get('TTS_PREGERACAO_GUICHES', 8))
+        self.janela_minutos = int(config.get('TTS_PREGERACAO_JANELA_MIN', 60))
+        self.tamanho_fila = int(config.get('TTS_PREGERACAO_FILA_MAX', 200))
+
+    def agendar(self, textos: List[str], voz: str, gerar: Callable) -> int:
+        """Enfileira os anúncios (retorna na hora); `gerar(texto, voz)` é TTSService.obter_audio
+
+        Com a fila cheia (Azure lento ou fora do ar) os excedentes são descartados:
+        a chamada ainda funciona, só sem o áudio pronto.
+        """
+        fila = self._obter_fila()
+        agendados = 0
+        for texto in textos:
+            try:
+                fila.put_nowait((texto, voz, gerar))
+                agendados += 1
+            except queue.Full:
+                self.descartadas += len(textos) - agendados
+                break
+        return agendados
+
+    def pendentes(self) -> int:
+        return self._fila.qsize() if self._fila else 0
+
+    def estatisticas(self) -> dict:
+        return {
+            'ativa': self.ativa,
+            'pendentes': self.pendentes(),
+            'geradas': self.geradas,
+            'ja_em_cache': self.ja_em_cache,
+            'descartadas': self.descartadas,
+            'erros': self.erros,
+        }
+
+    def _obter_fila(self) -> queue.Queue:
+        if self._fila is None:
+            with self._lock:
+                if self._fila is None:
+                    self._fila = queue.Queue(maxsize=self.tamanho_fila)
+                    self._worker = threading.Thread(target=self._executar, name='pregeracao-tts', daemon=True)
+                    self._worker.start()
+        return self._fila
+
+    def _executar(self) -> None:
+        while True:
+            texto, voz, gerar = self._fila.get()
+            try:
+                if cache_audio.contem(chave_audio(texto, voz, FORMATO_AUDIO)):
+                    self.ja_em_cache += 1
+                    continue
+                gerar(texto, voz)
+                self.geradas += 1
+            except TTSIndisponivel:
+                self.descartadas += 1       # disjuntor aberto: não insiste
+            except Exception as e:
+                self.erros += 1
+                print(f"⚠️ Erro na pré-geração do áudio '{texto}': {e}")
+            finally:
+                self._fila.task_done()
+
+
+# Instâncias globais usadas pelo TTSService e pelas rotas
+cache_audio = CacheAudio()
+biblioteca_fragmentos = BibliotecaFragmentos()
+cliente_tts = ClienteTTS()
+pregeracao_tts = PregeracaoTTS()
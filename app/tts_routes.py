@@ -1,8 +1,10 @@
-from flask import Blueprint, send_file, request, make_response
-import io
+from flask import Blueprint, send_file, request, make_response, jsonify
+from flask_login import login_required
 
-from .models import ConfiguracaoSistema
+from .auth_utils import role_required
+from .cache import config_cache
 from .services import TTSService
+from .tts import cache_audio, cliente_tts, pregeracao_tts, TTSIndisponivel
 
 bp_tts = Blueprint('tts', __name__)
 
@@ -17,16 +19,38 @@ def tts_audio():
     if not texto:
         return make_response("Texto não fornecido", 400)
 
-    config = ConfiguracaoSistema.query.first()
+    config = config_cache.obter()
     if not config:
         return make_response("Configuração não encontrada", 500)
 
     try:
         tts_service = TTSService(config)
-        # Usar a voz especificada ou a padrão da configuração
-        audio_data = tts_service.gerar_audio(texto, voz if voz else '')
-        return send_file(io.BytesIO(audio_data), mimetype='audio/mpeg', as_attachment=False, download_name='voz.mp3')
+        # Usar a voz especificada ou a padrão da configuração; servido do
+        # cache em disco (Azure só na primeira vez que a frase é pedida)
+        caminho, chave = tts_service.obter_audio(texto, voz if voz else '')
+        resposta = send_file(caminho, mimetype='audio/mpeg', as_attachment=False, download_name='voz.mp3',
+                             etag=chave, max_age=0, conditional=True)
+        # A URL não traz a voz nem a origem (Azure ou fragmentos), que estão
+        # na chave: o navegador revalida sempre e recebe 304 pelo ETag enquanto
+        # o áudio for o mesmo; trocar a voz ou o Azure voltar gera outro ETag
+        resposta.cache_control.no_cache = True
+        return resposta
+    except TTSIndisponivel as e:
+        # Sem cache nem fragmentos e com o Azure recusado: o display tenta de novo
+        return make_response(str(e), 503)
     except Exception as e:
         print(f"Erro TTS: {e}")
         return make_response(f"Erro ao gerar áudio: {str(e)}", 500)
 
+
+
+@bp_tts.route('/api/tts/metricas')
+@login_required
+@role_required('admin')
+def tts_metricas():
+    """Latência e estado do cliente Azure, uso do cache de áudio e pré-geração"""
+    return jsonify({
+        'azure': cliente_tts.metricas(),
+        'cache': cache_audio.estatisticas(),
+        'pregeracao': pregeracao_tts.estatisticas(),
+    })
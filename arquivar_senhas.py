@@ -0,0 +1,28 @@
+"""
+Move as senhas de dias anteriores da tabela senha para senha_arquivo.
+
+O sistema já faz isso sozinho na primeira emissão de cada dia; use este
+script para arquivar um banco antigo de uma vez (com o sistema parado) ou
+até uma data específica. As senhas arquivadas continuam nos relatórios.
+
+    python arquivar_senhas.py                # tudo antes de hoje
+    python arquivar_senhas.py 2025-01-01     # tudo antes de uma data (UTC)
+"""
+import sys
+from datetime import datetime
+
+from app import create_app
+from app.arquivo import arquivo_senhas
+
+app = create_app()
+
+with app.app_context():
+    ate = datetime.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"📦 Arquivando senhas{f' anteriores a {ate:%d/%m/%Y}' if ate else ' de dias anteriores'}...")
+    try:
+        total = arquivo_senhas.arquivar(ate)
+        print(f"✅ {total} senhas movidas para senha_arquivo")
+    except Exception as e:
+        print(f"❌ Erro ao arquivar senhas: {e}")
+        import traceback
+        traceback.print_exc()
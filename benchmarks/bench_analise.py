@@ -0,0 +1,135 @@
+"""
+Benchmark da análise de espera vetorizada (app/analise.py)
+
+Cria um banco SQLite temporário com N senhas (padrão: 1 milhão em um ano,
+8 guichês) e mede:
+
+  anterior     tempo médio como era na rota relatorios: objetos do ORM +
+               list comprehension com timedelta por senha (só 30 dias)
+  carga        leitura dos dias fechados para a memória (uma vez por dia)
+  30 dias/ano  analisar() com os dias fechados já em memória: percentis,
+               mapa de calor e produção por guichê
+
+Confere a média e as chamadas por guichê com SQL.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_analise.py
+    python benchmarks/bench_analise.py --linhas 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_banco.close()
+os.environ['DATABASE_URL'] = 'sqlite:///' + _banco.name
+
+from app import create_app, db  # noqa: E402
+from app.models import Senha  # noqa: E402
+from app.analise import analise_espera  # noqa: E402
+
+LOTE = 50000
+
+
+def popular(total):
+    """Senhas de um ano até agora; 90% chamadas, esperas de 1 a 180 minutos"""
+    aleatorio = random.Random(42)
+    agora = datetime.utcnow()
+    inicio = agora - timedelta(days=365)
+    passo = (agora - inicio) / total
+    conexao = db.engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        for base in range(0, total, LOTE):
+            linhas = []
+            for i in range(base, min(base + LOTE, total)):
+                gerado_em = inicio + passo * i
+                chamado = aleatorio.random() < 0.9
+                chamado_em = gerado_em + timedelta(minutes=aleatorio.randint(1, 180)) if chamado else None
+                preferencial = i % 3 == 0
+                linhas.append((
+                    i % 999 + 1, 'PP' if preferencial else 'NP',
+                    'preferencial' if preferencial else 'normal', aleatorio.random() < 0.6,
+                    gerado_em.isoformat(' '), chamado, None,
+                    chamado_em.isoformat(' ') if chamado_em else None,
+                    str(aleatorio.randint(1, 8)) if chamado else None, 1,
+                ))
+            cursor.executemany(
+                'INSERT INTO senha (numero, sigla, tipo_paciente, primeira_vez, gerado_em, chamado, '
+                'chamado_por, chamado_em, guiche, fila_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', linhas)
+        conexao.commit()
+    finally:
+        conexao.close()
+
+
+def tempo_medio_anterior():
+    """Tempo médio dos últimos 30 dias como era calculado na rota relatorios"""
+    data_limite = datetime.now() - timedelta(days=30)
+    senhas_chamadas_validas = Senha.query.filter(
+        Senha.chamado == True, Senha.chamado_em != None, Senha.gerado_em != None,
+        Senha.chamado_em > Senha.gerado_em, Senha.gerado_em >= data_limite
+    ).all()
+    tempos = [(s.chamado_em - s.gerado_em).total_seconds() / 60 for s in senhas_chamadas_validas]
+    tempos_filtrados = [t for t in tempos if t <= 120]
+    return round(sum(tempos_filtrados) / len(tempos_filtrados), 1) if tempos_filtrados else None
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return (time.perf_counter() - inicio) * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app('development')
+    try:
+        with app.app_context():
+            db.create_all()
+            inicio = time.perf_counter()
+            popular(args.linhas)
+            print(f"{args.linhas} senhas geradas em {time.perf_counter() - inicio:.1f}s\n")
+
+            anterior_ms, _ = cronometrar(tempo_medio_anterior)
+            db.session.expunge_all()
+            analise_espera.invalidar()
+            carga_ms, _ = cronometrar(lambda: analise_espera.analisar(dias=30))
+            dias30_ms = min(cronometrar(lambda: analise_espera.analisar(dias=30))[0]
+                            for _ in range(args.repeticoes))
+            ano_ms, ano = min((cronometrar(analise_espera.analisar) for _ in range(args.repeticoes)),
+                              key=lambda medida: medida[0])
+
+            # Conferência com SQL (mesmo critério: 0 < espera <= 120 min, arredondada ao segundo)
+            espera = db.func.round((db.func.julianday(Senha.chamado_em) - db.func.julianday(Senha.gerado_em)) * 86400)
+            quantidade, media = db.session.query(db.func.count(), db.func.avg(espera / 60)).filter(
+                Senha.chamado == True, espera > 0, espera <= 7200).one()
+            assert ano['esperas_validas'] == quantidade, f"{ano['esperas_validas']} != {quantidade}"
+            assert abs(ano['tempo_medio'] - media) < 0.05, f"{ano['tempo_medio']} != {media}"
+            por_guiche = dict(db.session.query(Senha.guiche, db.func.count()).filter(
+                Senha.chamado == True, Senha.guiche != None).group_by(Senha.guiche).all())
+            assert {g['guiche']: g['chamadas'] for g in ano['guiches']} == por_guiche
+
+            print(f"{'etapa':<36} | {'tempo (ms)':>10}")
+            print('-' * 50)
+            print(f"{'anterior: tempo médio 30 dias (ORM)':<36} | {anterior_ms:>10.1f}")
+            print(f"{'carga dos dias fechados + 30 dias':<36} | {carga_ms:>10.1f}")
+            print(f"{'análise 30 dias (em memória)':<36} | {dias30_ms:>10.1f}")
+            print(f"{'análise do ano (em memória)':<36} | {ano_ms:>10.1f}")
+            print(f"OK: p50/p90/p99 {ano['percentis']}, média {ano['tempo_medio']} min, "
+                  f"{len(ano['guiches'])} guichês")
+    finally:
+        os.unlink(_banco.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Benchmark da montagem das linhas dos relatórios personalizados (PDF/Excel)
+
+Cria um banco SQLite temporário com N senhas (padrão: 100 mil, 8 atendentes)
+e mede, cada variante em um processo próprio (para o pico de memória ser só
+dela), a versão anterior e a atual:
+
+  linhas       Senha.query.all() + senha.usuario_chamador por linha
+               x linhas_relatorio (colunas + usuario.nome, em lotes)
+  excel        DataFrame do pandas em BytesIO x escrever_xlsx (write-only)
+  pdf          tabela única no reportlab x escrever_pdf (tabelas em blocos)
+
+Para cada uma: linhas por segundo, consultas SQL emitidas e pico de RSS.
+O caso pdf fica fora do padrão: a tabela única cresce de forma quadrática e
+leva muitos minutos com 100 mil senhas.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_exportacao.py
+    python benchmarks/bench_exportacao.py --linhas 20000 --casos linhas excel pdf
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CASOS = ('linhas', 'excel', 'pdf')
+LOTE = 50000
+
+
+def criar_app(caminho_banco):
+    """Deve ser chamada antes de importar o app (a URL do banco é lida no import)"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + caminho_banco
+    from app import create_app
+    return create_app('development')
+
+
+def popular(caminho_banco, total):
+    """Senhas dos últimos 90 dias; 90% chamadas, esperas de 1 a 180 minutos"""
+    app = criar_app(caminho_banco)
+    from app import db
+    from app.models import Usuario, Papel
+
+    with app.app_context():
+        db.create_all()
+        usuarios = [Usuario(nome=f'Atendente {i}', email=f'at{i}@local', senha='-', tipo=Papel.USUARIO)
+                    for i in range(1, 9)]
+        db.session.add_all(usuarios)
+        db.session.commit()
+        ids_usuarios = [u.id for u in usuarios]
+
+        aleatorio = random.Random(42)
+        agora = datetime.utcnow()
+        inicio = agora - timedelta(days=90)
+        passo = (agora - inicio) / total
+        conexao = db.engine.raw_connection()
+        try:
+            cursor = conexao.cursor()
+            for base in range(0, total, LOTE):
+                linhas = []
+                for i in range(base, min(base + LOTE, total)):
+                    gerado_em = inicio + passo * i
+                    chamado = aleatorio.random() < 0.9
+                    chamado_em = gerado_em + timedelta(minutes=aleatorio.randint(1, 180)) if chamado else None
+                    preferencial = i % 3 == 0
+                    linhas.append((
+                        i % 999 + 1, 'PP' if preferencial else 'NP',
+                        'preferencial' if preferencial else 'normal', aleatorio.random() < 0.6,
+                        gerado_em.isoformat(' '), chamado,
+                        aleatorio.choice(ids_usuarios) if chamado else None,
+                        chamado_em.isoformat(' ') if chamado_em else None,
+                        str(aleatorio.randint(1, 8)) if chamado else None, 1,
+                    ))
+                cursor.executemany(
+                    'INSERT INTO senha (numero, sigla, tipo_paciente, primeira_vez, gerado_em, chamado, '
+                    'chamado_por, chamado_em, guiche, fila_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', linhas)
+            conexao.commit()
+        finally:
+            conexao.close()
+
+        from app.services import EstatisticaService
+        EstatisticaService(db.session).recalcular()
+        db.session.commit()
+
+
+# ----------------------------------------------------------------------
+# Versões anteriores (como estavam em routes.py)
+# ----------------------------------------------------------------------
+def _tempo_espera(senha):
+    tempo_espera = '-'
+    if senha.chamado and senha.chamado_em and senha.gerado_em:
+        minutos = int((senha.chamado_em - senha.gerado_em).total_seconds() / 60)
+        tempo_espera = f"{minutos} minutos" if 0 <= minutos <= 120 else "Inválido"
+    return tempo_espera
+
+
+def linhas_anterior(parametros):
+    from app.models import Senha
+    from app.relatorios import filtros_relatorio
+
+    senhas = Senha.query.filter(*filtros_relatorio(parametros)).order_by(Senha.gerado_em.desc()).all()
+    return [[
+        f"{senha.sigla}{senha.numero:03d}",
+        'Preferencial' if senha.tipo_paciente == 'preferencial' else 'Normal',
+        'Sim' if senha.primeira_vez else 'Não',
+        senha.gerado_em.strftime('%d/%m/%Y %H:%M'),
+        'Sim' if senha.chamado else 'Não',
+        senha.chamado_em.strftime('%d/%m/%Y %H:%M') if senha.chamado_em else 'Não chamado',
+        senha.usuario_chamador.nome if senha.usuario_chamador else 'Não chamado',
+        senha.guiche or '-',
+        _tempo_espera(senha),
+    ] for senha in senhas]
+
+
+def excel_anterior(parametros):
+    """Aba de dados detalhados como antes: dicts -> DataFrame -> ExcelWriter em BytesIO"""
+    from io import BytesIO
+    import pandas as pd
+
+    colunas = ['Número', 'Tipo', 'Primeira Vez', 'Gerado em', 'Chamado', 'Chamado em',
+               'Chamado por', 'Guichê', 'Tempo de Espera']
+    dados = [dict(zip(colunas, linha)) for linha in linhas_anterior(parametros)]
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        pd.DataFrame(dados).to_excel(writer, sheet_name='Dados Detalhados', index=False)
+    return len(dados)
+
+
+def pdf_tabela_unica(parametros):
+    """escrever_pdf com todas as senhas em uma única tabela (como antes)"""
+    from io import BytesIO
+    from app import relatorios
+
+    relatorios.LINHAS_POR_TABELA = 10 ** 9
+    return relatorios.escrever_pdf(parametros, BytesIO(), 'Benchmark')
+
+
+# ----------------------------------------------------------------------
+# Execução de uma variante (em processo próprio)
+# ----------------------------------------------------------------------
+def executar(caminho_banco, caso, versao, resultado):
+    app = criar_app(caminho_banco)
+    from io import BytesIO
+    from sqlalchemy import event
+    from app import db
+    from app import relatorios
+
+    def linhas_atual(parametros):
+        """Mesma formatação de linhas_anterior, lendo a projeção em lotes"""
+        total = 0
+        for sigla, numero, tipo, primeira_vez, gerado_em, chamado, chamado_em, guiche, chamado_por \
+                in relatorios.linhas_relatorio(parametros):
+            minutos = relatorios.tempo_espera_minutos(chamado, gerado_em, chamado_em)
+            [
+                f"{sigla}{numero:03d}",
+                'Preferencial' if tipo == 'preferencial' else 'Normal',
+                'Sim' if primeira_vez else 'Não',
+                gerado_em.strftime('%d/%m/%Y %H:%M'),
+                'Sim' if chamado else 'Não',
+                chamado_em.strftime('%d/%m/%Y %H:%M') if chamado_em else 'Não chamado',
+                chamado_por or 'Não chamado',
+                guiche or '-',
+                '-' if minutos is None else ('Inválido' if minutos < 0 else f"{minutos} minutos"),
+            ]
+            total += 1
+        return total
+
+    variantes = {
+        ('linhas', 'anterior'): lambda p: len(linhas_anterior(p)),
+        ('linhas', 'atual'): linhas_atual,
+        ('excel', 'anterior'): excel_anterior,
+        ('excel', 'atual'): lambda p: relatorios.escrever_xlsx(p, BytesIO(), 'Benchmark'),
+        ('pdf', 'anterior'): pdf_tabela_unica,
+        ('pdf', 'atual'): lambda p: relatorios.escrever_pdf(p, BytesIO(), 'Benchmark'),
+    }
+
+    with app.app_context():
+        consultas = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a, **k: consultas.append(1))
+        rss_base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        inicio = time.perf_counter()
+        linhas = variantes[(caso, versao)]({})
+        duracao = time.perf_counter() - inicio
+        rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    resultado.put((caso, versao, linhas, duracao, len(consultas), rss_base / 1024, rss_pico / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=100000)
+    parser.add_argument('--casos', nargs='+', choices=CASOS, default=['linhas', 'excel'])
+    args = parser.parse_args()
+
+    arquivo = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    arquivo.close()
+    try:
+        inicio = time.perf_counter()
+        popular(arquivo.name, args.linhas)
+        print(f"{args.linhas} senhas geradas em {time.perf_counter() - inicio:.1f}s\n")
+
+        contexto = multiprocessing.get_context('spawn')
+        print(f"{'caso':<7} | {'versão':<9} | {'linhas/s':>10} | {'tempo (s)':>9} | "
+              f"{'consultas':>9} | {'RSS pico (MB)':>13} | {'acima da base':>13}")
+        print('-' * 88)
+        for caso in args.casos:
+            medidas = {}
+            for versao in ('anterior', 'atual'):
+                resultado = contexto.Queue()
+                processo = contexto.Process(target=executar, args=(arquivo.name, caso, versao, resultado))
+                processo.start()
+                _, _, linhas, duracao, consultas, rss_base, rss_pico = resultado.get(timeout=3600)
+                processo.join()
+                medidas[versao] = (linhas, duracao, rss_pico - rss_base)
+                print(f"{caso:<7} | {versao:<9} | {linhas / duracao:>10.0f} | {duracao:>9.2f} | "
+                      f"{consultas:>9} | {rss_pico:>13.0f} | {rss_pico - rss_base:>13.0f}")
+            assert medidas['anterior'][0] == medidas['atual'][0], f"{caso}: número de linhas diferente"
+            print(f"{'':<7}   {medidas['anterior'][1] / medidas['atual'][1]:.1f}x mais rápido, "
+                  f"{medidas['anterior'][2]:.0f} -> {medidas['atual'][2]:.0f} MB acima da base")
+    finally:
+        os.unlink(arquivo.name)
+
+
+if __name__ == '__main__':
+    main()
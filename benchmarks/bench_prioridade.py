@@ -0,0 +1,114 @@
+"""
+Benchmark da seleção da próxima senha (PrioridadeService)
+
+Cria um banco SQLite temporário com N senhas aguardando e mede a latência de
+selecionar_proxima_senha para cada estratégia, comparando com a versão
+anterior da alternância (carregava todas as senhas aguardando com .all()).
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_prioridade.py
+    python benchmarks/bench_prioridade.py 10 100 1000 10000
+"""
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_banco.close()
+os.environ['DATABASE_URL'] = 'sqlite:///' + _banco.name
+
+from app import create_app, db  # noqa: E402
+from app.fila import motor_fila  # noqa: E402
+from app.models import Senha, ConfiguracaoSistema  # noqa: E402
+from app.services import PrioridadeService  # noqa: E402
+
+TAMANHOS = [10, 100, 1000, 10000]
+REPETICOES = 200
+ESTRATEGIAS = ['intercalamento', 'peso', 'alternancia']
+
+
+def popular(total):
+    """Recria a tabela com `total` senhas aguardando (1 preferencial a cada 3)"""
+    Senha.query.delete()
+    inicio = datetime.utcnow() - timedelta(hours=8)
+    db.session.bulk_insert_mappings(Senha, [
+        {
+            'numero': i + 1,
+            'sigla': 'PP' if i % 3 == 0 else 'NP',
+            'tipo_paciente': 'preferencial' if i % 3 == 0 else 'normal',
+            'primeira_vez': True,
+            'gerado_em': inicio + timedelta(seconds=i),
+            'chamado': False,
+        }
+        for i in range(total)
+    ])
+    # Uma preferencial já chamada, para a alternância calcular o tempo de espera
+    db.session.add(Senha(numero=0, sigla='PP', tipo_paciente='preferencial', primeira_vez=True,
+                         gerado_em=inicio, chamado=True, chamado_em=datetime.utcnow()))
+    db.session.commit()
+    motor_fila.carregar()
+
+
+def alternancia_anterior(config):
+    """Implementação anterior: carrega as filas inteiras e usa só o primeiro item"""
+    preferenciais = (db.session.query(Senha)
+                     .filter_by(chamado=False, tipo_paciente='preferencial')
+                     .order_by(Senha.id).all())
+    normais = (db.session.query(Senha)
+               .filter_by(chamado=False, tipo_paciente='normal')
+               .order_by(Senha.id).all())
+    ultima_pref = (db.session.query(Senha)
+                   .filter_by(chamado=True, tipo_paciente='preferencial')
+                   .order_by(Senha.chamado_em.desc()).first())
+    tempo_espera = (datetime.utcnow() - ultima_pref.chamado_em).total_seconds() / 60
+    if tempo_espera >= (config.tolerancia_minutos or 5):
+        return preferenciais[0] if preferenciais else (normais[0] if normais else None)
+    return normais[0] if normais else (preferenciais[0] if preferenciais else None)
+
+
+def medir(funcao):
+    """Mediana e p95 em milissegundos (sem commit: a fila não muda entre repetições)"""
+    tempos = []
+    for _ in range(REPETICOES):
+        db.session.expunge_all()
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1]
+
+
+def main():
+    tamanhos = [int(n) for n in sys.argv[1:]] or TAMANHOS
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        config = ConfiguracaoSistema(tipo_prioridade='alternancia', intercalamento_valor=2,
+                                     peso_normal=1, peso_preferencial=3, tolerancia_minutos=5)
+
+        print(f"{'aguardando':>10} | {'estratégia':<22} | {'mediana (ms)':>12} | {'p95 (ms)':>9}")
+        print('-' * 62)
+        for total in tamanhos:
+            popular(total)
+            for estrategia in ESTRATEGIAS:
+                config.tipo_prioridade = estrategia
+                servico = PrioridadeService(db.session, config)
+                mediana, p95 = medir(lambda: servico.selecionar_proxima_senha(0))
+                print(f"{total:>10} | {estrategia:<22} | {mediana:>12.3f} | {p95:>9.3f}")
+            mediana, p95 = medir(lambda: alternancia_anterior(config))
+            print(f"{total:>10} | {'alternancia (anterior)':<22} | {mediana:>12.3f} | {p95:>9.3f}")
+
+    os.unlink(_banco.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark do dashboard de relatórios (/relatorios)
+
+Cria um banco SQLite temporário com N senhas (padrão: 1 milhão, espalhadas
+por um ano, as dos últimos dias com chamada e tempo de espera), preenche
+estatistica_diaria (recalcular, como na migração) e compara o cálculo das
+estatísticas da página na versão anterior (7 count() + 30 consultas por dia +
+senhas dos 30 dias carregadas no Python) com o RelatorioService, que lê as
+linhas consolidadas. Confere que os resultados batem.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_relatorios.py
+    python benchmarks/bench_relatorios.py --linhas 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_banco.close()
+os.environ['DATABASE_URL'] = 'sqlite:///' + _banco.name
+
+from app import create_app, db  # noqa: E402
+from app.models import Senha, Usuario, Papel  # noqa: E402
+from app.services import EstatisticaService, RelatorioService  # noqa: E402
+
+LOTE = 50000
+
+
+def popular(total):
+    """Senhas de um ano até agora; 4 atendentes; esperas de 1 a 180 minutos"""
+    usuarios = [Usuario(nome=f'Atendente {i}', email=f'at{i}@local', senha='-', tipo=Papel.USUARIO)
+                for i in range(1, 5)]
+    db.session.add_all(usuarios)
+    db.session.commit()
+    ids_usuarios = [u.id for u in usuarios]
+
+    aleatorio = random.Random(42)
+    agora = datetime.utcnow()
+    inicio = agora - timedelta(days=365)
+    passo = (agora - inicio) / total
+    conexao = db.engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        for base in range(0, total, LOTE):
+            linhas = []
+            for i in range(base, min(base + LOTE, total)):
+                gerado_em = inicio + passo * i
+                chamado = aleatorio.random() < 0.9 or gerado_em < agora - timedelta(days=1)
+                chamado_em = gerado_em + timedelta(minutes=aleatorio.randint(1, 180)) if chamado else None
+                preferencial = i % 3 == 0
+                linhas.append((
+                    i % 999 + 1, 'PP' if preferencial else 'NP',
+                    'preferencial' if preferencial else 'normal', aleatorio.random() < 0.6,
+                    gerado_em.isoformat(' '), chamado,
+                    aleatorio.choice(ids_usuarios) if chamado else None,
+                    chamado_em.isoformat(' ') if chamado_em else None,
+                    str(aleatorio.randint(1, 8)) if chamado else None, 1,
+                ))
+            cursor.executemany(
+                'INSERT INTO senha (numero, sigla, tipo_paciente, primeira_vez, gerado_em, chamado, '
+                'chamado_por, chamado_em, guiche, fila_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', linhas)
+        conexao.commit()
+        cursor.execute('ANALYZE')
+    finally:
+        conexao.close()
+
+
+def dashboard_anterior():
+    """Implementação anterior da rota relatorios (sem o render_template)"""
+    total_senhas = Senha.query.count()
+    senhas_chamadas = Senha.query.filter_by(chamado=True).count()
+    senhas_aguardando = Senha.query.filter_by(chamado=False).count()
+    normais = Senha.query.filter_by(tipo_paciente='normal').count()
+    preferenciais = Senha.query.filter_by(tipo_paciente='preferencial').count()
+    primeira_vez = Senha.query.filter_by(primeira_vez=True).count()
+    recorrentes = Senha.query.filter_by(primeira_vez=False).count()
+    chamadas_por_usuario = db.session.query(
+        Usuario.nome, db.func.count(Senha.id).label('total_chamadas')
+    ).join(Senha, Usuario.id == Senha.chamado_por).filter(Senha.chamado == True)\
+     .group_by(Usuario.id, Usuario.nome).order_by(db.func.count(Senha.id).desc()).all()
+
+    hoje = datetime.now().date()
+    senhas_por_dia = []
+    for i in range(30):
+        data = hoje - timedelta(days=i)
+        count = Senha.query.filter(db.func.date(Senha.gerado_em) == data).count()
+        if count > 0:
+            senhas_por_dia.append({'data': data, 'total': count})
+    senhas_por_dia.sort(key=lambda x: x['data'])
+
+    tempo_medio = None
+    data_limite = datetime.now() - timedelta(days=30)
+    senhas_chamadas_validas = Senha.query.filter(
+        Senha.chamado == True, Senha.chamado_em != None, Senha.gerado_em != None,
+        Senha.chamado_em > Senha.gerado_em, Senha.gerado_em >= data_limite
+    ).all()
+    if senhas_chamadas_validas:
+        tempos = [(s.chamado_em - s.gerado_em).total_seconds() / 60 for s in senhas_chamadas_validas]
+        tempos_filtrados = [t for t in tempos if t <= 120]
+        if tempos_filtrados:
+            tempo_medio = round(sum(tempos_filtrados) / len(tempos_filtrados), 1)
+
+    return {
+        'total_senhas': total_senhas, 'senhas_chamadas': senhas_chamadas,
+        'senhas_aguardando': senhas_aguardando, 'normais': normais, 'preferenciais': preferenciais,
+        'primeira_vez': primeira_vez, 'recorrentes': recorrentes,
+        'chamadas_por_usuario': [(u.nome, u.total_chamadas) for u in chamadas_por_usuario],
+        'senhas_por_dia': senhas_por_dia, 'tempo_medio': tempo_medio,
+    }
+
+
+def medir(funcao, repeticoes):
+    """Melhor tempo em milissegundos (e o último resultado)"""
+    melhor, resultado = None, None
+    for _ in range(repeticoes):
+        db.session.expunge_all()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        decorrido = (time.perf_counter() - inicio) * 1000
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app('development')
+    try:
+        with app.app_context():
+            db.create_all()
+            inicio = time.perf_counter()
+            popular(args.linhas)
+            print(f"{args.linhas} senhas geradas em {time.perf_counter() - inicio:.1f}s")
+
+            inicio = time.perf_counter()
+            linhas = EstatisticaService(db.session).recalcular()
+            db.session.commit()
+            print(f"estatistica_diaria: {linhas} linhas em {time.perf_counter() - inicio:.1f}s")
+
+            anterior_ms, anterior = medir(dashboard_anterior, args.repeticoes)
+            novo_ms, novo = medir(lambda: RelatorioService(db.session).dashboard(dias=30), args.repeticoes)
+
+            novo_comparavel = dict(novo, chamadas_por_usuario=[
+                (u.nome, u.total_chamadas) for u in novo['chamadas_por_usuario']])
+            for chave, valor in anterior.items():
+                if chave == 'tempo_medio':
+                    # A versão anterior usava "agora - 30 dias"; a consolidada, 30 dias inteiros
+                    assert abs(novo_comparavel[chave] - valor) <= 1, f"{chave}: {novo_comparavel[chave]} != {valor}"
+                    continue
+                assert novo_comparavel[chave] == valor, f"{chave}: {novo_comparavel[chave]!r} != {valor!r}"
+
+            print(f"{'versão':<28} | {'tempo (ms)':>10}")
+            print('-' * 42)
+            print(f"{'anterior (39 consultas)':<28} | {anterior_ms:>10.1f}")
+            print(f"{'estatistica_diaria (2)':<28} | {novo_ms:>10.1f}")
+            print(f"OK: mesmos resultados, {anterior_ms / novo_ms:.0f}x mais rápido "
+                  f"(tempo médio {anterior['tempo_medio']} x {novo['tempo_medio']} min)")
+    finally:
+        os.unlink(_banco.name)
+
+
+if __name__ == '__main__':
+    main()
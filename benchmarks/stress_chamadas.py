@@ -0,0 +1,141 @@
+"""
+Teste de estresse: vários guichês pedindo a próxima senha ao mesmo tempo
+
+Cria um banco SQLite temporário com N senhas aguardando e dispara chamadas
+simultâneas (threads em um ou mais processos, cada processo com a sua fila em
+memória) até esvaziar a fila. Verifica que nenhuma senha foi chamada duas
+vezes e que todas foram chamadas.
+
+Uso (na raiz do projeto):
+    python benchmarks/stress_chamadas.py
+    python benchmarks/stress_chamadas.py --senhas 2000 --guiches 24 --processos 3
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def criar_app(caminho_banco):
+    """Deve ser chamada antes de importar o app (a URL do banco é lida no import)"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + caminho_banco
+    from app import create_app
+    return create_app('development')
+
+
+def popular(caminho_banco, total):
+    app = criar_app(caminho_banco)
+    from app import db
+    from app.models import Senha, ConfiguracaoSistema, Usuario, Papel
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(ConfiguracaoSistema(tipo_prioridade='intercalamento', intercalamento_valor=2))
+        db.session.add(Usuario(nome='Estresse', email='estresse@local', senha='-', tipo=Papel.USUARIO))
+        db.session.bulk_insert_mappings(Senha, [
+            {
+                'numero': i + 1,
+                'sigla': 'PP' if i % 3 == 0 else 'NP',
+                'tipo_paciente': 'preferencial' if i % 3 == 0 else 'normal',
+                'primeira_vez': True,
+                'gerado_em': datetime.utcnow(),
+                'chamado': False,
+            }
+            for i in range(total)
+        ])
+        db.session.commit()
+
+
+def guiches(caminho_banco, total_guiches, primeiro_guiche, resultado):
+    """Um processo com `total_guiches` threads chamando até a fila esvaziar"""
+    app = criar_app(caminho_banco)
+    from app import db
+    from app.cache import config_cache
+    from app.fila import motor_fila
+    from app.services import PrioridadeService
+
+    chamadas, erros = [], []
+    largada = threading.Barrier(total_guiches)
+
+    def guiche(numero):
+        with app.app_context():
+            config = config_cache.obter()
+            largada.wait()
+            while True:
+                servico = PrioridadeService(db.session, config)
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        senha = servico.chamar_proxima_senha(1, str(numero))
+                except Exception as e:
+                    erros.append(repr(e))
+                    if len(erros) > 100:
+                        break
+                    continue
+                if senha is None:
+                    break
+                chamadas.append((senha.id, numero))
+                motor_fila.registrar_chamada(senha)
+            db.session.remove()
+
+    threads = [threading.Thread(target=guiche, args=(primeiro_guiche + i,)) for i in range(total_guiches)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    resultado.put((chamadas, erros))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--senhas', type=int, default=1000)
+    parser.add_argument('--guiches', type=int, default=24, help='total de guichês (threads)')
+    parser.add_argument('--processos', type=int, default=2)
+    args = parser.parse_args()
+
+    arquivo = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    arquivo.close()
+    try:
+        popular(arquivo.name, args.senhas)
+
+        contexto = multiprocessing.get_context('spawn')
+        resultado = contexto.Queue()
+        por_processo = max(1, args.guiches // args.processos)
+        processos = [
+            contexto.Process(target=guiches, args=(arquivo.name, por_processo, p * por_processo + 1, resultado))
+            for p in range(args.processos)
+        ]
+        inicio = time.perf_counter()
+        for p in processos:
+            p.start()
+        respostas = [resultado.get(timeout=600) for _ in processos]
+        for p in processos:
+            p.join()
+        duracao = time.perf_counter() - inicio
+
+        chamadas = [c for lista, _ in respostas for c in lista]
+        erros = [e for _, lista in respostas for e in lista]
+        repetidas = {senha_id: n for senha_id, n in Counter(i for i, _ in chamadas).items() if n > 1}
+
+        print(f"Guichês: {por_processo * args.processos} ({args.processos} processo(s))")
+        print(f"Senhas chamadas: {len(chamadas)}/{args.senhas} em {duracao:.2f}s "
+              f"({len(chamadas) / duracao:.0f} chamadas/s)")
+        print(f"Erros: {len(erros)}" + (f" (ex.: {erros[0]})" if erros else ''))
+
+        assert not repetidas, f"Senhas chamadas mais de uma vez: {repetidas}"
+        assert len(chamadas) == args.senhas, "Nem todas as senhas foram chamadas"
+        print("OK: nenhuma senha foi chamada duas vezes")
+    finally:
+        os.unlink(arquivo.name)
+
+
+if __name__ == '__main__':
+    main()
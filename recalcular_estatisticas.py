@@ -0,0 +1,29 @@
+"""
+Recalcula a tabela estatistica_diaria a partir das senhas gravadas.
+
+Ela é atualizada automaticamente a cada emissão e chamada; use este script
+para preencher o histórico ou corrigir um período.
+
+    python recalcular_estatisticas.py                # todo o histórico
+    python recalcular_estatisticas.py 2025-01-01     # a partir de uma data
+"""
+import sys
+from datetime import date
+
+from app import create_app, db
+from app.services import EstatisticaService
+
+app = create_app()
+
+with app.app_context():
+    desde = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"🔧 Recalculando estatísticas diárias{f' desde {desde:%d/%m/%Y}' if desde else ''}...")
+    try:
+        linhas = EstatisticaService(db.session).recalcular(desde)
+        db.session.commit()
+        print(f"✅ {linhas} linhas gravadas em estatistica_diaria")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erro ao recalcular estatísticas: {e}")
+        import traceback
+        traceback.print_exc()
@@ -1,8 +1,11 @@
 from app import create_app
 
-app = create_app()
 
-if __name__ == "__main__":
+def main():
+    # O app só é criado aqui: os processos dos relatórios (spawn) reimportam
+    # este módulo e não devem subir o servidor nem rodar as migrações
+    app = create_app()
+
     # Configuração otimizada para produção com suporte a múltiplas requisições simultâneas
     app.run(
         host="0.0.0.0", 
@@ -11,3 +14,7 @@ if __name__ == "__main__":
         threaded=True,  # Habilitar threads para requisições simultâneas
         use_reloader=False  # Desabilitar reloader para evitar travamentos
     )
+
+
+if __name__ == "__main__":
+    main()